@@ -9,12 +9,22 @@ from flask_cors import CORS
 
 from celery_worker import celery_init_app
 from utils.logger import get_logger
+from utils.metrics import metrics_view
+from utils.compression import DecompressionMiddleware
+from utils.file_handling import UploadRequest
+from utils.task_routing import LIGHT_QUEUE
+from utils.task_memory import WORKER_MAX_MEMORY_PER_CHILD
 from db import redis_url
 
 from resources.v1.transform import GeojsonBlueprint
 from resources.v1.transform import ShapefileBlueprint
 from resources.v1.transform import GeopackageBlueprint
 from resources.v1.transform import DXFBlueprint
+from resources.v1.transform import GeoParquetBlueprint
+from resources.v1.transform import FlatGeobufBlueprint
+from resources.v1.transform import ArrowBlueprint
+from resources.v1.transform import GeoJSONSeqBlueprint
+from resources.v1.transform import UploadBlueprint
 
 from resources.v1.transform import AsyncTaskResultBlueprint
 
@@ -22,6 +32,8 @@ logger = get_logger(__name__)
 
 def create_app(db_name=None):
     app = Flask(__name__)
+    # multipart uploads are streamed into the uploads folder while they are parsed
+    app.request_class = UploadRequest
     # Load up the environment variables
     load_dotenv()
 
@@ -57,6 +69,10 @@ def create_app(db_name=None):
             task_time_limit=900,  # 15 minutes (hard limit)
             task_soft_time_limit=840,  # 14 minutes (soft limit)
             worker_prefetch_multiplier=1,  # Disable prefetching
+            worker_max_memory_per_child=WORKER_MAX_MEMORY_PER_CHILD or None,  # in kilobytes, see utils.task_memory
+            accept_content=["json", "msgpack"],  # the geojson tasks are sent as msgpack
+            task_default_queue=LIGHT_QUEUE,  # jobs are routed to the light or heavy queue by their estimated cost
+            broker_transport_options={"queue_order_strategy": "priority", "priority_steps": list(range(10)), "sep": ":"},
         ),
     )
     celery_init_app(app)
@@ -94,6 +110,11 @@ def create_app(db_name=None):
         CORS(AsyncTaskResultBlueprint)
         CORS(GeopackageBlueprint)
         CORS(DXFBlueprint)
+        CORS(GeoParquetBlueprint)
+        CORS(FlatGeobufBlueprint)
+        CORS(ArrowBlueprint)
+        CORS(GeoJSONSeqBlueprint)
+        CORS(UploadBlueprint)
 
     # register transformation blueprints
     api.register_blueprint(GeojsonBlueprint)
@@ -101,5 +122,16 @@ def create_app(db_name=None):
     api.register_blueprint(AsyncTaskResultBlueprint)
     api.register_blueprint(GeopackageBlueprint)
     api.register_blueprint(DXFBlueprint)
+    api.register_blueprint(GeoParquetBlueprint)
+    api.register_blueprint(FlatGeobufBlueprint)
+    api.register_blueprint(ArrowBlueprint)
+    api.register_blueprint(GeoJSONSeqBlueprint)
+    api.register_blueprint(UploadBlueprint)
+
+    # gzip and zstd request bodies are decompressed while they are read, before any schema parsing
+    app.wsgi_app = DecompressionMiddleware(app.wsgi_app)
+
+    # prometheus metrics for the stages of each request handled by this process
+    app.add_url_rule("/metrics", "metrics", metrics_view)
 
     return app
\ No newline at end of file
@@ -0,0 +1,111 @@
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Point, LineString, Polygon, MultiPolygon, MultiLineString
+
+# synthetic data is generated around Sydney so buffers and clips pick a real UTM zone
+ORIGIN = (151.0, -34.0)
+EXTENT_DEGREES = 0.5
+
+SIZES = {
+    "small": 1_000,
+    "medium": 10_000,
+    "large": 100_000,
+}
+
+CATEGORIES = ["residential", "commercial", "industrial", "rural", "open space"]
+
+
+def _attributes(rng, count):
+    return {
+        "id": np.arange(count),
+        "zone": rng.choice(CATEGORIES, count),
+        "value": rng.random(count) * 1000,
+    }
+
+
+def _centres(rng, count):
+    x = ORIGIN[0] + rng.random(count) * EXTENT_DEGREES
+    y = ORIGIN[1] + rng.random(count) * EXTENT_DEGREES
+    return x, y
+
+
+def _polygon(x, y, size, holes=False):
+    shell = [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+    if not holes:
+        return Polygon(shell)
+
+    inset = size / 4
+    hole = [(x + inset, y + inset), (x + inset, y + size - inset), (x + size - inset, y + size - inset), (x + size - inset, y + inset), (x + inset, y + inset)]
+    return Polygon(shell, [hole])
+
+
+def make_points(rng, count):
+    x, y = _centres(rng, count)
+    return [Point(px, py) for px, py in zip(x, y)]
+
+
+def make_lines(rng, count, vertices=10):
+    x, y = _centres(rng, count)
+    steps = (rng.random((count, vertices, 2)) - 0.5) * 0.002
+    return [LineString(np.cumsum(step, axis=0) + (px, py)) for px, py, step in zip(x, y, steps)]
+
+
+def make_polygons(rng, count):
+    x, y = _centres(rng, count)
+    sizes = 0.0005 + rng.random(count) * 0.002
+    return [_polygon(px, py, size, holes=True) for px, py, size in zip(x, y, sizes)]
+
+
+def make_multipart(rng, count):
+    x, y = _centres(rng, count)
+    sizes = 0.0005 + rng.random(count) * 0.001
+    geometries = []
+    for index, (px, py, size) in enumerate(zip(x, y, sizes)):
+        if index % 2:
+            geometries.append(MultiPolygon([_polygon(px, py, size), _polygon(px + size * 2, py, size)]))
+        else:
+            geometries.append(MultiLineString([[(px, py), (px + size, py + size)], [(px, py + size), (px + size, py)]]))
+    return geometries
+
+
+def make_mixed(rng, count):
+    makers = [make_points, make_lines, make_polygons, make_multipart]
+    geometries = []
+    for index, maker in enumerate(makers):
+        share = count // len(makers) + (1 if index < count % len(makers) else 0)
+        geometries.extend(maker(rng, share))
+    return geometries
+
+
+DATASETS = {
+    "points": make_points,
+    "lines": make_lines,
+    "polygons": make_polygons,
+    "multipart": make_multipart,
+    "mixed": make_mixed,
+}
+
+
+def make_dataset(kind, size, seed=42):
+    """
+    Generate a reproducible synthetic GeoDataFrame in EPSG:4326.
+
+    Parameters:
+    kind (str): One of the DATASETS keys.
+    size (str): One of the SIZES keys.
+    seed (int): Seed for the random generator, the same seed always gives the same data.
+
+    Returns:
+    GeoDataFrame: The generated dataset.
+    """
+    count = SIZES[size]
+    rng = np.random.default_rng(seed)
+    geometries = DATASETS[kind](rng, count)
+    return gpd.GeoDataFrame(_attributes(rng, count), geometry=geometries, crs="EPSG:4326")
+
+
+def make_mask(fraction=0.5):
+    """Return a FeatureCollection covering the given fraction of the dataset extent, for clip and erase."""
+    size = EXTENT_DEGREES * fraction
+    mask = gpd.GeoDataFrame(geometry=[_polygon(ORIGIN[0], ORIGIN[1], size)], crs="EPSG:4326")
+    return mask.__geo_interface__
@@ -0,0 +1,308 @@
+"""
+Benchmark harness for the transformations, the output writers and the HTTP endpoints.
+
+Usage:
+    python -m benchmarks.run --suite direct --sizes small medium --output results.json
+    python -m benchmarks.run --suite http --sizes small --output results.json
+    python -m benchmarks.run --output results.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --output results.json --baseline benchmarks/baseline.json --threshold 0.2
+
+Every case is timed over --repeat runs (the median is compared) and run once more under
+tracemalloc to record peak python allocations. When --baseline is given, cases whose median
+time or peak memory grew by more than --threshold are reported and the exit code is 1.
+"""
+import argparse
+import copy
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timezone
+
+# the app reads its settings from the environment when it is imported
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("REDIS_DB", "0")
+BENCHMARK_DIR = tempfile.mkdtemp(prefix="geoflip-benchmark-")
+os.environ.setdefault("UPLOADS_PATH", os.path.join(BENCHMARK_DIR, "uploads"))
+os.environ.setdefault("OUTPUT_PATH", os.path.join(BENCHMARK_DIR, "output"))
+
+import geopandas as gpd
+import pyproj
+import shapely
+
+from resources.v1.transform.transformations import apply_transformations
+from resources.v1.transform.format.geodataframe import to_shp, to_gpkg, to_dxf, to_geojson, to_csv, to_esrijson
+from resources.v1.transform.format.geodataframe import to_geoparquet, to_flatgeobuf, to_arrow
+from .datasets import DATASETS, SIZES, make_dataset, make_mask
+
+POLYGON_DATASETS = ("polygons",)
+
+TRANSFORMATIONS = {
+    "none": [],
+    "buffer": [{"type": "buffer", "distance": 10, "units": "meters"}],
+    "clip": [{"type": "clip", "clipping_geojson": make_mask(0.5)}],
+    "erase": [{"type": "erase", "erasing_geojson": make_mask(0.5)}],
+    "dissolve": [{"type": "dissolve", "by": ["zone"]}],
+    "union": [{"type": "union"}],
+    "simplify": [{"type": "simplify", "tolerance": 10, "units": "meters"}],
+}
+
+WRITERS = {
+    "shp": lambda gdf, output_dir: to_shp(gdf, None, output_dir, "EPSG:4326"),
+    "gpkg": lambda gdf, output_dir: to_gpkg(gdf, output_dir, "EPSG:4326"),
+    "dxf": lambda gdf, output_dir: to_dxf(gdf, output_dir, "EPSG:4326"),
+    "geojson": lambda gdf, output_dir: to_geojson(gdf, output_dir),
+    "csv": lambda gdf, output_dir: to_csv(gdf, output_dir, "EPSG:4326"),
+    "esrijson": lambda gdf, output_dir: to_esrijson(gdf, output_dir, "EPSG:4326"),
+    "geoparquet": lambda gdf, output_dir: to_geoparquet(gdf, output_dir, "EPSG:4326"),
+    "flatgeobuf": lambda gdf, output_dir: to_flatgeobuf(gdf, output_dir, "EPSG:4326"),
+    "arrow": lambda gdf, output_dir: to_arrow(gdf, output_dir, "EPSG:4326"),
+}
+
+INPUT_FORMATS = ("geojson", "shp", "gpkg", "dxf", "geoparquet", "flatgeobuf", "arrow")
+
+
+def supports(dataset, transformation):
+    # union only accepts polygons
+    return transformation != "union" or dataset in POLYGON_DATASETS
+
+
+def time_case(func, repeat):
+    """Run func repeat times for timing, then once under tracemalloc for memory."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds_median": round(statistics.median(durations), 6),
+        "seconds_min": round(min(durations), 6),
+        "runs": repeat,
+        "python_peak_bytes": peak,
+    }
+
+
+def run_case(results, case, func, repeat, **extra):
+    """Time a case and store its result, recording the error instead when the case fails."""
+    print(f"running {case}", file=sys.stderr)
+    try:
+        results[case] = {**time_case(func, repeat), **extra}
+    except Exception as e:
+        results[case] = {"error": f"{type(e).__name__}: {e}"}
+
+
+def run_direct(datasets, sizes, repeat):
+    """Benchmark apply_transformations and each writer in format/geodataframe.py directly."""
+    results = {}
+    for dataset in datasets:
+        for size in sizes:
+            gdf = make_dataset(dataset, size)
+
+            for name, transformations in TRANSFORMATIONS.items():
+                if name == "none" or not supports(dataset, name):
+                    continue
+                request_data = {"transformations": transformations}
+                case = f"direct/transform/{name}/{dataset}/{size}"
+                run_case(results, case, lambda: apply_transformations(gdf.copy(), request_data), repeat, features=len(gdf))
+
+            for name, writer in WRITERS.items():
+                output_dir = tempfile.mkdtemp(dir=BENCHMARK_DIR)
+
+                def write():
+                    writer(gdf.copy(), output_dir)
+                    for file in os.listdir(output_dir):
+                        os.remove(os.path.join(output_dir, file))
+
+                case = f"direct/write/{name}/{dataset}/{size}"
+                run_case(results, case, write, repeat, features=len(gdf))
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+    return results
+
+
+def make_input(gdf, input_format, work_dir):
+    """Write the dataset in the given input format and return (path or geojson dict)."""
+    match input_format:
+        case "geojson":
+            return json.loads(gdf.to_json())
+        case "shp":
+            shp_dir = os.path.join(work_dir, "input")
+            os.makedirs(shp_dir, exist_ok=True)
+            # shapefiles hold a single geometry type
+            gdf[gdf.geometry.type.isin(gdf.geometry.type.iloc[:1])].to_file(os.path.join(shp_dir, "input.shp"))
+            zip_path = os.path.join(work_dir, "input.zip")
+            with zipfile.ZipFile(zip_path, "w") as zipf:
+                for file in os.listdir(shp_dir):
+                    zipf.write(os.path.join(shp_dir, file), arcname=file)
+            return zip_path
+        case "gpkg":
+            path = os.path.join(work_dir, "input.gpkg")
+            gdf.to_file(path, driver="GPKG")
+            return path
+        case "dxf":
+            path = os.path.join(work_dir, "input.dxf")
+            gdf[["geometry"]].to_file(path, driver="DXF")
+            return path
+        case "geoparquet":
+            return to_geoparquet(gdf, work_dir, "EPSG:4326")
+        case "flatgeobuf":
+            return to_flatgeobuf(gdf, work_dir, "EPSG:4326")
+        case "arrow":
+            return to_arrow(gdf, work_dir, "EPSG:4326")
+
+
+def http_request(client, input_format, source, config):
+    if input_format == "geojson":
+        return client.post("/v1/transform/geojson", json={"input_geojson": source, **config})
+
+    if input_format == "dxf":
+        config = {**config, "input_crs": "EPSG:4326"}
+    with open(source, "rb") as f:
+        body = f.read()
+    data = {"file": (io.BytesIO(body), os.path.basename(source)), "config": json.dumps(config)}
+    return client.post(f"/v1/transform/{input_format}", data=data, content_type="multipart/form-data")
+
+
+def run_http(datasets, sizes, repeat):
+    """Benchmark every input x transformation x output combination through the Flask test client."""
+    from app import create_app
+
+    client = create_app().test_client()
+    os.makedirs(os.environ["UPLOADS_PATH"], exist_ok=True)
+    os.makedirs(os.environ["OUTPUT_PATH"], exist_ok=True)
+
+    results = {}
+    for dataset in datasets:
+        for size in sizes:
+            gdf = make_dataset(dataset, size)
+            work_dir = tempfile.mkdtemp(dir=BENCHMARK_DIR)
+            inputs = {input_format: make_input(gdf, input_format, work_dir) for input_format in INPUT_FORMATS}
+
+            for input_format, source in inputs.items():
+                for name, transformations in TRANSFORMATIONS.items():
+                    if not supports(dataset, name):
+                        continue
+                    for output_format in WRITERS:
+                        config = {
+                            "output_format": output_format,
+                            "output_crs": "EPSG:4326",
+                            "to_file": True,
+                            "transformations": copy.deepcopy(transformations),
+                        }
+                        case = f"http/{input_format}/{name}/{output_format}/{dataset}/{size}"
+
+                        def request():
+                            response = http_request(client, input_format, source, config)
+                            response.close()
+                            if response.status_code != 200:
+                                raise RuntimeError(f"status {response.status_code}: {response.get_data(as_text=True)}")
+
+                        run_case(results, case, request, repeat, features=len(gdf))
+
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_environment():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "geopandas": gpd.__version__,
+        "shapely": shapely.__version__,
+        "pyproj": pyproj.__version__,
+        "geos": shapely.geos_version_string,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the cases that are slower or use more memory than the baseline by more than threshold."""
+    regressions = []
+    for case, result in results.items():
+        previous = baseline["results"].get(case)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+
+        for metric in ("seconds_median", "python_peak_bytes"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append({
+                    "case": case,
+                    "metric": metric,
+                    "baseline": previous[metric],
+                    "current": result[metric],
+                    "change": round(result[metric] / previous[metric] - 1, 4),
+                })
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geoflip benchmark suite")
+    parser.add_argument("--suite", choices=["direct", "http", "all"], default="direct")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results json to this path")
+    parser.add_argument("--baseline", help="compare against a results json saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="also write the results to this path as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative growth before a case is flagged")
+    args = parser.parse_args(argv)
+
+    results = {}
+    try:
+        if args.suite in ("direct", "all"):
+            results.update(run_direct(args.datasets, args.sizes, args.repeat))
+        if args.suite in ("http", "all"):
+            results.update(run_http(args.datasets, args.sizes, args.repeat))
+    finally:
+        shutil.rmtree(BENCHMARK_DIR, ignore_errors=True)
+
+    report = {"environment": get_environment(), "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        json.dump(report, sys.stdout, indent=2)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['metric']}: {regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})")
+    print(f"{len(regressions)} regressions in {len(results)} cases (threshold {args.threshold:.0%})")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,65 @@
 # celery_worker.py
 import os
 from celery import Celery, Task
+from celery.signals import worker_ready, worker_process_init, task_postrun, task_revoked
+
+from utils.metrics import start_metrics_server
+from utils.task_routing import release_tenant_slot
+from utils.task_events import publish_task_event
+from utils.task_memory import admit_task, release_task_memory, limit_child_memory, is_memory_error, MEMORY_ERROR_MESSAGE
 
 def celery_init_app(app):
     class FlaskTask(Task):
         def __call__(self, *args: object, **kwargs: object) -> object:
             with app.app_context():
-                return self.run(*args, **kwargs)
+                # a job that does not fit in the free worker memory is put back on its queue, see utils.task_memory
+                admit_task(self)
+                try:
+                    return self.run(*args, **kwargs)
+                except Exception as e:
+                    # running past the child memory limit fails the job with a clear error instead of killing the child
+                    if is_memory_error(e):
+                        raise MemoryError(MEMORY_ERROR_MESSAGE) from e
+                    raise
+                finally:
+                    release_task_memory(self.request.id)
+
+        def update_state(self, task_id=None, state=None, meta=None, **kwargs):
+            super().update_state(task_id, state, meta, **kwargs)
+            # clients following the task on /v1/transform/result/<task_id>/events get the update pushed to them
+            publish_task_event(task_id or self.request.id, state, meta)
 
     celery_app = Celery(app.name, task_cls=FlaskTask)
     celery_app.config_from_object(app.config["CELERY"])
     celery_app.set_default()
     app.extensions["celery"] = celery_app
     return celery_app
+
+@worker_ready.connect
+def start_worker_metrics_server(**kwargs):
+    # the worker has no web server of its own, so expose its metrics on a separate port
+    metrics_port = os.getenv("CELERY_METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+@worker_process_init.connect
+def limit_worker_child_memory(**kwargs):
+    limit_child_memory()
+
+@task_postrun.connect
+def release_task_tenant_slot(task_id=None, state=None, **kwargs):
+    # the job no longer counts against its tenant, see utils.task_routing.claim_tenant_slot,
+    # unless it is being continued or was deferred to a new execution
+    if state not in ("RETRY", "IGNORED"):
+        release_tenant_slot(task_id)
+
+@task_postrun.connect
+def publish_task_end(task_id=None, state=None, **kwargs):
+    # the result is stored in the backend by now, the event streams fetch it from there,
+    # a deferred task has published its DEFERRED state already
+    if state != "IGNORED":
+        publish_task_event(task_id, state)
+
+@task_revoked.connect
+def release_revoked_task_tenant_slot(request=None, **kwargs):
+    release_tenant_slot(request.id)
@@ -2,4 +2,9 @@ from .readers.geojson.blueprint import GeojsonBlueprint
 from .readers.shp.blueprint import ShapefileBlueprint
 from .readers.gpkg.blueprint import GeopackageBlueprint
 from .readers.dxf.blueprint import DXFBlueprint
+from .readers.geoparquet.blueprint import GeoParquetBlueprint
+from .readers.flatgeobuf.blueprint import FlatGeobufBlueprint
+from .readers.arrow.blueprint import ArrowBlueprint
+from .readers.geojsonseq.blueprint import GeoJSONSeqBlueprint
+from .readers.uploads.blueprint import UploadBlueprint
 from .readers.async_result import AsyncTaskResultBlueprint
\ No newline at end of file
@@ -0,0 +1,122 @@
+import json
+
+import msgpack
+import pyarrow as pa
+from flask_smorest import abort
+from webargs import core
+from webargs.flaskparser import FlaskParser, is_json_request
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# header carrying the request config when the body is an arrow stream rather than a json document
+CONFIG_HEADER = "X-Geoflip-Config"
+
+# Accept header values that select a binary output format, json clients keep using output_format
+ACCEPT_OUTPUT_FORMATS = {
+    "application/vnd.apache.parquet": "geoparquet",
+    "application/x-parquet": "geoparquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/flatgeobuf": "flatgeobuf",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+def decode_msgpack_body(req):
+    """
+    Decode a msgpack request body, it has the same structure as the json body.
+
+    Any of the FeatureCollections in it can use the columnar wkb encoding instead of features:
+    {"type": "FeatureCollection", "encoding": "wkb", "geometry": [<wkb bytes>, ...], "properties": {"name": [...]}}
+    """
+    try:
+        return msgpack.unpackb(req.get_data(cache=True), raw=False)
+    except (msgpack.UnpackException, ValueError) as e:
+        logger.error(f"Invalid msgpack body: {e}")
+        abort(400, message="Invalid msgpack body.")
+
+def table_to_wkb_collection(table):
+    """
+    Convert an arrow table with a wkb geometry column into a FeatureCollection in the columnar wkb encoding.
+
+    The geometry column and crs are read from the GeoParquet "geo" metadata when present,
+    otherwise the geometries are expected in a 'geometry' column in EPSG:4326.
+    """
+    geometry_column = "geometry"
+    crs = "EPSG:4326"
+    metadata = table.schema.metadata or {}
+    if b"geo" in metadata:
+        geo = json.loads(metadata[b"geo"])
+        geometry_column = geo["primary_column"]
+        crs = geo["columns"][geometry_column].get("crs", "OGC:CRS84")
+
+    return {
+        "type": "FeatureCollection",
+        "encoding": "wkb",
+        "crs": crs,
+        "geometry": table.column(geometry_column).to_pylist(),
+        "properties": table.drop_columns([geometry_column]).to_pydict(),
+    }
+
+def decode_arrow_body(req):
+    """Decode an arrow ipc stream body into the json body structure, with the config taken from the X-Geoflip-Config header."""
+    try:
+        config = json.loads(req.headers.get(CONFIG_HEADER, "{}"))
+    except json.JSONDecodeError:
+        abort(400, message=f"Invalid JSON format in the '{CONFIG_HEADER}' header.")
+
+    try:
+        table = pa.ipc.open_stream(req.get_data(cache=True)).read_all()
+        input_geojson = table_to_wkb_collection(table)
+    except (pa.ArrowException, KeyError) as e:
+        logger.error(f"Invalid arrow stream body: {e}")
+        abort(400, message="Invalid arrow stream body, it must be an arrow ipc stream with a wkb geometry column.")
+
+    return {**config, "input_geojson": input_geojson}
+
+def decode_ndjson_body(req):
+    """Decode a newline delimited json body of batch jobs, one job per line, into {"jobs": [...]}."""
+    try:
+        lines = req.get_data(cache=True).decode("utf-8").splitlines()
+        return {"jobs": [json.loads(line) for line in lines if line.strip()]}
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        logger.error(f"Invalid ndjson body: {e}")
+        abort(400, message="Invalid ndjson body, it must hold one json job per line.")
+
+BODY_DECODERS = {
+    "application/msgpack": decode_msgpack_body,
+    "application/x-msgpack": decode_msgpack_body,
+    "application/vnd.apache.arrow.stream": decode_arrow_body,
+    "application/x-ndjson": decode_ndjson_body,
+}
+
+def negotiate_output_format(req, data):
+    """Override output_format when the Accept header explicitly asks for one of the binary output formats."""
+    if not isinstance(data, dict):
+        return data
+
+    for mimetype, quality in req.accept_mimetypes:
+        if quality > 0 and mimetype in ACCEPT_OUTPUT_FORMATS:
+            data["output_format"] = ACCEPT_OUTPUT_FORMATS[mimetype]
+            data.setdefault("output_crs", "EPSG:4326")
+            break
+
+    return data
+
+class EncodedBodyParser(FlaskParser):
+    """
+    Arguments parser that loads the "json" location from a json, msgpack or arrow stream body
+    depending on the Content-Type, and applies the Accept header to the output format.
+    """
+
+    def _raw_load_json(self, req):
+        decoder = BODY_DECODERS.get(req.mimetype)
+        if decoder is not None:
+            data = decoder(req)
+        elif is_json_request(req):
+            data = core.parse_json(req.get_data(cache=True))
+        else:
+            return core.missing
+
+        return negotiate_output_format(req, data)
@@ -2,8 +2,39 @@ import os
 import zipfile
 from pyproj.exceptions import CRSError
 import json
+import msgpack
 from pyproj import CRS
 
+from resources.v1.transform.transformations.geometry_metadata import get_geometry_metadata, GEOMETRY_TYPE_NAMES
+from resources.v1.transform.transformations.geometry_metadata import POINT_TYPE_IDS, LINE_TYPE_IDS, POLYGON_TYPE_IDS
+
+
+def set_output_precision(input_gdf, output_crs, precision):
+    """
+    Reproject to the output CRS and snap coordinates to a grid of 10^-precision CRS units,
+    so the writers emit fewer digits. Geometries are kept valid while snapping, those that
+    collapse completely (e.g. a sliver polygon narrower than the grid) are dropped.
+
+    Parameters:
+    input_gdf (GeoDataFrame): The GeoDataFrame to write.
+    output_crs (str): The CRS the output will be written in.
+    precision (int): Number of decimal places to keep.
+
+    Returns:
+    GeoDataFrame: The reprojected GeoDataFrame with snapped coordinates.
+    """
+    try:
+        input_gdf = input_gdf.to_crs(output_crs)
+    except CRSError:
+        raise CRSError(f"Invalid output crs: {output_crs}")
+
+    snapped = input_gdf.geometry.set_precision(10 ** -precision)
+    keep = ~(snapped.isna() | snapped.is_empty)
+
+    output_gdf = input_gdf[keep].copy()
+    output_gdf[output_gdf.geometry.name] = snapped[keep]
+    return output_gdf
+
 
 def to_shp(input_gdf, schema, output_dir, output_crs="EPSG:4326"):
     # reproject to output crs
@@ -12,21 +43,24 @@ def to_shp(input_gdf, schema, output_dir, output_crs="EPSG:4326"):
     except CRSError:
         raise CRSError(f"Invalid output crs: {output_crs}")
 
+    # the geometry types are computed once for the schema and the three shapefiles
+    metadata = get_geometry_metadata(input_gdf)
+
     # Determine the geometry type after transformation
-    new_geom_type = input_gdf.geometry.iloc[0].geom_type if not input_gdf.empty else None
+    new_geom_type = GEOMETRY_TYPE_NAMES.get(metadata.type_ids[0]) if not input_gdf.empty else None
 
     # Update the schema to reflect the new geometry type (Polygon, MultiPolygon, etc.)
     if new_geom_type and schema is not None:
         schema['geometry'] = new_geom_type
 
     # Create a shapefile for each aggregated geometry type
-    for geom_types, shapefile_name in [
-        (['Point', 'MultiPoint'], 'Point'),
-        (['LineString', 'MultiLineString'], 'LineString'),
-        (['Polygon', 'MultiPolygon'], 'Polygon')
+    for type_ids, shapefile_name in [
+        (POINT_TYPE_IDS, 'Point'),
+        (LINE_TYPE_IDS, 'LineString'),
+        (POLYGON_TYPE_IDS, 'Polygon')
     ]:
         # Filter to the specified geometry types
-        gdf_filtered = input_gdf[input_gdf.geometry.type.isin(geom_types)]
+        gdf_filtered = input_gdf[metadata.type_mask(type_ids)]
         if not gdf_filtered.empty:
             shapefile_path = os.path.join(output_dir, f"{shapefile_name}.shp")
             gdf_filtered.to_file(shapefile_path, schema=schema, driver="ESRI Shapefile", engine="fiona")
@@ -106,7 +140,40 @@ def to_geojson(input_gdf, output_dir):
     
     return geojson_path
 
-def to_csv(input_gdf, output_dir, output_crs="EPSG:4326"):
+# features serialised at a time when writing geojsonseq, bounding the size of the text held in memory
+GEOJSONSEQ_WRITE_ROWS = 10000
+
+def format_geojsonseq(input_gdf):
+    """
+    Serialise the features of a GeoDataFrame as geojsonseq, one GeoJSON Feature in EPSG:4326 per line.
+
+    Parameters:
+    input_gdf (GeoDataFrame): The features to serialise.
+
+    Returns:
+    str: The newline delimited features.
+    """
+    if input_gdf.crs is not None and input_gdf.crs != "EPSG:4326":
+        input_gdf = input_gdf.to_crs("EPSG:4326")
+    # values json has no type for (e.g. timestamps) are written as strings
+    return "".join(json.dumps(feature, default=str) + "\n" for feature in input_gdf.iterfeatures(na="null", drop_id=True))
+
+def to_geojsonseq(input_gdf, output_dir, on_progress=None):
+    input_gdf = input_gdf.to_crs("EPSG:4326")
+    geojsonseq_path = os.path.join(output_dir, "geoflip.geojsonseq")
+
+    try:
+        with open(geojsonseq_path, "w") as f:
+            for start in range(0, len(input_gdf), GEOJSONSEQ_WRITE_ROWS):
+                if on_progress is not None:
+                    on_progress(start, len(input_gdf))
+                f.write(format_geojsonseq(input_gdf.iloc[start:start + GEOJSONSEQ_WRITE_ROWS]))
+    except Exception as e:
+        raise Exception(f"Error converting to GeoJSONSeq: {e}")
+
+    return geojsonseq_path
+
+def to_csv(input_gdf, output_dir, output_crs="EPSG:4326", precision=None):
     try:
         # Reproject to the specified output CRS
         input_gdf = input_gdf.to_crs(output_crs)
@@ -116,11 +183,12 @@ def to_csv(input_gdf, output_dir, output_crs="EPSG:4326"):
     csv_file_path = os.path.join(output_dir, "geoflip.csv")
 
     try:
-        # Convert geometry to WKT
-        input_gdf["geometry"] = input_gdf["geometry"].apply(lambda geom: geom.wkt)
+        # Convert geometry to WKT, keeping full precision unless an output precision was requested
+        rounding_precision = precision if precision is not None else -1
+        csv_df = input_gdf.to_wkt(rounding_precision=rounding_precision)
 
         # Save as CSV
-        input_gdf.to_csv(csv_file_path, index=False)
+        csv_df.to_csv(csv_file_path, index=False)
 
     except Exception as e:
         raise Exception(f"Error converting to CSV: {e}")
@@ -207,7 +275,10 @@ def convert_shapely_to_esri(geometry):
                 "geometries": []
             }
 
-def create_esrijson_from_gdf(input_gdf, output_crs):
+# rows converted to esrijson between two progress updates
+PROGRESS_ROWS = 1000
+
+def create_esrijson_from_gdf(input_gdf, output_crs, on_progress=None):
     try:
         crs_obj = CRS.from_string(output_crs)
         # This works if the CRS has an authority code (like EPSG).
@@ -224,7 +295,10 @@ def create_esrijson_from_gdf(input_gdf, output_crs):
     }
 
     # Iterate each row in the GeoDataFrame
-    for idx, row in input_gdf.iterrows():
+    for i, (idx, row) in enumerate(input_gdf.iterrows()):
+        if on_progress is not None and i % PROGRESS_ROWS == 0:
+            on_progress(i, len(input_gdf))
+
         # Convert all non-geometry fields to attributes
         attributes = row.to_dict()
         # Remove the geometry column from attributes
@@ -241,7 +315,7 @@ def create_esrijson_from_gdf(input_gdf, output_crs):
     
     return esrijson_data
 
-def to_esrijson(input_gdf, output_dir, output_crs="EPSG:4326"):
+def to_esrijson(input_gdf, output_dir, output_crs="EPSG:4326", on_progress=None):
     try:
         # Reproject to the specified output CRS
         input_gdf = input_gdf.to_crs(output_crs)
@@ -250,7 +324,7 @@ def to_esrijson(input_gdf, output_dir, output_crs="EPSG:4326"):
     esrijson_file_path = os.path.join(output_dir, "geoflip.esrijson")
 
     try:
-        esrijson_data = create_esrijson_from_gdf(input_gdf, output_crs)
+        esrijson_data = create_esrijson_from_gdf(input_gdf, output_crs, on_progress)
 
         # Write out the EsriJSON file
         with open(esrijson_file_path, "w") as f:
@@ -260,3 +334,102 @@ def to_esrijson(input_gdf, output_dir, output_crs="EPSG:4326"):
         raise Exception(f"Error converting to esrijson: {e}")
 
     return esrijson_file_path
+
+# compression codecs each columnar format can be written with, the first one is the default
+GEOPARQUET_COMPRESSION = ["snappy", "zstd", "gzip", "brotli", "lz4", "none"]
+ARROW_COMPRESSION = ["none", "lz4", "zstd"]
+
+# rows per parquet row group, small enough that bbox reads can skip most of a large file
+GEOPARQUET_ROW_GROUP_SIZE = 65536
+
+def get_output_compression(output_format, compression=None):
+    """
+    Resolve the compression codec for a columnar output format.
+
+    Parameters:
+    output_format (str): "geoparquet" or "arrow".
+    compression (str, optional): The requested codec, the format default when None.
+
+    Returns:
+    str: The codec name, or None for no compression.
+    """
+    supported = GEOPARQUET_COMPRESSION if output_format == "geoparquet" else ARROW_COMPRESSION
+    if compression is None:
+        compression = supported[0]
+    if compression not in supported:
+        raise ValueError(f"Unsupported output compression for {output_format}: {compression}. Supported values are: {', '.join(supported)}.")
+
+    return None if compression == "none" else compression
+
+def to_geoparquet(input_gdf, output_dir, output_crs="EPSG:4326", compression=None):
+    try:
+        input_gdf = input_gdf.to_crs(output_crs)
+    except CRSError:
+        raise CRSError(f"Invalid output crs: {output_crs}")
+
+    compression = get_output_compression("geoparquet", compression)
+    geoparquet_path = os.path.join(output_dir, "geoflip.parquet")
+
+    # geometries are encoded to WKB in one vectorized pass, the bbox covering column lets
+    # readers skip row groups outside their area of interest
+    input_gdf.to_parquet(
+        geoparquet_path,
+        index=False,
+        compression=compression,
+        write_covering_bbox=True,
+        row_group_size=GEOPARQUET_ROW_GROUP_SIZE
+    )
+
+    return geoparquet_path
+
+def to_flatgeobuf(input_gdf, output_dir, output_crs="EPSG:4326"):
+    try:
+        input_gdf = input_gdf.to_crs(output_crs)
+    except CRSError:
+        raise CRSError(f"Invalid output crs: {output_crs}")
+
+    flatgeobuf_path = os.path.join(output_dir, "geoflip.fgb")
+
+    # write through the arrow interface so no python object is created per feature,
+    # the packed hilbert r-tree is written ahead of the features for streaming bbox reads
+    input_gdf.to_file(flatgeobuf_path, driver="FlatGeobuf", engine="pyogrio", use_arrow=True, SPATIAL_INDEX="YES")
+
+    return flatgeobuf_path
+
+def to_arrow(input_gdf, output_dir, output_crs="EPSG:4326", compression=None):
+    try:
+        input_gdf = input_gdf.to_crs(output_crs)
+    except CRSError:
+        raise CRSError(f"Invalid output crs: {output_crs}")
+
+    compression = get_output_compression("arrow", compression)
+    arrow_path = os.path.join(output_dir, "geoflip.arrow")
+
+    # arrow ipc file (feather v2) with the geoparquet "geo" metadata, uncompressed files can be memory-mapped by readers
+    input_gdf.to_feather(arrow_path, index=False, compression=compression or "uncompressed")
+
+    return arrow_path
+
+def to_msgpack(input_gdf, output_dir, output_crs="EPSG:4326"):
+    try:
+        input_gdf = input_gdf.to_crs(output_crs)
+    except CRSError:
+        raise CRSError(f"Invalid output crs: {output_crs}")
+
+    msgpack_path = os.path.join(output_dir, "geoflip.msgpack")
+
+    # the same columnar wkb encoding the geojson endpoint accepts as a msgpack body
+    geometry_name = input_gdf.geometry.name
+    output_data = {
+        "type": "FeatureCollection",
+        "encoding": "wkb",
+        "crs": output_crs,
+        "geometry": list(input_gdf.geometry.to_wkb()),
+        "properties": input_gdf.drop(columns=[geometry_name]).to_dict(orient="list"),
+    }
+
+    with open(msgpack_path, "wb") as f:
+        # values msgpack has no type for (e.g. timestamps) are written as strings
+        msgpack.pack(output_data, f, default=str)
+
+    return msgpack_path
@@ -1,51 +1,180 @@
 
+import json
 import shutil 
 import os
 
-from flask import send_file, after_this_request, make_response
+import geopandas as gpd
+from flask import send_file, after_this_request, make_response, request
 from pyproj.exceptions import CRSError
 
-from .geodataframe import to_shp, to_gpkg, to_dxf, to_geojson, to_csv, to_esrijson, create_esrijson_from_gdf
+from .geodataframe import to_shp, to_gpkg, to_dxf, to_geojson, to_geojsonseq, format_geojsonseq, to_csv, to_esrijson, create_esrijson_from_gdf
+from .geodataframe import to_geoparquet, to_flatgeobuf, to_arrow, to_msgpack
+from .geodataframe import set_output_precision, get_output_compression
 
 from utils.logger import get_logger
+from utils.instrumentation import format_server_timing
+from utils.compression import get_response_encoding, compress_bytes, get_compressed_file
 
 logger = get_logger(__name__)
 
-def generate_output_file_stream(transform_result, to_file=False):
+# content types of the binary output formats, the other file outputs are sent as application/octet-stream
+OUTPUT_MIMETYPES = {
+    "GEOPARQUET": "application/vnd.apache.parquet",
+    "ARROW": "application/vnd.apache.arrow.file",
+    "FLATGEOBUF": "application/flatgeobuf",
+    "MSGPACK": "application/msgpack",
+    "NDJSON": "application/x-ndjson",
+    "GEOJSONSEQ": "application/geo+json-seq",
+}
+
+# text outputs are compressed when the client sends Accept-Encoding, the others are binary or already compressed
+COMPRESSIBLE_FORMATS = ("GEOJSON", "GEOJSONSEQ", "ESRIJSON", "CSV", "DXF", "NDJSON")
+
+# output formats that can be written a chunk at a time, see ChunkedOutput
+CHUNKED_OUTPUT_FORMATS = ("gpkg", "geojsonseq")
+
+class ChunkedOutput:
+    """
+    An output file written a chunk at a time, for requests too large to hold in memory.
+
+    Each chunk is reprojected (and quantized when output_precision is set) on its own and
+    appended to the file, a geopackage through GDAL in append mode and geojsonseq as text.
+
+    Parameters:
+    request_data (dict): The validated request payload, output_format in CHUNKED_OUTPUT_FORMATS.
+    request_id (str): The id of the request, used for the output directory.
+    """
+
+    def __init__(self, request_data, request_id):
+        self.output_format = request_data["output_format"]
+        self.output_crs = "EPSG:4326" if self.output_format == "geojsonseq" else request_data["output_crs"]
+        self.output_precision = request_data.get("output_precision")
+        self.output_dir = os.path.join(os.getenv("OUTPUT_PATH"), request_id)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.file_path = os.path.join(self.output_dir, f"geoflip.{self.output_format}")
+        self.rows = 0
+        self.empty_gdf = None
+
+    def write(self, gdf):
+        """Append the features of gdf to the output file."""
+        if self.empty_gdf is None:
+            self.empty_gdf = gdf.iloc[:0]
+        if gdf.empty:
+            return
+
+        try:
+            if self.output_precision is not None:
+                gdf = set_output_precision(gdf, self.output_crs, self.output_precision)
+            else:
+                gdf = gdf.to_crs(self.output_crs)
+        except CRSError:
+            logger.error(f"Invalid output crs: {self.output_crs}")
+            raise CRSError(f"Invalid output crs: {self.output_crs}")
+
+        if self.output_format == "geojsonseq":
+            with open(self.file_path, "a") as f:
+                f.write(format_geojsonseq(gdf))
+        else:
+            # the layer geometry type is set by the first chunk, promote so later multi part chunks fit it
+            gdf.to_file(self.file_path, driver="GPKG", engine="pyogrio", mode="a" if self.rows else "w", promote_to_multi=True)
+        self.rows += len(gdf)
+
+    def close(self):
+        """
+        Finish the output, writing an empty one when no chunk had any features.
+
+        Returns:
+        tuple: (response_size, file_path)
+        """
+        if not self.rows:
+            if self.output_format == "geojsonseq":
+                open(self.file_path, "a").close()
+            else:
+                empty_gdf = self.empty_gdf if self.empty_gdf is not None else gpd.GeoDataFrame(geometry=[], crs=self.output_crs)
+                to_gpkg(empty_gdf, self.output_dir, self.output_crs)
+        return os.path.getsize(self.file_path), self.file_path
+
+def generate_output_file_stream(transform_result, to_file=False, cleanup=True):
+    """
+    Build the response for a transform result.
+
+    Parameters:
+    transform_result (dict): The result of a transform, merge or append.
+    to_file (bool): Whether geojson and esrijson outputs were written to a file.
+    cleanup (bool): Remove the output file once it is sent, False while the output is shared with other async requests.
+
+    Returns:
+    Response: The output response.
+    """
     output_file_response = transform_result["output_file_response"]
 
     if transform_result["output_format"] in ("GEOJSON", "ESRIJSON") and not to_file:
         # For GeoJSON, we keep the existing behavior
-        response = make_response(output_file_response, 200)
+        if not isinstance(output_file_response, str):
+            output_file_response = json.dumps(output_file_response)
+        body = output_file_response.encode("utf-8")
+
+        encoding = get_response_encoding(request, len(body))
+        if encoding is not None:
+            body = compress_bytes(body, encoding)
+
+        response = make_response(body, 200)
+        response.mimetype = "application/json"
     else:
         file_path = output_file_response
         output_dir = os.path.dirname(file_path)
 
-        @after_this_request
-        def cleanup(response):
-            shutil.rmtree(output_dir, ignore_errors=True)
-            return response
+        if cleanup:
+            @after_this_request
+            def remove_output(response):
+                shutil.rmtree(output_dir, ignore_errors=True)
+                return response
+
+        encoding = None
+        if transform_result["output_format"] in COMPRESSIBLE_FORMATS:
+            encoding = get_response_encoding(request, os.path.getsize(file_path))
 
         response = send_file(
-            file_path,
+            get_compressed_file(file_path, encoding) if encoding is not None else file_path,
             as_attachment=True,
             download_name=os.path.basename(file_path),
-            mimetype='application/octet-stream'
+            mimetype=OUTPUT_MIMETYPES.get(transform_result["output_format"], 'application/octet-stream')
         )
 
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if transform_result["output_format"] in COMPRESSIBLE_FORMATS:
+        response.vary.add('Accept-Encoding')
+
     # Add metadata headers
     response.headers['Metadata-Response-Size'] = str(transform_result["response_size"])
     response.headers['Metadata-Request-Size'] = str(transform_result["request_size"])
     response.headers['Metadata-Transformations'] = str(transform_result["transformations"])
     response.headers['Metadata-Input-Format'] = str(transform_result["input_format"])
     response.headers['Metadata-Output-Format'] = str(transform_result["output_format"])
+    if "geometries_repaired" in transform_result:
+        response.headers['Metadata-Geometries-Repaired'] = str(transform_result["geometries_repaired"])
+    if "vertices_removed" in transform_result:
+        response.headers['Metadata-Vertices-Removed'] = str(transform_result["vertices_removed"])
+    if "metrics" in transform_result:
+        response.headers['Server-Timing'] = format_server_timing(transform_result["metrics"])
 
     return response
 
-def create_output_response(request_data, request_id, gdf, schema=None, to_file=False, request_size=0):
+def create_output_response(request_data, request_id, gdf, schema=None, to_file=False, request_size=0, on_progress=None):
     output_dir = os.path.join(os.getenv("OUTPUT_PATH"), request_id)
     os.makedirs(output_dir, exist_ok=True)
 
+    # reject a compression codec the columnar format cannot be written with before doing any work
+    if request_data['output_format'] in ("geoparquet", "arrow"):
+        get_output_compression(request_data['output_format'], request_data.get("output_compression"))
+
+    # quantize coordinates in the CRS they will be written in, geojson is always written in EPSG:4326
+    output_precision = request_data.get("output_precision")
+    if output_precision is not None:
+        precision_crs = "EPSG:4326" if request_data['output_format'] in ("geojson", "geojsonseq") else request_data.get("output_crs", "EPSG:4326")
+        gdf = set_output_precision(gdf, precision_crs, output_precision)
+
     # convert the GeoDataFrame to desired output format
     match request_data['output_format']:
         case "shp":
@@ -82,6 +211,16 @@ def create_output_response(request_data, request_id, gdf, schema=None, to_file=F
                 response = gdf.to_crs("EPSG:4326").to_json()
                 response_size = len(str(response).encode('utf-8')) 
 
+        case "geojsonseq":
+            # always written to a file, it is streamed to the client from there
+            try:
+                geojsonseq_file_path = to_geojsonseq(gdf, output_dir, on_progress)
+                response = geojsonseq_file_path
+                response_size = os.path.getsize(geojsonseq_file_path)
+            except Exception as e:
+                logger.error(f"Error converting to geojsonseq: {e}")
+                raise Exception(f"Error converting to geojsonseq: ({e})")
+
         case "gpkg":
             try:
                 output_crs = request_data["output_crs"]
@@ -123,7 +262,7 @@ def create_output_response(request_data, request_id, gdf, schema=None, to_file=F
         case 'csv':
             try:
                 output_crs = request_data.get("output_crs", "EPSG:4326")
-                csv_file_path = to_csv(gdf, output_dir, output_crs)
+                csv_file_path = to_csv(gdf, output_dir, output_crs, precision=output_precision)
 
                 try:
                     response_size = os.path.getsize(csv_file_path)
@@ -146,7 +285,7 @@ def create_output_response(request_data, request_id, gdf, schema=None, to_file=F
                 if to_file:
                     try:
                         # Stream and send the EsriJSON file, with cleanup afterward
-                        esrijson_file_path = to_esrijson(gdf, output_dir, output_crs)
+                        esrijson_file_path = to_esrijson(gdf, output_dir, output_crs, on_progress)
                         response = esrijson_file_path
                         response_size = os.path.getsize(esrijson_file_path)
                     except Exception as e:
@@ -154,7 +293,7 @@ def create_output_response(request_data, request_id, gdf, schema=None, to_file=F
                         raise Exception(f"Error sending file: ({e})")
                 else:
                     # return the esrijson data
-                    response = create_esrijson_from_gdf(gdf, output_crs)
+                    response = create_esrijson_from_gdf(gdf, output_crs, on_progress)
                     response_size = len(str(response).encode('utf-8')) 
             except CRSError:
                 logger.error(f"Invalid output CRS: {output_crs}")
@@ -163,6 +302,78 @@ def create_output_response(request_data, request_id, gdf, schema=None, to_file=F
                 logger.error(f"Error converting to esrijson: {e}")
                 raise Exception(f"Error converting to esrijson: ({e})")
 
+        case "geoparquet":
+            try:
+                output_crs = request_data["output_crs"]
+                geoparquet_file_path = to_geoparquet(gdf, output_dir, output_crs, request_data.get("output_compression"))
+
+                try:
+                    response = geoparquet_file_path
+                    response_size = os.path.getsize(geoparquet_file_path)
+                except Exception as e:
+                    logger.error(f"Error sending file: {e}")
+                    raise Exception(f"Error sending file: ({e})")
+            except CRSError:
+                logger.error(f"Invalid output crs: {output_crs}")
+                raise CRSError(f"Invalid output crs: {output_crs}")
+            except Exception as e:
+                logger.error(f"Error converting to geoparquet: {e}")
+                raise Exception(f"Error converting to geoparquet: ({e})")
+
+        case "flatgeobuf":
+            try:
+                output_crs = request_data["output_crs"]
+                flatgeobuf_file_path = to_flatgeobuf(gdf, output_dir, output_crs)
+
+                try:
+                    response = flatgeobuf_file_path
+                    response_size = os.path.getsize(flatgeobuf_file_path)
+                except Exception as e:
+                    logger.error(f"Error sending file: {e}")
+                    raise Exception(f"Error sending file: ({e})")
+            except CRSError:
+                logger.error(f"Invalid output crs: {output_crs}")
+                raise CRSError(f"Invalid output crs: {output_crs}")
+            except Exception as e:
+                logger.error(f"Error converting to flatgeobuf: {e}")
+                raise Exception(f"Error converting to flatgeobuf: ({e})")
+
+        case "arrow":
+            try:
+                output_crs = request_data["output_crs"]
+                arrow_file_path = to_arrow(gdf, output_dir, output_crs, request_data.get("output_compression"))
+
+                try:
+                    response = arrow_file_path
+                    response_size = os.path.getsize(arrow_file_path)
+                except Exception as e:
+                    logger.error(f"Error sending file: {e}")
+                    raise Exception(f"Error sending file: ({e})")
+            except CRSError:
+                logger.error(f"Invalid output crs: {output_crs}")
+                raise CRSError(f"Invalid output crs: {output_crs}")
+            except Exception as e:
+                logger.error(f"Error converting to arrow: {e}")
+                raise Exception(f"Error converting to arrow: ({e})")
+
+        case "msgpack":
+            try:
+                output_crs = request_data["output_crs"]
+                msgpack_file_path = to_msgpack(gdf, output_dir, output_crs)
+
+                try:
+                    response = msgpack_file_path
+                    response_size = os.path.getsize(msgpack_file_path)
+                except Exception as e:
+                    logger.error(f"Error sending file: {e}")
+                    raise Exception(f"Error sending file: ({e})")
+            except CRSError:
+                logger.error(f"Invalid output crs: {output_crs}")
+                raise CRSError(f"Invalid output crs: {output_crs}")
+            except Exception as e:
+                logger.error(f"Error converting to msgpack: {e}")
+                raise Exception(f"Error converting to msgpack: ({e})")
+
         case "_":
             logger.error(f"Unsupported output format: {request_data['output_format']}")
             raise ValueError("Unsupported output format")
@@ -0,0 +1,3 @@
+from .source import Source
+from .engine import Pipeline, TiledPipeline, PipelineCancelled, run_transform, run_merge, run_append
+from .batch import run_batch, write_batch_output
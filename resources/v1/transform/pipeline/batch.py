@@ -0,0 +1,134 @@
+import base64
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.logger import get_logger
+from utils.async_tasks import get_cancel_check
+from .engine import PipelineCancelled
+from .progress import PROGRESS_INTERVAL
+
+logger = get_logger(__name__)
+
+# jobs of a batch run at the same time, geometry operations release the GIL so threads share the cores
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", min(4, os.cpu_count() or 1)))
+
+def format_job_result(index, result):
+    """
+    Format the result of a batch job as an ndjson line.
+
+    geojson and esrijson outputs are embedded as json, file outputs as base64 with their file name.
+
+    Parameters:
+    index (int): The position of the job in the batch.
+    result (dict): The result of the job, as returned by the pipeline.
+
+    Returns:
+    str: The json line, ending in a newline.
+    """
+    line = {
+        "index": index,
+        "state": "SUCCESS",
+        "output_format": result["output_format"],
+        "transformations": result["transformations"],
+        "response_size": result["response_size"],
+    }
+    output = result["output_file_response"]
+
+    if result["output_format"] in ("GEOJSON", "ESRIJSON") and not result["to_file"]:
+        if isinstance(output, str):
+            # the geojson is already serialised, splice it in rather than parsing and dumping it again
+            return json.dumps(line)[:-1] + f', "output": {output}}}\n'
+        line["output"] = output
+    else:
+        with open(output, "rb") as f:
+            line["output_base64"] = base64.b64encode(f.read()).decode("ascii")
+        line["filename"] = os.path.basename(output)
+
+    return json.dumps(line) + "\n"
+
+def run_batch(jobs, run_job, request_id, request_size, celery_task=None):
+    """
+    Run the independent jobs of a batch on a thread pool, yielding their results in completion order.
+
+    A failed job is reported in its own line and does not stop the others. When the batch is an
+    async task its progress is reported in completed jobs and it can be cancelled between jobs.
+
+    Parameters:
+    jobs (list): The validated job payloads.
+    run_job (callable): Runs one job as run_job(job, request_id, request_size) and returns its result.
+    request_id (str): The id of the batch, each job gets '<request_id>_<index>'.
+    request_size (int): The size of the batch request in bytes, shared evenly by the jobs.
+    celery_task (Task, optional): The bound celery task of an async batch.
+
+    Returns:
+    generator: The ndjson lines, see format_job_result. Failed jobs give {"index", "state": "FAILURE", "error"}.
+    """
+    job_size = request_size // len(jobs)
+    cancel_check = get_cancel_check(celery_task.request.id) if celery_task is not None else None
+    started_at = time.monotonic()
+    reported_at = 0.0
+
+    executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+    try:
+        futures = {executor.submit(run_job, job, f"{request_id}_{index}", job_size): index for index, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                line = format_job_result(index, future.result())
+            except Exception as e:
+                logger.error(f"Batch {request_id} job {index} failed: {e}")
+                line = json.dumps({"index": index, "state": "FAILURE", "error": str(e)}) + "\n"
+            finally:
+                # the output is in the line now
+                shutil.rmtree(os.path.join(os.getenv("OUTPUT_PATH"), f"{request_id}_{index}"), ignore_errors=True)
+            yield line
+
+            if celery_task is None:
+                continue
+            if cancel_check():
+                raise PipelineCancelled(request_id)
+            if time.monotonic() - reported_at >= PROGRESS_INTERVAL or done == len(jobs):
+                reported_at = time.monotonic()
+                elapsed = reported_at - started_at
+                celery_task.update_state(state='PROCESSING', meta={
+                    "message": f"Completed {done} of {len(jobs)} jobs",
+                    "stage": "batch",
+                    "percent": round(100 * done / len(jobs), 1),
+                    "eta_seconds": round(elapsed * (len(jobs) - done) / done),
+                })
+    finally:
+        # a cancelled batch, or a client that closed the stream, does not start the remaining jobs
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def write_batch_output(lines, request_id, request_size, job_count):
+    """
+    Write the result lines of an async batch to an ndjson file for the output endpoint.
+
+    Returns:
+    dict: The result of the batch, in the same form as the result of a transform.
+    """
+    output_dir = os.path.join(os.getenv("OUTPUT_PATH"), request_id)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "geoflip.ndjson")
+
+    try:
+        with open(output_path, "w") as f:
+            for line in lines:
+                f.write(line)
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    return {
+        "message": f"Geojson batch of {job_count} jobs successful",
+        "response_size": os.path.getsize(output_path),
+        "request_size": request_size,
+        "transformations": f"batch {job_count} jobs",
+        "input_format": "GEOJSON",
+        "output_format": "NDJSON",
+        "output_file_response": output_path,
+        "to_file": True,
+    }
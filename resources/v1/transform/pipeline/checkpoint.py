@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import time
+
+import geopandas as gpd
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# checkpoints are written for async tasks only, set to "false" to turn them off
+TASK_CHECKPOINTS = os.getenv("TASK_CHECKPOINTS", "true").lower() == "true"
+
+# checkpoints left behind by tasks that were killed outright are removed after this many seconds
+CHECKPOINT_MAX_AGE = int(os.getenv("CHECKPOINT_MAX_AGE", 24 * 60 * 60))
+
+MANIFEST = "checkpoint.json"
+
+def get_checkpoint_dir():
+    # a shared volume lets a continuation of a task run on a different worker
+    return os.getenv("CHECKPOINT_PATH") or os.path.join(os.getenv("UPLOADS_PATH"), ".checkpoints")
+
+def remove_stale_checkpoints():
+    """Remove checkpoint folders that have not been written to for CHECKPOINT_MAX_AGE seconds."""
+    checkpoint_dir = get_checkpoint_dir()
+    if not os.path.isdir(checkpoint_dir):
+        return
+
+    cutoff = time.time() - CHECKPOINT_MAX_AGE
+    for task_id in os.listdir(checkpoint_dir):
+        path = os.path.join(checkpoint_dir, task_id)
+        if os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed stale checkpoints of task {task_id}")
+
+class CheckpointStore:
+    """
+    Intermediate GeoDataFrames of a task, saved as GeoParquet after each pipeline step.
+
+    Step 0 is the loaded input, step n the output of the n-th transformation. Only the latest
+    step is kept, so a continuation of the task picks up from the last completed step instead
+    of loading and transforming everything again.
+
+    Parameters:
+    task_id (str): The celery task id, it stays the same when the task is retried.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.path = os.path.join(get_checkpoint_dir(), task_id)
+
+    def save(self, step, gdf, state):
+        """
+        Save the GeoDataFrame after a step, replacing the previous checkpoint.
+
+        Checkpointing is best effort, a GeoDataFrame that cannot be written as parquet (e.g. with
+        mixed type columns) is logged and the task carries on without it.
+
+        Parameters:
+        step (int): The number of the completed step.
+        gdf (GeoDataFrame): The GeoDataFrame after the step.
+        state (dict): Json serialisable pipeline state to restore with it.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        file_name = f"step_{step:03d}.parquet"
+        try:
+            gdf.to_parquet(os.path.join(self.path, file_name), compression="zstd")
+        except Exception as e:
+            logger.warning(f"Could not checkpoint step {step} of task {self.task_id}: {e}")
+            return
+
+        # the manifest is replaced atomically, so it always points at a complete parquet file
+        manifest_path = os.path.join(self.path, MANIFEST)
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump({"step": step, "file": file_name, "state": state}, f)
+        previous = self.read_manifest()
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+        if previous is not None and previous["file"] != file_name:
+            os.remove(os.path.join(self.path, previous["file"]))
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def latest(self):
+        """
+        Load the latest checkpoint of the task.
+
+        Returns:
+        tuple: (step, GeoDataFrame, state), or None when the task has no checkpoint.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None
+
+        gdf = gpd.read_parquet(os.path.join(self.path, manifest["file"]))
+        logger.info(f"Resuming task {self.task_id} from step {manifest['step']}")
+        return manifest["step"], gdf, manifest["state"]
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# loaded attributes are stored in compact dtypes while the request runs, set to "false" to turn this off
+COMPACT_ATTRIBUTES = os.getenv("COMPACT_ATTRIBUTES", "true").lower() == "true"
+
+# string columns with at most this share of distinct values are stored as categoricals, the others as arrow strings
+CATEGORY_MAX_RATIO = 0.5
+
+# arrow backed strings keep each value in one buffer instead of a python object per row
+ARROW_STRING_DTYPE = pd.StringDtype("pyarrow")
+
+def is_string_column(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    if series.dtype == object:
+        return pd.api.types.infer_dtype(series, skipna=True) == "string"
+    return pd.api.types.is_string_dtype(series.dtype)
+
+def compact_float(series):
+    """Return the float32 copy of a float64 column, or None when that would change a value."""
+    compacted = series.astype(np.float32)
+    same = (compacted.astype(np.float64) == series) | series.isna()
+    return compacted if same.all() else None
+
+def compact_column(series):
+    """
+    Return the compact copy of an attribute column, or None when it has no smaller lossless dtype.
+
+    Low cardinality strings (zoning codes, status fields) become categoricals, other object
+    strings arrow strings, and integers and floats are downcast to the smallest dtype that holds
+    every value exactly.
+    """
+    if is_string_column(series):
+        count = series.count()
+        if count and series.nunique() <= count * CATEGORY_MAX_RATIO:
+            return series.astype("category")
+        return series.astype(ARROW_STRING_DTYPE) if series.dtype == object else None
+
+    if not isinstance(series.dtype, np.dtype):
+        # nullable extension dtypes are already stored in arrays of their own
+        return None
+    if pd.api.types.is_integer_dtype(series.dtype) and series.dtype.itemsize > 1:
+        compacted = pd.to_numeric(series, downcast="integer")
+        return compacted if compacted.dtype != series.dtype else None
+
+    if series.dtype == np.float64:
+        return compact_float(series)
+    return None
+
+def compact_attributes(gdf):
+    """
+    Convert the attribute columns of a loaded GeoDataFrame to compact dtypes.
+
+    Attribute-heavy layers hold most of their memory in object string columns, one python string
+    per row. Transformations work on the compacted columns, and restore_attributes converts them
+    back before the output is written, so the writers see the dtypes that were loaded.
+
+    Parameters:
+    gdf (GeoDataFrame): The loaded GeoDataFrame, it is modified in place.
+
+    Returns:
+    tuple: (GeoDataFrame, dtypes) where dtypes maps each compacted column to the name of its loaded dtype.
+    """
+    dtypes = {}
+    if not COMPACT_ATTRIBUTES:
+        return gdf, dtypes
+
+    for column in gdf.columns:
+        if column == gdf.geometry.name:
+            continue
+        compacted = compact_column(gdf[column])
+        if compacted is not None:
+            dtypes[column] = str(gdf[column].dtype)
+            gdf[column] = compacted
+    return gdf, dtypes
+
+def restore_attributes(gdf, dtypes):
+    """
+    Convert the columns compacted by compact_attributes back to their loaded dtypes.
+
+    A column a transformation dropped, or changed to another dtype itself (e.g. integers that
+    gained missing values in a union), is left as it is.
+
+    Parameters:
+    gdf (GeoDataFrame): The transformed GeoDataFrame, it is modified in place.
+    dtypes (dict): The loaded dtypes returned by compact_attributes.
+
+    Returns:
+    GeoDataFrame: The GeoDataFrame with its loaded dtypes.
+    """
+    # a dissolve moves its group columns to the index
+    index_names = list(gdf.index.names)
+    if None not in index_names and any(name in dtypes for name in index_names):
+        return restore_attributes(gdf.reset_index(), dtypes).set_index(index_names)
+
+    for column, dtype in dtypes.items():
+        if column not in gdf.columns:
+            continue
+        series = gdf[column]
+        if isinstance(series.dtype, np.dtype):
+            # a downcast number converts back only when no transformation widened it already
+            if not pd.api.types.is_numeric_dtype(series.dtype) or series.dtype == dtype or not np.can_cast(series.dtype, np.dtype(dtype)):
+                continue
+        elif not (isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == ARROW_STRING_DTYPE):
+            continue
+
+        restored = series.astype(dtype)
+        if dtype == "object":
+            # missing strings were None or nan when loaded, not pandas' NA
+            restored = restored.where(series.notna(), None)
+        gdf[column] = restored
+    return gdf
@@ -0,0 +1,508 @@
+import os
+import shutil
+from collections import Counter
+from contextlib import contextmanager
+
+from celery.exceptions import SoftTimeLimitExceeded
+from pyproj.exceptions import CRSError
+
+from utils.logger import get_logger
+from utils.instrumentation import Instrumentation
+from utils.metrics import observe_stages
+from resources.v1.transform.format.output_manager import create_output_response, ChunkedOutput
+from resources.v1.transform.transformations import apply_transformations, UnsupportedTransformationError
+from resources.v1.transform.transformations import merge_geodataframes, append_geodataframes
+from resources.v1.transform.transformations import get_clip_filter
+from resources.v1.transform.transformations import split_union_boundary, merge_union_boundaries, dissolve_partition, merge_dissolved
+from resources.v1.transform.transformations.validity import AUTO_REPAIR_GEOMETRIES
+from utils.async_tasks import get_cancel_check
+from .checkpoint import CheckpointStore, TASK_CHECKPOINTS, remove_stale_checkpoints
+from .progress import TaskProgress
+from .compaction import compact_attributes, restore_attributes
+from .tiles import can_run_tiled, split_transformations, get_layer_extent, plan_tiles, build_tile_tree, read_tile, get_tile_margin, TILE_ORDER_COLUMN
+
+logger = get_logger(__name__)
+
+# how many times a task that reaches the soft time limit is continued from its last checkpoint
+TASK_MAX_CONTINUATIONS = int(os.getenv("TASK_MAX_CONTINUATIONS", 3))
+
+# counts the transformations add to their stage records, reported in the result
+STAGE_TOTALS = ("geometries_repaired", "vertices_in", "vertices_out")
+
+
+class PipelineCancelled(Exception):
+    """Exception raised when a pipeline is cancelled between stages."""
+
+    def __init__(self, request_id, message="Request was cancelled"):
+        self.request_id = request_id
+        self.message = message
+        super().__init__(f"{message}: {request_id}")
+
+
+# a cancel check or the celery soft time limit interrupting a stage, these must not become request errors
+INTERRUPTIONS = (PipelineCancelled, SoftTimeLimitExceeded)
+
+def raise_interruption(error):
+    """Re-raise an interruption that a reader, transformation or writer wrapped in an error of its own."""
+    while error is not None:
+        if isinstance(error, INTERRUPTIONS):
+            raise error
+        error = error.__cause__ or error.__context__
+
+
+class Pipeline:
+    """
+    Runs a request through the load, transform and output stages.
+
+    Every input format goes through the same stages, so progress updates, stage timing,
+    cancellation checks and cleanup of the uploaded files are handled here once rather
+    than in each reader.
+
+    Parameters:
+    request_data (dict): The validated request payload.
+    request_id (str): The id of the request, used for the output directory.
+    request_size (int): The size of the request body in bytes.
+    uploads_dir (str, optional): Directory holding the uploaded files, removed once loaded.
+    celery_task (Task, optional): The bound celery task used to report progress.
+    cancel_check (callable, optional): Returns True when the request has been cancelled.
+
+    For celery tasks the GeoDataFrame is checkpointed after loading and after each transformation.
+    A task that reaches the soft time limit is retried under the same task id, and that
+    continuation resumes from the last checkpoint instead of starting over.
+    """
+
+    def __init__(self, request_data, request_id, request_size, uploads_dir=None, celery_task=None, cancel_check=None):
+        self.request_data = request_data
+        self.request_id = request_id
+        self.request_size = request_size
+        self.uploads_dir = uploads_dir
+        self.celery_task = celery_task
+        self.cancel_check = cancel_check
+        if cancel_check is None and celery_task is not None:
+            # async tasks can be cancelled through DELETE /v1/transform/result/<task_id>
+            self.cancel_check = get_cancel_check(celery_task.request.id)
+        self.instrumentation = Instrumentation()
+        self.progress = TaskProgress(celery_task, request_data["transformations"], self.check_cancelled)
+        self.schema = None
+        self.load_label = None
+        self.dtypes = {}
+
+        self.checkpoint = None
+        if celery_task is not None and TASK_CHECKPOINTS:
+            remove_stale_checkpoints()
+            self.checkpoint = CheckpointStore(celery_task.request.id)
+
+    def check_cancelled(self):
+        if self.cancel_check is not None and self.cancel_check():
+            raise PipelineCancelled(self.request_id)
+
+    def update_progress(self, message):
+        if self.celery_task is not None:
+            self.celery_task.update_state(state='PROCESSING', meta={'message': message})
+
+    @contextmanager
+    def stage(self, name, message, features_in=None, total=None, unit="features"):
+        """
+        Run a pipeline stage, reporting progress and yielding its instrumentation record.
+
+        total is the number of bytes or features (see unit) the stage reports progress in,
+        defaulting to features_in.
+        """
+        self.check_cancelled()
+        if name != "transform":
+            # each transformation is reported as its own stage by apply_transformations
+            self.progress.start(name, message, features_in if total is None else total, unit)
+
+        with self.instrumentation.measure(name, features_in) as record:
+            yield record
+        logger.info(f"Request {self.request_id} stage '{name}' took {record['wall_seconds']}s")
+
+    def cleanup(self):
+        if self.uploads_dir is not None:
+            shutil.rmtree(self.uploads_dir, ignore_errors=True)
+
+    def save_checkpoint(self, step, gdf, transformations_applied):
+        if self.checkpoint is None:
+            return
+
+        state = {"schema": self.schema, "load_label": self.load_label, "dtypes": self.dtypes, "transformations_applied": transformations_applied}
+        with self.instrumentation.measure(f"checkpoint.{step}", len(gdf)):
+            self.checkpoint.save(step, gdf, state)
+
+    def remove_output(self):
+        # the partial output of a request that was cancelled or failed while writing
+        shutil.rmtree(os.path.join(os.getenv("OUTPUT_PATH"), self.request_id), ignore_errors=True)
+
+    def clear_checkpoints(self):
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+
+    def start(self, target, sources):
+        """
+        Load the inputs, or restore them from the latest checkpoint when this is a continued task.
+
+        Returns:
+        tuple: (GeoDataFrame, transformations_applied, step) where step is the number of transformations already applied.
+        """
+        restored = self.checkpoint.latest() if self.checkpoint is not None else None
+        if restored is not None:
+            step, gdf, state = restored
+            self.update_progress(f"Resuming from step {step}")
+            self.schema, self.load_label = state["schema"], state["load_label"]
+            self.dtypes = state.get("dtypes", {})
+            self.cleanup()
+            return gdf, state["transformations_applied"], step
+
+        try:
+            gdf, self.schema, self.load_label = self.load(target, sources)
+        except SoftTimeLimitExceeded:
+            # keep the uploaded files, the continuation of the task loads them again
+            raise
+        except BaseException:
+            self.cleanup()
+            raise
+
+        gdf = self.compact(gdf)
+        self.save_checkpoint(0, gdf, [])
+        self.cleanup()
+        return gdf, [], 0
+
+    def compact(self, gdf):
+        """Store the loaded attributes in compact dtypes for the transformations, see compact_attributes."""
+        with self.instrumentation.measure("compact", len(gdf)):
+            gdf, self.dtypes = compact_attributes(gdf)
+        return gdf
+
+    def continue_task(self, error):
+        """Retry the celery task after it reached the soft time limit, it resumes from the last checkpoint."""
+        if self.checkpoint is None or self.celery_task.request.retries >= TASK_MAX_CONTINUATIONS:
+            self.clear_checkpoints()
+            self.cleanup()
+            raise error
+
+        logger.info(f"Request {self.request_id} reached the soft time limit, continuing from the last checkpoint")
+        raise self.celery_task.retry(countdown=0, max_retries=TASK_MAX_CONTINUATIONS)
+
+    def load(self, target, sources):
+        """
+        Load the inputs into a single GeoDataFrame.
+
+        Parameters:
+        target (Source): The source to transform, or the target of an append. None for a merge.
+        sources (list): The sources to merge, or to append to the target. None for a transform.
+
+        Returns:
+        tuple: (GeoDataFrame, schema, label) where label describes the merge/append, or None.
+        """
+        input_format = (target or sources[0]).input_format
+        clipping_gdf = get_clip_filter(self.request_data["transformations"])
+
+        # loading is counted in bytes of the inputs, spread evenly when they come in the request body
+        inputs = ([target] if target is not None else []) + (sources or [])
+        sizes = [source.get_size() for source in inputs]
+        if not any(sizes):
+            sizes = [self.request_size / len(inputs)] * len(inputs)
+        total_bytes = round(sum(sizes))
+
+        if sources is None:
+            with self.stage("load", f"Loading {input_format} data", total=total_bytes, unit="bytes") as record:
+                try:
+                    gdf, schema = target.load(clipping_gdf)
+                    self.progress.update(total_bytes)
+                except Exception as e:
+                    raise_interruption(e)
+                    logger.error(f"Error handling the {input_format} file: {e}")
+                    raise ValueError(f"Error handling {input_format} file: {e} - api usage as not been recorded.")
+                record["features_out"] = len(gdf)
+                return gdf, schema, None
+
+        with self.stage("load", f"Loading {input_format} files", total=total_bytes, unit="bytes") as record:
+            try:
+                schema = None
+                if target is not None:
+                    target_gdf, schema = target.load(clipping_gdf)
+
+                loaded = sizes[0] if target is not None else 0
+                gdfs = []
+                for source, size in zip(sources, sizes[-len(sources):]):
+                    self.progress.update(round(loaded))
+                    gdf, _ = source.load(clipping_gdf)
+                    if target is None:
+                        gdf["source"] = source.name
+                    gdfs.append(gdf)
+                    loaded += size
+                self.progress.update(total_bytes)
+
+                if target is None:
+                    gdf, label = merge_geodataframes(gdfs), f"merge {len(gdfs)} files"
+                else:
+                    gdf, label = append_geodataframes(target_gdf, gdfs), f"append {len(gdfs)} files"
+            except Exception as e:
+                raise_interruption(e)
+                logger.error(f"Error handling the {input_format} files: {e}")
+                raise ValueError(f"Error handling {input_format} files: {e} - api usage has not been recorded.")
+            record["features_out"] = len(gdf)
+            return gdf, schema, label
+
+    def transform(self, gdf, start_step=0, transformations_applied=()):
+        """
+        Apply the transformations, skipping the first start_step ones that a continued task already applied.
+
+        Returns:
+        tuple: (GeoDataFrame, transformations_applied) including the ones applied before the continuation.
+        """
+        previous = list(transformations_applied)
+        on_step = None
+        if self.checkpoint is not None:
+            on_step = lambda step, step_gdf, applied: self.save_checkpoint(step, step_gdf, previous + applied)
+
+        transformations_string = "/".join(item["type"] for item in self.request_data["transformations"][start_step:])
+        with self.stage("transform", f"Applying transformations: {transformations_string}", len(gdf)) as record:
+            try:
+                gdf, applied = apply_transformations(gdf, self.request_data, self.instrumentation, start_step, on_step, self.progress)
+            except UnsupportedTransformationError as e:
+                logger.error(f"Error applying transformations: {e}")
+                raise ValueError("Unsupported transformation type - api usage as not been recorded.")
+            except Exception as e:
+                raise_interruption(e)
+                logger.error(f"Error applying transformations: {e}")
+                raise ValueError("Error applying transformations - api usage as not been recorded.")
+            record["features_out"] = len(gdf)
+            return gdf, previous + applied
+
+    def write(self, gdf, schema):
+        with self.stage("output", f"Creating output {self.request_data['output_format']}", len(gdf)):
+            try:
+                # the writers get the attribute dtypes that were loaded
+                gdf = restore_attributes(gdf, self.dtypes)
+                return create_output_response(self.request_data, self.request_id, gdf, schema, to_file=self.request_data["to_file"], on_progress=self.progress.update)
+            except (ValueError, CRSError) as e:
+                raise_interruption(e)
+                logger.error(f"{e} - api usage as not been recorded.")
+                raise ValueError(f"{e} - api usage as not been recorded.")
+            except Exception as e:
+                raise_interruption(e)
+                logger.error(f"{e} - api usage as not been recorded.")
+                raise RuntimeError("There was an error handling this request - api usage as not been recorded.")
+
+    def run(self, target=None, sources=None, operation="transformation"):
+        """
+        Run the full pipeline and build the result dict returned to the blueprints and celery.
+
+        Parameters:
+        target (Source, optional): The source to transform, or the target of an append.
+        sources (list, optional): The sources to merge, or to append to the target.
+        operation (str): The operation reported in the result message.
+
+        Returns:
+        dict: The result of the request, this needs to be json serialisable for async requests.
+        """
+        first_source = target or sources[0]
+
+        try:
+            gdf, transformations_applied, step = self.start(target, sources)
+            gdf, transformations_applied = self.transform(gdf, step, transformations_applied)
+            if self.load_label is not None:
+                transformations_applied.insert(0, self.load_label)
+
+            self.check_cancelled()
+            response_size, output_file_response = self.write(gdf, self.schema)
+        except SoftTimeLimitExceeded as e:
+            self.remove_output()
+            self.continue_task(e)
+        except BaseException:
+            self.remove_output()
+            self.clear_checkpoints()
+            raise
+        self.clear_checkpoints()
+
+        return self.get_result(first_source, operation, transformations_applied, response_size, output_file_response)
+
+    def stage_total(self, field):
+        """Sum a count the transformations add to their stage records, e.g. 'geometries_repaired' (see repair_geometries)."""
+        return sum(stage.get(field, 0) for stage in self.instrumentation.stages)
+
+    def get_result(self, first_source, operation, transformations_applied, response_size, output_file_response):
+        """Build the result dict of a completed request, this needs to be json serialisable for async requests."""
+        output_format = self.request_data['output_format'].upper()
+        observe_stages(self.instrumentation.stages, first_source.input_format, output_format)
+
+        return {
+            "message": f"{first_source.label} {operation} successful",
+            "response_size": response_size,
+            "request_size": self.request_size,
+            "transformations": "/".join(transformations_applied),
+            "input_format": first_source.input_format,
+            "output_format": output_format,
+            "output_file_response": output_file_response,
+            "to_file": self.request_data["to_file"],
+            "geometries_repaired": self.stage_total("geometries_repaired"),
+            "vertices_removed": self.stage_total("vertices_in") - self.stage_total("vertices_out"),
+            "metrics": self.instrumentation.as_dict()
+        }
+
+
+class TiledPipeline(Pipeline):
+    """
+    Runs a transform out of core, for inputs too large to load into a single GeoDataFrame.
+
+    The input is split into tiles through its spatial index (see plan_tiles), and each tile is
+    read, transformed and appended to the output before the next one is read, so memory use
+    follows TILE_FEATURES rather than the size of the input. A union or dissolve is applied to
+    each tile, and what other tiles can still change (union pieces on a tile boundary, dissolved
+    groups) is merged once every tile has been read. A dissolve keeps the fid of each feature,
+    so the merged groups take their attributes from the same features as an in memory dissolve.
+
+    Features without a geometry are not read, and tiled requests are not checkpointed.
+    """
+
+    def __init__(self, request_data, request_id, request_size, uploads_dir=None, celery_task=None, cancel_check=None):
+        super().__init__(request_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task, cancel_check=cancel_check)
+        self.checkpoint = None
+        self.before, self.global_transform, self.after = split_transformations(request_data["transformations"])
+
+        # the merge only handles the boundary pieces or dissolved groups, a small part of the work
+        stages = [("tiles", 9)]
+        if self.global_transform is not None:
+            stages.append(("merge", 1))
+        self.progress = TaskProgress(celery_task, [], self.check_cancelled, stages=stages)
+        self.tile_totals = Counter()
+
+    def apply(self, gdf, transformations):
+        if gdf.empty or not transformations:
+            return gdf
+
+        # the transformations of each tile are not stages of their own, only their counts are kept
+        tile_instrumentation = Instrumentation()
+        try:
+            gdf, _ = apply_transformations(gdf, {"transformations": transformations}, tile_instrumentation)
+        except Exception as e:
+            raise_interruption(e)
+            logger.error(f"Error applying transformations: {e}")
+            raise ValueError("Error applying transformations - api usage as not been recorded.")
+        for stage in tile_instrumentation.stages:
+            self.tile_totals.update({field: stage[field] for field in STAGE_TOTALS if field in stage})
+        return gdf
+
+    def stage_total(self, field):
+        return self.tile_totals[field]
+
+    def write_tile(self, output, gdf):
+        """Apply the transformations after the union or dissolve and append gdf to the output, returns the features written."""
+        gdf = self.apply(gdf, self.after)
+        try:
+            output.write(gdf)
+        except (ValueError, CRSError) as e:
+            raise_interruption(e)
+            logger.error(f"{e} - api usage as not been recorded.")
+            raise ValueError(f"{e} - api usage as not been recorded.")
+        except Exception as e:
+            raise_interruption(e)
+            logger.error(f"{e} - api usage as not been recorded.")
+            raise RuntimeError("There was an error handling this request - api usage as not been recorded.")
+        return len(gdf)
+
+    def transform_tiles(self, target, output):
+        """Read, transform and write each tile, returns the union or dissolve results still to merge."""
+        input_format = target.input_format
+        try:
+            crs, extent, feature_count = get_layer_extent(target.file_path, self.request_data["transformations"])
+            tiles = plan_tiles(target.file_path, extent, feature_count) if extent is not None else []
+        except Exception as e:
+            raise_interruption(e)
+            logger.error(f"Error handling the {input_format} file: {e}")
+            raise ValueError(f"Error handling {input_format} file: {e} - api usage as not been recorded.")
+        logger.info(f"Request {self.request_id} is transformed out of core in {len(tiles)} tiles")
+
+        tile_tree = build_tile_tree(tiles)
+        union = self.global_transform is not None and self.global_transform["type"] == "union"
+        order_column = TILE_ORDER_COLUMN if self.global_transform is not None and not union else None
+        partitions = []
+        features_read = 0
+
+        with self.stage("tiles", f"Transforming {input_format} data in {len(tiles)} tiles", feature_count) as record:
+            record["features_out"] = 0
+            for index, tile in enumerate(tiles):
+                # a union also needs the features of other tiles that reach into this one
+                margin = get_tile_margin(self.before, crs, tile) if union else None
+                try:
+                    gdf, neighbours = read_tile(target.file_path, tile_tree, index, margin, order_column)
+                except Exception as e:
+                    raise_interruption(e)
+                    logger.error(f"Error handling the {input_format} file: {e}")
+                    raise ValueError(f"Error handling {input_format} file: {e} - api usage as not been recorded.")
+                features_read += len(gdf)
+
+                gdf = self.apply(gdf, self.before)
+                if self.global_transform is not None and AUTO_REPAIR_GEOMETRIES:
+                    # the boundary features and dissolved groups are merged again, they are kept repaired
+                    gdf = self.apply(gdf, [{"type": "make_valid"}])
+                if union:
+                    unioned = self.apply(gdf, [self.global_transform])
+                    if not unioned.empty:
+                        gdf, boundary = split_union_boundary(unioned, gdf, tile, self.apply(neighbours, self.before))
+                        partitions.append(boundary)
+                elif self.global_transform is not None:
+                    if not gdf.empty:
+                        partitions.append(self.dissolve_partition(gdf))
+                    gdf = gdf.iloc[:0]
+
+                record["features_out"] += self.write_tile(output, gdf)
+                self.progress.update(features_read)
+
+        return [partition for partition in partitions if not partition.empty]
+
+    def dissolve_partition(self, gdf):
+        """Dissolve the features of a tile, see dissolve_partition."""
+        try:
+            return dissolve_partition(gdf, self.global_transform["by"], TILE_ORDER_COLUMN)
+        except Exception as e:
+            raise_interruption(e)
+            logger.error(f"Error applying transformations: {e}")
+            raise ValueError("Error applying transformations - api usage as not been recorded.")
+
+    def merge_partitions(self, partitions, output):
+        """Merge the per tile results of the union or dissolve and write them."""
+        transform_type = self.global_transform["type"]
+        with self.stage("merge", f"Merging the {transform_type} of each tile", sum(len(partition) for partition in partitions)) as record:
+            try:
+                if transform_type == "union":
+                    gdf = merge_union_boundaries(partitions, on_progress=self.progress.update)
+                else:
+                    gdf = merge_dissolved(partitions, self.global_transform["by"], TILE_ORDER_COLUMN)
+            except Exception as e:
+                raise_interruption(e)
+                logger.error(f"Error applying transformations: {e}")
+                raise ValueError("Error applying transformations - api usage as not been recorded.")
+            record["features_out"] = self.write_tile(output, gdf)
+
+    def run(self, target=None, sources=None, operation="transformation"):
+        try:
+            output = ChunkedOutput(self.request_data, self.request_id)
+            partitions = self.transform_tiles(target, output)
+            if partitions:
+                self.merge_partitions(partitions, output)
+            response_size, output_file_response = output.close()
+        except BaseException:
+            self.remove_output()
+            raise
+        finally:
+            self.cleanup()
+
+        transformations_applied = [item["type"] for item in self.request_data["transformations"]]
+        return self.get_result(target, operation, transformations_applied, response_size, output_file_response)
+
+
+def run_transform(source, request_data, request_id, request_size, uploads_dir=None, celery_task=None):
+    # inputs too large to load at once are read and transformed a tile at a time
+    pipeline_class = TiledPipeline if can_run_tiled(source, request_data) else Pipeline
+    pipeline = pipeline_class(request_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+    return pipeline.run(target=source)
+
+def run_merge(sources, request_data, request_id, request_size, uploads_dir=None, celery_task=None):
+    pipeline = Pipeline(request_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+    return pipeline.run(sources=sources, operation="merge")
+
+def run_append(target, sources, request_data, request_id, request_size, uploads_dir=None, celery_task=None):
+    pipeline = Pipeline(request_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+    return pipeline.run(target=target, sources=sources, operation="append")
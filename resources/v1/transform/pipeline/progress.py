@@ -0,0 +1,131 @@
+import os
+import time
+
+from utils.task_routing import TRANSFORMATION_COSTS
+
+# a running stage reports its processed count at most this often, stage changes are always reported
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", 1))
+
+# reading and writing the data each count as half of the base cost in estimate_task_cost
+LOAD_WEIGHT = 0.5
+OUTPUT_WEIGHT = 0.5
+
+# no eta is given before this many percent have been processed, it would be a guess
+MIN_ETA_PERCENT = 1
+
+class TaskProgress:
+    """
+    Percent complete and time remaining of a request, reported through the celery task state.
+
+    The request is planned as a load stage, one stage per transformation and an output stage,
+    each weighted by its relative cost (see TRANSFORMATION_COSTS). Within a stage progress is
+    counted in bytes (loading) or features, so the percent moves while a long stage runs.
+
+    Parameters:
+    celery_task (Task, optional): The bound celery task, nothing is reported without one.
+    transformations (list): The transformations of the request.
+    check_cancelled (callable, optional): Called whenever progress is reported, raises to stop the request.
+    interval (float, optional): The least number of seconds between two reports within a stage.
+    stages (list, optional): (name, weight) of each stage, for requests that do not run as load, transform and output.
+    """
+
+    def __init__(self, celery_task, transformations, check_cancelled=None, interval=PROGRESS_INTERVAL, stages=None):
+        self.celery_task = celery_task
+        self.check_cancelled = check_cancelled
+        self.interval = interval
+
+        if stages is not None:
+            self.plan = list(stages)
+        else:
+            self.plan = [("load", LOAD_WEIGHT)]
+            self.plan += [(f"transform.{item['type']}", TRANSFORMATION_COSTS.get(item["type"], 1)) for item in transformations]
+            self.plan.append(("output", OUTPUT_WEIGHT))
+        self.total_weight = sum(weight for _, weight in self.plan)
+
+        self.index = 0
+        self.message = None
+        self.unit = "features"
+        self.processed = 0
+        self.total = 0
+        self.reported_at = 0.0
+
+        # a continued task measures its eta from where it resumed
+        self.started_at = None
+        self.start_percent = 0.0
+
+    def start(self, name, message, total, unit="features"):
+        """
+        Start the next stage with the given name and report it.
+
+        Stages before it count as complete, so a task resumed from a checkpoint at a later
+        transformation reports the percent of the whole request.
+
+        Parameters:
+        name (str): The stage name, 'load', 'transform.<type>' or 'output'.
+        message (str): The progress message, e.g. 'Applying transformations: buffer'.
+        total (int): The number of bytes or features the stage processes.
+        unit (str, optional): 'features' or 'bytes'.
+        """
+        if self.check_cancelled is not None:
+            self.check_cancelled()
+
+        for index in range(self.index, len(self.plan)):
+            if self.plan[index][0] == name:
+                self.index = index
+                break
+
+        self.message = message
+        self.unit = unit
+        self.processed = 0
+        self.total = total or 0
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+            self.start_percent = self.percent()
+        self.report()
+
+    def update(self, processed, total=None):
+        """
+        Count the bytes or features processed so far in the current stage, reported at most every interval seconds.
+
+        Parameters:
+        processed (int): The number processed so far.
+        total (int, optional): A new total, for stages that only know it once they are running.
+        """
+        if self.check_cancelled is not None:
+            self.check_cancelled()
+
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        if time.monotonic() - self.reported_at >= self.interval:
+            self.report()
+
+    def percent(self):
+        done = sum(weight for _, weight in self.plan[:self.index])
+        if self.total:
+            done += self.plan[self.index][1] * min(self.processed / self.total, 1)
+        return round(100 * done / self.total_weight, 1)
+
+    def eta_seconds(self, percent):
+        processed_percent = percent - self.start_percent
+        if self.started_at is None or processed_percent < MIN_ETA_PERCENT:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return round(elapsed * (100 - percent) / processed_percent)
+
+    def as_meta(self):
+        """Return the state meta of the current stage, see AsyncTaskResultSchema."""
+        percent = self.percent()
+        return {
+            "message": self.message,
+            "stage": self.plan[self.index][0],
+            f"processed_{self.unit}": self.processed,
+            f"total_{self.unit}": self.total,
+            "percent": percent,
+            "eta_seconds": self.eta_seconds(percent),
+        }
+
+    def report(self):
+        self.reported_at = time.monotonic()
+        if self.celery_task is not None:
+            self.celery_task.update_state(state='PROCESSING', meta=self.as_meta())
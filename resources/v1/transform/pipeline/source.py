@@ -0,0 +1,44 @@
+import os
+
+
+class Source:
+    """
+    Base class for pipeline source adapters.
+
+    A source knows how to turn one input (a GeoJSON object, an uploaded file, ...) into a
+    GeoDataFrame. Everything that happens after loading is handled by the pipeline engine,
+    so adding a new input format only requires a new source adapter.
+
+    Attributes:
+    input_format (str): The input format reported in the result, e.g. "SHP".
+    label (str): Human readable name used in result messages, e.g. "Shapefile".
+    name (str): Name of this particular input, used for the 'source' column when merging.
+    file_path (str): The uploaded input file, None for inputs sent in the request body.
+    tiled (bool): Whether file_path has a spatial index it can be read from a tile at a time, see TiledPipeline.
+    """
+    input_format = None
+    label = None
+    file_path = None
+    tiled = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def load(self, clipping_gdf=None):
+        """
+        Load the input into a GeoDataFrame.
+
+        Parameters:
+        clipping_gdf (GeoDataFrame, optional): Clip mask that can be used as a spatial filter
+            when the first transformation is a clip.
+
+        Returns:
+        tuple: (GeoDataFrame, schema) where schema is the fiona schema of the input or None.
+        """
+        raise NotImplementedError
+
+    def get_size(self):
+        """Return the size of the input file in bytes, 0 when it has none, used to report loading progress."""
+        if self.file_path is None or not os.path.exists(self.file_path):
+            return 0
+        return os.path.getsize(self.file_path)
@@ -0,0 +1,194 @@
+import math
+import os
+
+import numpy as np
+import pyogrio
+import shapely
+from pyproj import CRS
+
+from resources.v1.transform.format.output_manager import CHUNKED_OUTPUT_FORMATS
+from resources.v1.transform.transformations import GLOBAL_TRANSFORMATIONS, BUFFER_UNIT_FACTORS, METERS_PER_DEGREE
+from resources.v1.transform.transformations import is_feature_transformation
+from resources.v1.transform.transformations import get_clip_filter, get_filter_bbox
+
+# inputs of at least this many bytes are read and transformed a tile at a time, 0 turns the out-of-core mode off
+OUT_OF_CORE_BYTES = int(os.getenv("OUT_OF_CORE_BYTES", 1073741824))
+
+# features per tile, a tiled request holds about one tile of features at a time
+TILE_FEATURES = int(os.getenv("TILE_FEATURES", 100000))
+
+# tiles are not split further than this, features stacked on one spot cannot be split at all
+MAX_TILE_DEPTH = 8
+
+# column holding the fid of each feature of a tiled dissolve, the merge keeps the attributes of the features in input order
+TILE_ORDER_COLUMN = "__geoflip_fid"
+
+def can_run_tiled(source, request_data):
+    """
+    Whether a transform request runs out of core, see TiledPipeline.
+
+    The input needs a spatial index to read tiles from and must be at least OUT_OF_CORE_BYTES,
+    the output must be one that can be appended to, and at most one transformation may need
+    the whole input at once.
+    """
+    if not OUT_OF_CORE_BYTES or not source.tiled or source.get_size() < OUT_OF_CORE_BYTES:
+        return False
+    if request_data["output_format"] not in CHUNKED_OUTPUT_FORMATS:
+        return False
+
+    transformations = request_data["transformations"]
+    if any(not is_feature_transformation(item) and item["type"] not in GLOBAL_TRANSFORMATIONS for item in transformations):
+        return False
+    return sum(item["type"] in GLOBAL_TRANSFORMATIONS for item in transformations) <= 1
+
+def split_transformations(transformations):
+    """
+    Split the transformations around the one that needs the whole input.
+
+    Returns:
+    tuple: (before, global_transform, after) where global_transform is None when all of them work feature by feature.
+    """
+    for index, transform in enumerate(transformations):
+        if transform["type"] in GLOBAL_TRANSFORMATIONS:
+            return transformations[:index], transform, transformations[index + 1:]
+    return transformations, None, []
+
+def get_layer_extent(file_path, transformations):
+    """
+    Return the CRS, the extent to tile and the feature count of a layer.
+
+    When the first transformation is a clip the extent only covers the clip mask, tiles outside
+    it would be read to be clipped away. The extent is None when the mask misses the layer.
+    """
+    info = pyogrio.read_info(file_path, force_feature_count=True, force_total_bounds=True)
+    extent = info["total_bounds"]
+
+    clip_bbox = get_filter_bbox(get_clip_filter(transformations), info["crs"])
+    if clip_bbox is not None:
+        extent = (max(extent[0], clip_bbox[0]), max(extent[1], clip_bbox[1]), min(extent[2], clip_bbox[2]), min(extent[3], clip_bbox[3]))
+        if extent[0] > extent[2] or extent[1] > extent[3]:
+            extent = None
+
+    return info["crs"], extent, info["features"]
+
+def count_features(file_path, bbox):
+    """Count the features intersecting bbox through the spatial index of the layer, without reading them."""
+    _, fids, _, _ = pyogrio.raw.read(file_path, bbox=bbox, columns=[], read_geometry=False, return_fids=True)
+    return len(fids)
+
+def split_tile(tile):
+    """Split a tile into quarters in z-order, or halves when it has no width or height."""
+    minx, miny, maxx, maxy = tile
+    xs = [minx, (minx + maxx) / 2, maxx] if maxx > minx else [minx, maxx]
+    ys = [miny, (miny + maxy) / 2, maxy] if maxy > miny else [miny, maxy]
+    return [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(len(ys) - 1) for i in range(len(xs) - 1)]
+
+def plan_tiles(file_path, tile, feature_count, tile_features=None, depth=0):
+    """
+    Split the extent of a layer into tiles of up to tile_features features.
+
+    Tiles are split into quarters while they hold too many features, counted through the spatial
+    index of the input (the geopackage r-tree or the flatgeobuf packed hilbert r-tree), so dense
+    areas get small tiles and sparse ones large tiles. The tiles are returned in z-order, tiles
+    that follow each other are next to each other.
+
+    Parameters:
+    file_path (str): The input file.
+    tile (tuple): (minx, miny, maxx, maxy) to split, the extent of the layer at the top.
+    feature_count (int): The number of features intersecting tile.
+    tile_features (int, optional): The most features of a tile, TILE_FEATURES by default.
+
+    Returns:
+    list: The (minx, miny, maxx, maxy) of each tile that has features.
+    """
+    tile_features = tile_features or TILE_FEATURES
+    if feature_count <= tile_features or depth >= MAX_TILE_DEPTH:
+        return [tile]
+
+    children = split_tile(tile)
+    if len(children) == 1:
+        return [tile]
+
+    tiles = []
+    for child in children:
+        count = count_features(file_path, child)
+        if count == feature_count:
+            # every feature reaches into the child, splitting it further would not separate any
+            tiles.append(child)
+        elif count:
+            tiles += plan_tiles(file_path, child, count, tile_features, depth + 1)
+    return tiles
+
+def build_tile_tree(tiles):
+    """Index the boxes of the planned tiles, their positions in the tree are their positions in the plan."""
+    return shapely.STRtree([shapely.box(*tile) for tile in tiles])
+
+def get_tile_mask(gdf, tile_tree, index):
+    """
+    Select the features that belong to a tile.
+
+    A feature is read with every tile it intersects, it belongs to the first of them in the plan
+    so each feature is transformed and written once.
+
+    Parameters:
+    gdf (GeoDataFrame): The features read for the tile.
+    tile_tree (STRtree): The boxes of the planned tiles, in plan order.
+    index (int): The position of the tile in the plan.
+
+    Returns:
+    ndarray: True for the features of the tile.
+    """
+    feature_index, tile_index = tile_tree.query(gdf.geometry.values, predicate="intersects")
+    first_tile = np.full(len(gdf), len(tile_tree.geometries))
+    np.minimum.at(first_tile, feature_index, tile_index)
+    return first_tile == index
+
+def read_tile(file_path, tile_tree, index, margin=None, order_column=None):
+    """
+    Read the features of a tile.
+
+    Parameters:
+    file_path (str): The input file.
+    tile_tree (STRtree): The boxes of the planned tiles, see get_tile_mask.
+    index (int): The position of the tile in the plan.
+    margin (float, optional): Also return the features of other tiles within margin of this tile.
+    order_column (str, optional): Add the fid of each feature in this column.
+
+    Returns:
+    tuple: (GeoDataFrame, neighbours GeoDataFrame or None)
+    """
+    minx, miny, maxx, maxy = tile_tree.geometries[index].bounds
+    bbox = (minx, miny, maxx, maxy) if margin is None else (minx - margin, miny - margin, maxx + margin, maxy + margin)
+    gdf = pyogrio.read_dataframe(file_path, bbox=bbox, use_arrow=True, fid_as_index=order_column is not None)
+    if order_column is not None:
+        gdf[order_column] = gdf.index.to_numpy()
+    in_tile = get_tile_mask(gdf, tile_tree, index)
+
+    neighbours = gdf[~in_tile].reset_index(drop=True) if margin is not None else None
+    return gdf[in_tile].reset_index(drop=True), neighbours
+
+def get_tile_margin(transformations, crs, tile):
+    """
+    Return how far the buffers and simplifications of the transformations can grow a feature, in units of crs.
+
+    A union needs the features of other tiles that reach into a tile once they are buffered.
+    Geographic distances are converted at the latitude of the tile furthest from the equator.
+    """
+    meters = 0
+    for transform in transformations:
+        if transform["type"] == "simplify":
+            # a simplified edge stays within the tolerance of the original one
+            meters += transform["tolerance"] * BUFFER_UNIT_FACTORS.get(transform.get("units", "meters"), 1)
+            continue
+        if transform["type"] != "buffer":
+            continue
+        distance = transform["distance"] * BUFFER_UNIT_FACTORS.get(transform["units"], 1)
+        # simplifying the buffer can move its edge out by up to the tolerance, 3% by default
+        tolerance = transform.get("simplify_tolerance")
+        meters += max(distance, 0) + (abs(distance) * 0.03 if tolerance is None else tolerance)
+
+    if crs is None or not CRS.from_user_input(crs).is_geographic:
+        return meters
+
+    latitude = min(max(abs(tile[1]), abs(tile[3])), 89)
+    return meters / (METERS_PER_DEGREE * math.cos(math.radians(latitude)))
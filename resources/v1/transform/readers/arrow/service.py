@@ -0,0 +1,144 @@
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+from pyproj import CRS
+
+from utils.logger import get_logger
+from resources.v1.transform.transformations import get_filter_bbox, get_read_filter
+from resources.v1.transform.pipeline import Source, run_transform, run_merge, run_append
+
+logger = get_logger(__name__)
+
+def get_geo_crs(arrow_schema):
+    """
+    Get the CRS of the primary geometry column from the GeoParquet "geo" metadata of an arrow schema.
+
+    Parameters:
+    arrow_schema (pyarrow.Schema): The schema of the arrow table or parquet file.
+
+    Returns:
+    CRS: The CRS of the geometries, OGC:CRS84 when the metadata does not set one.
+    """
+    metadata = arrow_schema.metadata or {}
+    if b"geo" not in metadata:
+        raise ValueError("No geo metadata found, the input must be written with GeoParquet metadata")
+
+    geo = json.loads(metadata[b"geo"])
+    column = geo["columns"][geo["primary_column"]]
+
+    # per the GeoParquet spec a missing crs means OGC:CRS84 and a null crs means unknown
+    if "crs" not in column:
+        return CRS.from_user_input("OGC:CRS84")
+    return CRS.from_user_input(column["crs"]) if column["crs"] is not None else None
+
+def get_arrow_crs(arrow_schema, gdf):
+    """
+    Get the CRS of an arrow ipc input, from its GeoParquet "geo" metadata when it has some.
+
+    GeoArrow streams carry the CRS in the extension metadata of the geometry field instead,
+    it is read by GeoDataFrame.from_arrow along with the geometries.
+
+    Parameters:
+    arrow_schema (pyarrow.Schema): The schema of the arrow file or stream.
+    gdf (GeoDataFrame): A record batch of the input decoded by arrow_to_geodataframe.
+
+    Returns:
+    CRS: The CRS of the geometries, None when it is unknown.
+    """
+    if b"geo" in (arrow_schema.metadata or {}):
+        return get_geo_crs(arrow_schema)
+    return gdf.crs
+
+def filter_bbox(gdf, bbox):
+    """Keep the features whose bounding box intersects bbox, the same test ogr and parquet readers use."""
+    if bbox is None:
+        return gdf
+
+    minx, miny, maxx, maxy = bbox
+    return gdf.cx[minx:maxx, miny:maxy]
+
+def arrow_to_geodataframe(table_or_batch):
+    try:
+        return gpd.GeoDataFrame.from_arrow(table_or_batch)
+    except ValueError as e:
+        raise ValueError(f"{e} The input must have GeoParquet metadata or a GeoArrow geometry column") from e
+
+def read_arrow_batches(source):
+    """Yield the record batches of an arrow ipc file, or of an arrow ipc stream when it is not a file."""
+    try:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        yield from pa.ipc.open_stream(source)
+
+def load_arrow(file_path, clipping_gdf=None, read_bbox=None):
+    """
+    Load an arrow ipc file or stream, optionally keeping only the features within a bbox.
+
+    The file is memory-mapped and decoded one record batch at a time, so when filtering only
+    the batches being decoded and the matching features are held in memory.
+
+    Parameters:
+    file_path (str): The path to the arrow file.
+    clipping_gdf (GeoDataFrame, optional): Clip mask used as a spatial filter.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+
+    Returns:
+    GeoDataFrame: The GeoDataFrame loaded from the arrow file.
+    """
+    read_filter = get_read_filter(clipping_gdf, read_bbox)
+
+    with pa.memory_map(file_path, "r") as source:
+        gdfs = []
+        bbox = None
+        schema = None
+        for batch in read_arrow_batches(source):
+            batch_gdf = arrow_to_geodataframe(batch)
+            if schema is None:
+                schema = batch.schema
+                bbox = get_filter_bbox(read_filter, get_arrow_crs(schema, batch_gdf))
+            gdfs.append(filter_bbox(batch_gdf, bbox))
+
+        if schema is None:
+            raise ValueError("The arrow input does not contain any record batches")
+
+        gdf = pd.concat(gdfs, ignore_index=True) if len(gdfs) > 1 else gdfs[0].reset_index(drop=True)
+        # copy so the result does not reference the memory-mapped buffers once the file is closed
+        return gpd.GeoDataFrame(gdf.copy(deep=True), geometry=gdf.geometry.name, crs=gdf.crs)
+
+class ArrowSource(Source):
+    """
+    Pipeline source for an arrow ipc file or stream.
+
+    Parameters:
+    file_path (str): The path to the uploaded arrow file.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+    """
+    input_format = "ARROW"
+    label = "Arrow"
+
+    def __init__(self, file_path, read_bbox=None):
+        super().__init__(os.path.basename(file_path))
+        self.file_path = file_path
+        self.read_bbox = read_bbox
+
+    def load(self, clipping_gdf=None):
+        return load_arrow(self.file_path, clipping_gdf, self.read_bbox), None
+
+def handle_arrow_transform(request_size, file_path, uploads_dir, arrow_data, request_id, celery_task=None):
+    source = ArrowSource(file_path, arrow_data.get("read_bbox"))
+    return run_transform(source, arrow_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_arrow_merge(request_size, file_paths, uploads_dir, arrow_data, request_id, celery_task=None):
+    sources = [ArrowSource(file_path, arrow_data.get("read_bbox")) for file_path in file_paths]
+    return run_merge(sources, arrow_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_arrow_append(request_size, target_filepath, append_filepaths, uploads_dir, arrow_data, request_id, celery_task=None):
+    target = ArrowSource(target_filepath, arrow_data.get("read_bbox"))
+    sources = [ArrowSource(file_path, arrow_data.get("read_bbox")) for file_path in append_filepaths]
+    return run_append(target, sources, arrow_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
@@ -1,77 +1,133 @@
 import json
 import os
+from functools import partial
+from urllib.parse import urlencode
 
 from flask_smorest import Blueprint, abort
 from flask.views import MethodView
 from celery.result import AsyncResult
 
 from resources.v1.transform.schemas import AsyncTaskResultSchema
-from flask import current_app, g
+from flask import current_app, request, Response, stream_with_context
 
 from resources.v1.transform.format.output_manager import generate_output_file_stream
 from db import redis_client
+from utils.async_tasks import release_task_output, forget_failed_task, cancel_task, is_task_cancelled, TASK_OUTPUT_TTL
+from utils.task_events import stream_task_events
+
+# progress of a running task, see resources.v1.transform.pipeline.progress.TaskProgress
+PROGRESS_FIELDS = ("stage", "percent", "eta_seconds", "processed_features", "total_features", "processed_bytes", "total_bytes")
 
 AsyncTaskResultBlueprint = Blueprint("Async Task Result", __name__, description="Async result and output endpoints")
 
-@AsyncTaskResultBlueprint.route("/v1/transform/result/<string:task_id>", methods=['GET'])
+def get_output_url(output_id, ticket=None):
+    """The output endpoint of a task, with the ticket of the caller so the download releases it."""
+    url = f"{os.getenv('API_URL')}/v1/transform/output/{output_id}"
+    return f"{url}?{urlencode({'ticket': ticket})}" if ticket else url
+
+def get_task_result(task_id, ticket=None):
+    """
+    Get the state of an async task, a successful result is stored for the output endpoint.
+
+    Parameters:
+    task_id (str): The task ID.
+    ticket (str, optional): The ticket of the caller, added to the output url.
+
+    Returns:
+    dict: The task result, see AsyncTaskResultSchema.
+    """
+    if is_task_cancelled(task_id):
+        return {'state': 'CANCELLED', 'message': f'Task id {task_id} was cancelled'}
+
+    output_id = f"o_{task_id}"
+    if redis_client.exists(output_id):
+        # the result was already collected, by this caller or another request attached to the same task
+        return {
+            'state': 'SUCCESS',
+            'message': 'Task completed successfully',
+            'output_url': get_output_url(output_id, ticket),
+            'percent': 100,
+        }
+
+    result = AsyncResult(task_id)
+    response_data = {'state': result.state}
+
+    if result.state == 'PENDING':
+        response_data['message'] = f'Task id {task_id} is pending execution or no longer exists'
+
+    elif result.state in ('STARTED', 'DEFERRED'):
+        # a deferred task waits on its queue for worker memory, see utils.task_memory.admit_task
+        if 'message' in result.info:
+            response_data['message'] = result.info['message']
+
+    elif result.state in ('PROCESSING', 'RETRY'):
+        if isinstance(result.info, dict):
+            if 'message' in result.info:
+                response_data['message'] = result.info['message']
+            response_data.update({field: result.info[field] for field in PROGRESS_FIELDS if field in result.info})
+
+    elif result.state == 'SUCCESS':
+        transform_result = result.result
+
+        redis_data = json.dumps(transform_result)
+        # only create the key if it doesn't exist yet, a concurrent poll may have stored it already
+        redis_client.set(output_id, redis_data, nx=True, ex=TASK_OUTPUT_TTL)
+
+        response_data['message'] = 'Task completed successfully'
+        response_data['output_url'] = get_output_url(output_id, ticket)
+        response_data['percent'] = 100
+
+        result.forget()
+    else:
+        forget_failed_task(task_id)
+        response_data['message'] = "Task failed during processing"
+        response_data['error'] = str(result.info)
+        response_data["state"] = "FAILURE"
+
+    return response_data
+
+@AsyncTaskResultBlueprint.route("/v1/transform/result/<string:task_id>", methods=['GET', 'DELETE'])
 class AsyncTaskResult(MethodView):
     @AsyncTaskResultBlueprint.response(200, AsyncTaskResultSchema, description="async task result")
     def get(self, task_id):
         try:
-            result = AsyncResult(task_id)
-            response_data = {'state': result.state}
-
-            if result.state == 'PENDING':
-                response_data['message'] = f'Task id {task_id} is pending execution or no longer exists'
-
-            elif result.state == 'STARTED':
-                if 'message' in result.info:
-                    response_data['message'] = result.info['message']
-
-            elif result.state == 'PROCESSING':
-                if 'message' in result.info:
-                    response_data['message'] = result.info['message']
-
-            elif result.state == 'SUCCESS':
-                user_id = g.user.user_id
-                transform_result = result.result
-                transform_result["user_id"] = user_id
-
-                redis_data = json.dumps(transform_result)
-                output_id = f"o_{task_id}"
-                # Check if the key already exists in Redis
-                if not redis_client.exists(output_id):
-                    # Key doesn't exist, so we create it
-                    redis_client.set(output_id, redis_data)
-
-                response_data['message'] = 'Task completed successfully'
-                response_data['output_url'] = f"{os.getenv('API_URL')}/v1/transform/output/{output_id}"
-
-                result.forget()
-            else:
-                response_data['message'] = "Task failed during processing"
-                response_data['error'] = str(result.info)
-                response_data["state"] = "FAILURE"
-
-            return response_data
+            return get_task_result(task_id, request.args.get("ticket"))
         except Exception as e:
             current_app.logger.error(f"Unexpected error: {str(e)}", exc_info=True)
             abort(500, message=f"Server error: {str(e)}")
-        
+
+    @AsyncTaskResultBlueprint.response(200, AsyncTaskResultSchema, description="the task has been cancelled, or this request detached from it")
+    def delete(self, task_id):
+        # requests attached to the same task share it, it is only cancelled once none of them want the result
+        if not release_task_output(task_id, request.args.get("ticket")):
+            return {'state': 'DETACHED', 'message': f'Task id {task_id} is still wanted by another request, this request no longer shares its result'}
+
+        cancel_task(task_id)
+        return {'state': 'CANCELLED', 'message': f'Task id {task_id} has been cancelled'}
+
+@AsyncTaskResultBlueprint.route("/v1/transform/result/<string:task_id>/events", methods=['GET'])
+class AsyncTaskEvents(MethodView):
+    def get(self, task_id):
+        """Follow a task as server-sent events, pushed as it progresses and ending with the same result as GET /v1/transform/result/<task_id>"""
+        get_result = partial(get_task_result, ticket=request.args.get("ticket"))
+        response = Response(stream_with_context(stream_task_events(task_id, get_result)), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        # stop nginx style proxies from buffering the stream
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
 @AsyncTaskResultBlueprint.route("/v1/transform/output/<string:output_id>", methods=['GET'])
 class AsyncTaskOutput(MethodView):
     def get(self, output_id):
-        user_id = g.user.user_id
-
         try:
             result_data = json.loads(redis_client.get(output_id))
         except TypeError:
             abort(404, message="Output ID not found")
-        
-        if result_data["user_id"] != user_id:
-            abort(404, message="User does not have access to this output")
 
-        response = generate_output_file_stream(result_data, to_file=result_data["to_file"])
-        redis_client.delete(output_id)
+        # requests attached to the same task share the output, it is removed after the last of them downloads it
+        last_download = release_task_output(output_id.removeprefix("o_"), request.args.get("ticket"))
+        response = generate_output_file_stream(result_data, to_file=result_data["to_file"], cleanup=last_download)
+        if last_download:
+            redis_client.delete(output_id)
 
         return response
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 import uuid
 
-from flask import request, make_response, jsonify
+from flask import request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from werkzeug.utils import secure_filename
@@ -9,10 +9,14 @@ from werkzeug.utils import secure_filename
 from celery import shared_task
 
 from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
 from resources.v1.transform.format.output_manager import generate_output_file_stream
 from resources.v1.transform.schemas import MultipartFormDXFConfigValidator, MultipartFormDXFFileValidator, MultipartFormDXFMergeFilesValidator, MultipartFormDXFMergeConfigValidator, MultipartFormDXFAppendConfigValidator
 from .service import handle_dxf_transform, handle_dxf_merge, handle_dxf_append
-from utils.file_handling import wait_for_file
+from utils.file_handling import save_upload
+from resources.v1.transform.readers.uploads.service import get_request_file, get_request_files
 
 logger = get_logger(__name__)
 
@@ -40,7 +44,7 @@ class DXF(MethodView):
     def post(self, files, form):
         dxf_data = form['config']
         request_id = str(uuid.uuid4())
-        request_size = request.content_length
+        request_size = get_request_size(request)
         
         # Check if async is passed in the URL as ?async=true or ?async=false
         async_param = request.args.get('async', 'false')  # Defaults to 'false'
@@ -50,31 +54,26 @@ class DXF(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
         # Save and extract ZIP file
-        file = files["file"]
+        file = get_request_file(files, "file", dxf_data, "upload_id")
         filename = secure_filename(file.filename)
         # check that we are getting dxf files only
         if not filename.lower().endswith('.dxf'):
             abort(400, message=f"Invalid file type: {file.filename}. Only .dxf files are accepted.")
         file_path = os.path.join(uploads_dir, filename)
-        file.save(file_path)
-
-        # Check if the file is accessible
-        try:
-            wait_for_file(file_path)
-        except FileNotFoundError as e:
-            logger.error(f"File save failed or file not accessible: {e}")
-            abort(400, description="File save failed or not accessible.")
+        file_hashes.append(save_upload(file, file_path))
 
         response = None
         if asyncRequest:
             # call the service to handle the dxf transformation
-            result = create_dxf_transform_task.delay(request_size, file_path, uploads_dir, dxf_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip DXF task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, dxf_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, dxf_data)
+            memory = estimate_task_memory(input_size, dxf_data)
+            response = dispatch_async_task(create_dxf_transform_task, (request_size, file_path, uploads_dir, dxf_data, request_id), fingerprint, "Geoflip DXF task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -93,7 +92,7 @@ class DXFMerge(MethodView):
     @DXFBlueprint.arguments(MultipartFormDXFMergeConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
     def post(self, files, form):
         dxf_data = form['config']
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -104,10 +103,13 @@ class DXFMerge(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
         # save the dxf files out from the request
         file_paths = []
         input_crs_mapping = dxf_data['input_crs_mapping']
-        file_list = files['files']
+        file_list = get_request_files(files, "files", dxf_data, "upload_ids")
         try:
             if len(input_crs_mapping) == 1:
                 input_crs_mapping = input_crs_mapping * len(file_list)
@@ -121,14 +123,7 @@ class DXFMerge(MethodView):
                     raise ValueError(f"included file type '{file.filename}' is not valid. Only .dxf files are accepted.")
 
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 file_paths.append(file_path)
         except ValueError as e:
@@ -141,12 +136,11 @@ class DXFMerge(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the dxf merge 
-            result = create_dxf_merge_task.delay(request_size, file_paths, input_crs_mapping, uploads_dir, dxf_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip DXF merge task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, dxf_data, file_hashes)
+            input_size = get_input_size(request_size, file_paths)
+            cost = estimate_task_cost(input_size, dxf_data)
+            memory = estimate_task_memory(input_size, dxf_data)
+            response = dispatch_async_task(create_dxf_merge_task, (request_size, file_paths, input_crs_mapping, uploads_dir, dxf_data, request_id), fingerprint, "Geoflip DXF merge task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -167,7 +161,7 @@ class DXFAppend(MethodView):
     @DXFBlueprint.arguments(MultipartFormDXFAppendConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
     def post(self, target, files, form):
         dxf_data = form['config']
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -178,22 +172,22 @@ class DXFAppend(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        target_file = get_request_file(target, "file", dxf_data, "target_upload_id")
+
         target_filepath = None
         try:
             # Save and extract ZIP file
-            file = target["file"]
+            file = target_file
             filename = secure_filename(file.filename)
             # check that we are getting dxf files only
             if not filename.lower().endswith('.dxf'):
                 abort(400, message=f"Invalid file type: {file.filename}. Only .dxf files are accepted.")
             target_filepath = os.path.join(uploads_dir, filename)
-            file.save(target_filepath)
-            # Check if the file is accessible
-            try:
-                wait_for_file(target_filepath)
-            except FileNotFoundError as e:
-                logger.error(f"File save failed or file not accessible: {e}")
-                abort(400, description="File save failed or not accessible.")
+            file_hashes.append(save_upload(file, target_filepath))
         except ValueError as e:
             logger.error(f"Invalid input files: {e}")
             abort(400, message=f"Invalid input: {e} - api usage has not been recorded.")
@@ -204,7 +198,7 @@ class DXFAppend(MethodView):
         # save the dxf files out from the request
         append_filepaths = []
         append_crs_mapping = dxf_data['append_crs_mapping']
-        file_list = files['files']
+        file_list = get_request_files(files, "files", dxf_data, "upload_ids")
         try:
             if len(append_crs_mapping) == 1:
                 append_crs_mapping = append_crs_mapping * len(file_list)
@@ -218,14 +212,7 @@ class DXFAppend(MethodView):
                     raise ValueError(f"included file type '{file.filename}' is not valid. Only .dxf files are accepted.")
 
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 append_filepaths.append(file_path)
         except ValueError as e:
@@ -238,12 +225,11 @@ class DXFAppend(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the dxf merge 
-            result = create_dxf_append_task.delay(request_size, target_filepath, append_filepaths, append_crs_mapping, uploads_dir, dxf_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip DXF merge task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, dxf_data, file_hashes)
+            input_size = get_input_size(request_size, [target_filepath, *append_filepaths])
+            cost = estimate_task_cost(input_size, dxf_data)
+            memory = estimate_task_memory(input_size, dxf_data)
+            response = dispatch_async_task(create_dxf_append_task, (request_size, target_filepath, append_filepaths, append_crs_mapping, uploads_dir, dxf_data, request_id), fingerprint, "Geoflip DXF merge task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
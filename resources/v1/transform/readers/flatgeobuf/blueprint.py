@@ -0,0 +1,229 @@
+import os
+import uuid
+
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from werkzeug.utils import secure_filename
+
+from celery import shared_task
+
+from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
+from resources.v1.transform.format.output_manager import generate_output_file_stream
+
+from resources.v1.transform.schemas import MultipartFormFlatGeobufConfigValidator, MultipartFormFlatGeobufFileValidator, MultipartFormFlatGeobufMergeFilesValidator 
+from .service import handle_flatgeobuf_transform, handle_flatgeobuf_merge, handle_flatgeobuf_append
+from utils.file_handling import save_upload
+from resources.v1.transform.readers.uploads.service import get_request_file, get_request_files
+
+logger = get_logger(__name__)
+
+@shared_task(bind=True, ignore_result=False)
+def create_flatgeobuf_transform_task(self, request_size, file_path, uploads_dir, flatgeobuf_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip FLATGEOBUF task has started'})
+    return handle_flatgeobuf_transform(request_size, file_path, uploads_dir, flatgeobuf_data, request_id, celery_task=self)
+
+@shared_task(bind=True, ignore_result=False)
+def create_flatgeobuf_merge_task(self, request_size, file_paths, uploads_dir, flatgeobuf_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip FLATGEOBUF task has started'})
+    return handle_flatgeobuf_merge(request_size, file_paths, uploads_dir, flatgeobuf_data, request_id, celery_task=self)
+
+@shared_task(bind=True, ignore_result=False)
+def create_flatgeobuf_append_task(self, request_size, target_filepath, append_filepaths, uploads_dir, flatgeobuf_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip FLATGEOBUF task has started'})
+    return handle_flatgeobuf_append(request_size, target_filepath, append_filepaths, uploads_dir, flatgeobuf_data, request_id, celery_task=self)
+
+FlatGeobufBlueprint = Blueprint("FlatGeobuf", __name__, description="FlatGeobuf transformation endpoints")
+
+@FlatGeobufBlueprint.route("/v1/transform/flatgeobuf", methods=['POST'])
+class FlatGeobuf(MethodView):
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufFileValidator, location="files", description="multipart/form-data 'file' containing a FlatGeobuf file")
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufConfigValidator, location="form", description="multipart/form-data containing the transformation configuration")
+    def post(self, files, form):
+        flatgeobuf_data = form['config']
+        request_id = str(uuid.uuid4())
+        request_size = get_request_size(request)
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # Save and extract ZIP file
+        file = get_request_file(files, "file", flatgeobuf_data, "upload_id")
+        filename = secure_filename(file.filename)
+        # check that we are getting FlatGeobuf files only
+        if not filename.lower().endswith('.fgb'):
+            abort(400, message=f"Invalid file type: {file.filename}. Only .fgb files are accepted.")
+    
+        file_path = os.path.join(uploads_dir, filename)
+        file_hashes.append(save_upload(file, file_path))
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the FlatGeobuf transformation
+            fingerprint = get_request_fingerprint(request.path, flatgeobuf_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, flatgeobuf_data)
+            memory = estimate_task_memory(input_size, flatgeobuf_data)
+            response = dispatch_async_task(create_flatgeobuf_transform_task, (request_size, file_path, uploads_dir, flatgeobuf_data, request_id), fingerprint, "Geoflip FLATGEOBUF task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_flatgeobuf_transform(request_size, file_path, uploads_dir, flatgeobuf_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the FLATGEOBUF file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=flatgeobuf_data["to_file"])
+
+        return response
+    
+@FlatGeobufBlueprint.route("/v1/transform/flatgeobuf/merge", methods=['POST'])
+class FlatGeobufMerge(MethodView):
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufMergeFilesValidator, location="files", description="multipart/form-data 'files' containing a series of FlatGeobuf files")
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
+    def post(self, files, form):
+        flatgeobuf_data = form['config']
+        request_size = get_request_size(request)
+        request_id = str(uuid.uuid4())
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        request_files = get_request_files(files, "files", flatgeobuf_data, "upload_ids")
+
+        # Retrieve the FlatGeobuf files from the request
+        filepaths = []
+        try:
+            for file in request_files:
+                filename = secure_filename(file.filename)
+
+                # check that we are getting FlatGeobuf files only
+                if not filename.lower().endswith('.fgb'):
+                    abort(400, message=f"Invalid file type: {file.filename}. Only .fgb files are accepted.")
+            
+                file_path = os.path.join(uploads_dir, filename)
+                file_hashes.append(save_upload(file, file_path))
+
+                filepaths.append(file_path)
+        except Exception as e:
+            logger.error(f"Error handling the FLATGEOBUF files: {e}")
+            abort(400, message=f"Error handling FLATGEOBUF files: {e} - api usage has not been recorded.")
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the FlatGeobuf transformation
+            fingerprint = get_request_fingerprint(request.path, flatgeobuf_data, file_hashes)
+            input_size = get_input_size(request_size, filepaths)
+            cost = estimate_task_cost(input_size, flatgeobuf_data)
+            memory = estimate_task_memory(input_size, flatgeobuf_data)
+            response = dispatch_async_task(create_flatgeobuf_merge_task, (request_size, filepaths, uploads_dir, flatgeobuf_data, request_id), fingerprint, "Geoflip FLATGEOBUF task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_flatgeobuf_merge(request_size, filepaths, uploads_dir, flatgeobuf_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the FLATGEOBUF file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=flatgeobuf_data["to_file"])
+
+        return response
+     
+@FlatGeobufBlueprint.route("/v1/transform/flatgeobuf/append", methods=['POST'])
+class FlatGeobufAppend(MethodView):
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufFileValidator, location="files", description="multipart/form-data 'file' containing a FlatGeobuf file")
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufMergeFilesValidator, location="files", description="multipart/form-data 'files' containing a series of FlatGeobuf files")
+    @FlatGeobufBlueprint.arguments(MultipartFormFlatGeobufConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
+    def post(self, target, files, form):
+        flatgeobuf_data = form['config']
+        request_size = get_request_size(request)
+        request_id = str(uuid.uuid4())
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        target_file = get_request_file(target, "file", flatgeobuf_data, "target_upload_id")
+        request_files = get_request_files(files, "files", flatgeobuf_data, "upload_ids")
+
+        # handle target file
+        target_filepath = None
+        try:
+            file = target_file
+            filename = secure_filename(file.filename)
+            # check that we are getting FlatGeobuf files only
+            if not filename.lower().endswith('.fgb'):
+                abort(400, message=f"Invalid file type: {file.filename}. Only .fgb files are accepted.")
+        
+            target_filepath = os.path.join(uploads_dir, filename)
+            file_hashes.append(save_upload(file, target_filepath))
+
+        except Exception as e:
+            logger.error(f"Error handling the FLATGEOBUF files: {e}")
+            abort(400, message=f"Error handling FLATGEOBUF files: {e} - api usage has not been recorded.")
+
+        # Retrieve the FlatGeobuf files from the request
+        append_filepaths = []
+        try:
+            for file in request_files:
+                filename = secure_filename(file.filename)
+
+                # check that we are getting FlatGeobuf files only
+                if not filename.lower().endswith('.fgb'):
+                    abort(400, message=f"Invalid file type: {file.filename}. Only .fgb files are accepted.")
+            
+                file_path = os.path.join(uploads_dir, filename)
+                file_hashes.append(save_upload(file, file_path))
+
+                append_filepaths.append(file_path)
+        except Exception as e:
+            logger.error(f"Error handling the FLATGEOBUF files: {e}")
+            abort(400, message=f"Error handling FLATGEOBUF files: {e} - api usage has not been recorded.")
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the FlatGeobuf transformation
+            fingerprint = get_request_fingerprint(request.path, flatgeobuf_data, file_hashes)
+            input_size = get_input_size(request_size, [target_filepath, *append_filepaths])
+            cost = estimate_task_cost(input_size, flatgeobuf_data)
+            memory = estimate_task_memory(input_size, flatgeobuf_data)
+            response = dispatch_async_task(create_flatgeobuf_append_task, (request_size, target_filepath, append_filepaths, uploads_dir, flatgeobuf_data, request_id), fingerprint, "Geoflip FLATGEOBUF task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_flatgeobuf_append(request_size, target_filepath, append_filepaths, uploads_dir, flatgeobuf_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the FLATGEOBUF file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=flatgeobuf_data["to_file"])
+
+        return response  
\ No newline at end of file
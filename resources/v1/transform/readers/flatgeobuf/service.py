@@ -0,0 +1,67 @@
+import os
+
+import geopandas as gpd
+import pyogrio
+
+from utils.logger import get_logger
+from resources.v1.transform.transformations import get_filter_bbox, get_read_filter
+from resources.v1.transform.pipeline import Source, run_transform, run_merge, run_append
+
+logger = get_logger(__name__)
+
+def load_flatgeobuf(file_path, clipping_gdf=None, read_bbox=None):
+    """
+    Load a flatgeobuf file, optionally reading only the features within a bbox.
+
+    The bbox is resolved against the packed r-tree of the file, so only the matching
+    features are read from disk. Features are decoded through the arrow interface rather
+    than one python object at a time.
+
+    Parameters:
+    file_path (str): The path to the flatgeobuf file.
+    clipping_gdf (GeoDataFrame, optional): Clip mask used as a spatial filter.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+
+    Returns:
+    GeoDataFrame: The GeoDataFrame loaded from the flatgeobuf file.
+    """
+    bbox = None
+    read_filter = get_read_filter(clipping_gdf, read_bbox)
+    if read_filter is not None:
+        bbox = get_filter_bbox(read_filter, pyogrio.read_info(file_path)["crs"])
+
+    return gpd.read_file(file_path, bbox=bbox, engine="pyogrio", use_arrow=True)
+
+class FlatGeobufSource(Source):
+    """
+    Pipeline source for a flatgeobuf file.
+
+    Parameters:
+    file_path (str): The path to the uploaded flatgeobuf file.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+    """
+    input_format = "FLATGEOBUF"
+    label = "FlatGeobuf"
+
+    def __init__(self, file_path, read_bbox=None):
+        super().__init__(os.path.basename(file_path))
+        self.file_path = file_path
+        self.read_bbox = read_bbox
+        # the tiles of an out-of-core request cover the whole file, a read bbox is only applied by load
+        self.tiled = read_bbox is None
+
+    def load(self, clipping_gdf=None):
+        return load_flatgeobuf(self.file_path, clipping_gdf, self.read_bbox), None
+
+def handle_flatgeobuf_transform(request_size, file_path, uploads_dir, flatgeobuf_data, request_id, celery_task=None):
+    source = FlatGeobufSource(file_path, flatgeobuf_data.get("read_bbox"))
+    return run_transform(source, flatgeobuf_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_flatgeobuf_merge(request_size, file_paths, uploads_dir, flatgeobuf_data, request_id, celery_task=None):
+    sources = [FlatGeobufSource(file_path, flatgeobuf_data.get("read_bbox")) for file_path in file_paths]
+    return run_merge(sources, flatgeobuf_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_flatgeobuf_append(request_size, target_filepath, append_filepaths, uploads_dir, flatgeobuf_data, request_id, celery_task=None):
+    target = FlatGeobufSource(target_filepath, flatgeobuf_data.get("read_bbox"))
+    sources = [FlatGeobufSource(file_path, flatgeobuf_data.get("read_bbox")) for file_path in append_filepaths]
+    return run_append(target, sources, flatgeobuf_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
@@ -1,40 +1,53 @@
 import uuid
 from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import estimate_task_cost, estimate_task_memory
 
 from celery import shared_task
-from flask import request, make_response, jsonify
+from flask import request, Response, stream_with_context
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 
 from resources.v1.transform.format.output_manager import generate_output_file_stream
-from resources.v1.transform.schemas import GeoJSONSchema, GeoJSONMergeSchema, GeoJSONAppendSchema
+from resources.v1.transform.format.encoding import EncodedBodyParser
+from resources.v1.transform.pipeline.batch import BATCH_WORKERS
+from resources.v1.transform.schemas import GeoJSONSchema, GeoJSONMergeSchema, GeoJSONAppendSchema, GeoJSONBatchSchema
 
-from .service import handle_geojson_transform, handle_geojson_merge, handle_geojson_append
+from .service import handle_geojson_transform, handle_geojson_merge, handle_geojson_append, handle_geojson_batch, handle_geojson_batch_task
 logger = get_logger(__name__)
 
-@shared_task(bind=True, ignore_result=False)
-def create_geojson_transform_task(self, request_size, geojson_data, request_id, user_id, apikey_id):
+# msgpack carries the wkb geometries of binary request bodies to the worker without re-encoding them
+@shared_task(bind=True, ignore_result=False, serializer="msgpack")
+def create_geojson_transform_task(self, request_size, geojson_data, request_id):
     self.update_state(state='STARTED', meta={'message': 'Geoflip GEOJSON task has started'})
-    return handle_geojson_transform(request_size, geojson_data, request_id, user_id, apikey_id, celery_task=self)
+    return handle_geojson_transform(request_size, geojson_data, request_id, celery_task=self)
 
-@shared_task(bind=True, ignore_result=False)
-def create_geojson_merge_task(self, request_size, geojson_data, request_id, user_id, apikey_id):
+@shared_task(bind=True, ignore_result=False, serializer="msgpack")
+def create_geojson_merge_task(self, request_size, geojson_data, request_id):
     self.update_state(state='STARTED', meta={'message': 'Geoflip GEOJSON merge task has started'})
-    return handle_geojson_merge(request_size, geojson_data, request_id, user_id, apikey_id, celery_task=self)
+    return handle_geojson_merge(request_size, geojson_data, request_id, celery_task=self)
 
-@shared_task(bind=True, ignore_result=False)
-def create_geojson_append_task(self, request_size, geojson_data, request_id, user_id, apikey_id):
+@shared_task(bind=True, ignore_result=False, serializer="msgpack")
+def create_geojson_append_task(self, request_size, geojson_data, request_id):
     self.update_state(state='STARTED', meta={'message': 'Geoflip GEOJSON append task has started'})
-    return handle_geojson_append(request_size, geojson_data, request_id, user_id, apikey_id, celery_task=self)
+    return handle_geojson_append(request_size, geojson_data, request_id, celery_task=self)
+
+@shared_task(bind=True, ignore_result=False, serializer="msgpack")
+def create_geojson_batch_task(self, request_size, batch_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip GEOJSON batch task has started'})
+    return handle_geojson_batch_task(request_size, batch_data, request_id, celery_task=self)
 
 GeojsonBlueprint = Blueprint("GeoJSON", __name__, description="GeoJSON transformation endpoints")
+# bodies can be json, msgpack or an arrow stream, selected by the Content-Type
+GeojsonBlueprint.ARGUMENTS_PARSER = EncodedBodyParser()
 
 @GeojsonBlueprint.route("/v1/transform/geojson", methods=['POST'])
 class Geojson(MethodView):
     @GeojsonBlueprint.arguments(GeoJSONSchema, location="json", description="Payload containing GeoJSON data to transform, and requested transform inputs")
     def post(self, geojson_data):
         request_id = str(uuid.uuid4())
-        request_size = request.content_length
+        request_size = get_request_size(request)
         
         # Check if async is passed in the URL as ?async=true or ?async=false
         async_param = request.args.get('async', 'false')  # Defaults to 'false'
@@ -43,12 +56,10 @@ class Geojson(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_geojson_transform_task.delay(request_size, geojson_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, geojson_data)
+            cost = estimate_task_cost(request_size, geojson_data)
+            memory = estimate_task_memory(request_size, geojson_data)
+            response = dispatch_async_task(create_geojson_transform_task, (request_size, geojson_data, request_id), fingerprint, "Geoflip GEOJSON task has been created", cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -65,7 +76,7 @@ class Geojson(MethodView):
 class GeojsonMerge(MethodView):
     @GeojsonBlueprint.arguments(GeoJSONMergeSchema, location="json", description="Payload containing a list of GeoJSON objects to merge and transform, and the requested transform inputs")
     def post(self, geojson_data):
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -75,12 +86,10 @@ class GeojsonMerge(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_geojson_merge_task.delay(request_size, geojson_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG merge task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, geojson_data)
+            cost = estimate_task_cost(request_size, geojson_data)
+            memory = estimate_task_memory(request_size, geojson_data)
+            response = dispatch_async_task(create_geojson_merge_task, (request_size, geojson_data, request_id), fingerprint, "Geoflip GEOJSON merge task has been created", cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -97,7 +106,7 @@ class GeojsonMerge(MethodView):
 class GeojsonAppend(MethodView):
     @GeojsonBlueprint.arguments(GeoJSONAppendSchema, location="json", description="Payload containing the target geojson and a list of GeoJSON objects to append to the target geojson and transform, and the requested transform inputs")
     def post(self, geojson_data):
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -107,12 +116,10 @@ class GeojsonAppend(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_geojson_append_task.delay(request_size, geojson_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG append task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, geojson_data)
+            cost = estimate_task_cost(request_size, geojson_data)
+            memory = estimate_task_memory(request_size, geojson_data)
+            response = dispatch_async_task(create_geojson_append_task, (request_size, geojson_data, request_id), fingerprint, "Geoflip GEOJSON append task has been created", cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -124,3 +131,31 @@ class GeojsonAppend(MethodView):
             response = generate_output_file_stream(result, to_file=geojson_data["to_file"])
 
         return response
+
+@GeojsonBlueprint.route("/v1/transform/geojson/batch", methods=['POST'])
+class GeojsonBatch(MethodView):
+    @GeojsonBlueprint.arguments(GeoJSONBatchSchema, location="json", description="Payload containing a list of independent GeoJSON transform jobs, or an application/x-ndjson body with one job per line")
+    def post(self, batch_data):
+        """Run many GeoJSON transform jobs in one request, the results are streamed back as ndjson lines in completion order"""
+        request_size = get_request_size(request)
+        request_id = str(uuid.uuid4())
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        if asyncRequest:
+            # one task runs the whole batch, its output is the ndjson file of the job results
+            fingerprint = get_request_fingerprint(request.path, batch_data)
+            job_size = request_size / len(batch_data["jobs"])
+            cost = sum(estimate_task_cost(job_size, job) for job in batch_data["jobs"])
+            # up to BATCH_WORKERS jobs are held in memory at the same time
+            memory = sum(sorted((estimate_task_memory(job_size, job) for job in batch_data["jobs"]), reverse=True)[:BATCH_WORKERS])
+            return dispatch_async_task(create_geojson_batch_task, (request_size, batch_data, request_id), fingerprint, "Geoflip GEOJSON batch task has been created", cost=cost, memory=memory)
+
+        lines = handle_geojson_batch(request_size, batch_data, request_id)
+        response = Response(stream_with_context(lines), mimetype="application/x-ndjson")
+        response.headers['Metadata-Request-Size'] = str(request_size)
+        response.headers['Metadata-Input-Format'] = "GEOJSON"
+        response.headers['Metadata-Output-Format'] = "NDJSON"
+        return response
@@ -0,0 +1,90 @@
+import itertools
+import os
+import uuid
+
+from flask import request, Response, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from celery import shared_task
+
+from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
+from utils.file_handling import save_request_body
+from resources.v1.transform.format.output_manager import generate_output_file_stream, OUTPUT_MIMETYPES
+
+from resources.v1.transform.schemas import GeoJSONSeqConfigValidator
+from .service import handle_geojsonseq_transform, can_stream_geojsonseq, stream_geojsonseq
+from resources.v1.transform.readers.uploads.service import get_completed_upload
+
+logger = get_logger(__name__)
+
+@shared_task(bind=True, ignore_result=False)
+def create_geojsonseq_transform_task(self, request_size, file_path, uploads_dir, geojsonseq_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip GEOJSONSEQ task has started'})
+    return handle_geojsonseq_transform(request_size, file_path, uploads_dir, geojsonseq_data, request_id, celery_task=self)
+
+GeoJSONSeqBlueprint = Blueprint("GeoJSONSeq", __name__, description="GeoJSONSeq (newline delimited GeoJSON) transformation endpoints")
+
+@GeoJSONSeqBlueprint.route("/v1/transform/geojsonseq", methods=['POST'])
+class GeoJSONSeq(MethodView):
+    @GeoJSONSeqBlueprint.arguments(GeoJSONSeqConfigValidator, location="headers", description="X-Geoflip-Config header containing the transformation configuration, the request body is the geojsonseq")
+    def post(self, headers):
+        """Transform a GeoJSONSeq body, one GeoJSON Feature per line. Requests with a geojsonseq output and only buffer, clip and erase transformations are streamed"""
+        geojsonseq_data = headers['config']
+        request_id = str(uuid.uuid4())
+        request_size = get_request_size(request)
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        upload_id = geojsonseq_data.get("upload_id")
+        if not asyncRequest and upload_id is None and can_stream_geojsonseq(geojsonseq_data):
+            # transform the body while it is being received, the output starts before the input has been read
+            output = stream_geojsonseq(iter(request.stream.readline, b""), geojsonseq_data)
+            try:
+                # an invalid input is usually invalid from its first chunk, report that as a 400 before streaming
+                first_chunk = next(output, "")
+            except Exception as e:
+                logger.error(f"Error handling the GEOJSONSEQ body: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = Response(stream_with_context(itertools.chain([first_chunk], output)), mimetype=OUTPUT_MIMETYPES["GEOJSONSEQ"])
+            response.headers['Metadata-Request-Size'] = str(request_size)
+            response.headers['Metadata-Transformations'] = "/".join(transform["type"] for transform in geojsonseq_data["transformations"])
+            response.headers['Metadata-Input-Format'] = "GEOJSONSEQ"
+            response.headers['Metadata-Output-Format'] = "GEOJSONSEQ"
+            return response
+
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # the input is the request body, or a completed chunked upload referenced in the config
+        file_path = os.path.join(uploads_dir, "input.geojsonseq")
+        if upload_id is not None:
+            file_hashes = [get_completed_upload(upload_id).link_to(file_path)]
+        else:
+            file_hashes = [save_request_body(request.stream, file_path)]
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the GeoJSONSeq transformation
+            fingerprint = get_request_fingerprint(request.path, geojsonseq_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, geojsonseq_data)
+            memory = estimate_task_memory(input_size, geojsonseq_data)
+            response = dispatch_async_task(create_geojsonseq_transform_task, (request_size, file_path, uploads_dir, geojsonseq_data, request_id), fingerprint, "Geoflip GEOJSONSEQ task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_geojsonseq_transform(request_size, file_path, uploads_dir, geojsonseq_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the GEOJSONSEQ file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=geojsonseq_data["to_file"])
+
+        return response
@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+
+import geopandas as gpd
+import pandas as pd
+
+from utils.logger import get_logger
+from utils.async_tasks import get_cancel_check
+from resources.v1.transform.format.geodataframe import format_geojsonseq, set_output_precision
+from resources.v1.transform.transformations import apply_transformations, is_feature_transformation
+from resources.v1.transform.pipeline import Source, PipelineCancelled, run_transform
+from resources.v1.transform.pipeline.progress import TaskProgress
+
+logger = get_logger(__name__)
+
+# features per GeoDataFrame chunk, a streamed request holds one chunk at a time whatever the input size
+GEOJSONSEQ_CHUNK_SIZE = int(os.getenv("GEOJSONSEQ_CHUNK_SIZE", 10000))
+
+# RFC 8142 text sequences start each record with an ascii record separator
+RECORD_SEPARATOR = b"\x1e"
+
+def read_geojsonseq_chunks(lines, chunk_size=GEOJSONSEQ_CHUNK_SIZE):
+    """
+    Read geojsonseq into GeoDataFrames of up to chunk_size features.
+
+    Each line holds a GeoJSON Feature (a FeatureCollection per line is accepted too), with or
+    without the RFC 8142 record separator. Blank lines are skipped.
+
+    Parameters:
+    lines (iterable): The input lines as bytes.
+    chunk_size (int, optional): The number of features per GeoDataFrame.
+
+    Returns:
+    generator: (GeoDataFrame, bytes_read) for each chunk, bytes_read counts the input read so far.
+    """
+    features = []
+    bytes_read = 0
+    for line_number, line in enumerate(lines, start=1):
+        bytes_read += len(line)
+        line = line.strip().lstrip(RECORD_SEPARATOR)
+        if not line:
+            continue
+
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Invalid GeoJSONSeq line {line_number}, each line must hold a GeoJSON Feature")
+        if item.get("type") == "Feature":
+            features.append(item)
+        elif item.get("type") == "FeatureCollection":
+            features.extend(item.get("features", []))
+        else:
+            raise ValueError(f"Invalid GeoJSONSeq line {line_number}, each line must hold a GeoJSON Feature")
+
+        if len(features) >= chunk_size:
+            yield gpd.GeoDataFrame.from_features(features, crs="EPSG:4326"), bytes_read
+            features = []
+
+    if features:
+        yield gpd.GeoDataFrame.from_features(features, crs="EPSG:4326"), bytes_read
+
+def can_stream_geojsonseq(request_data):
+    """Whether a request can be transformed chunk by chunk, it needs a geojsonseq output and only feature by feature transformations."""
+    return request_data["output_format"] == "geojsonseq" and all(
+        is_feature_transformation(transform) for transform in request_data["transformations"]
+    )
+
+def stream_geojsonseq(lines, request_data, progress=None):
+    """
+    Transform geojsonseq input a chunk at a time, yielding the geojsonseq output of each chunk.
+
+    Memory use is bounded by the chunk size rather than the input size, and the first output
+    is produced as soon as the first chunk has been read. Clip and erase masks are parsed once
+    and reused for every chunk, see load_mask.
+
+    Parameters:
+    lines (iterable): The input lines as bytes.
+    request_data (dict): The validated config, see can_stream_geojsonseq.
+    progress (TaskProgress, optional): Counts the bytes read, and stops a cancelled request.
+
+    Returns:
+    generator: The output text of each chunk.
+    """
+    output_precision = request_data.get("output_precision")
+    for chunk_gdf, bytes_read in read_geojsonseq_chunks(lines):
+        gdf, _ = apply_transformations(chunk_gdf, request_data)
+        if output_precision is not None:
+            gdf = set_output_precision(gdf, "EPSG:4326", output_precision)
+        yield format_geojsonseq(gdf)
+
+        if progress is not None:
+            progress.update(bytes_read)
+
+class GeoJSONSeqSource(Source):
+    """
+    Pipeline source for a geojsonseq file, for requests that cannot be streamed.
+
+    Parameters:
+    file_path (str): The path to the uploaded geojsonseq file.
+    """
+    input_format = "GEOJSONSEQ"
+    label = "GeoJSONSeq"
+
+    def __init__(self, file_path):
+        super().__init__(os.path.basename(file_path))
+        self.file_path = file_path
+
+    def load(self, clipping_gdf=None):
+        with open(self.file_path, "rb") as f:
+            gdfs = [gdf for gdf, _ in read_geojsonseq_chunks(f)]
+
+        if not gdfs:
+            raise ValueError("The GeoJSONSeq input does not contain any features")
+
+        gdf = pd.concat(gdfs, ignore_index=True) if len(gdfs) > 1 else gdfs[0]
+        return gpd.GeoDataFrame(gdf, geometry="geometry", crs="EPSG:4326"), None
+
+def handle_geojsonseq_stream(request_size, file_path, uploads_dir, geojsonseq_data, request_id, celery_task=None):
+    """
+    Stream a geojsonseq file into a geojsonseq output file a chunk at a time, see stream_geojsonseq.
+
+    Returns:
+    dict: The result of the request, in the same form as the result of a pipeline run.
+    """
+    output_dir = os.path.join(os.getenv("OUTPUT_PATH"), request_id)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "geoflip.geojsonseq")
+
+    check_cancelled = None
+    if celery_task is not None:
+        cancel_check = get_cancel_check(celery_task.request.id)
+
+        def check_cancelled():
+            if cancel_check():
+                raise PipelineCancelled(request_id)
+
+    # the whole request is a single stage, measured in bytes of the input
+    progress = TaskProgress(celery_task, [], check_cancelled, stages=[("stream", 1)])
+    progress.start("stream", "Streaming GEOJSONSEQ features", os.path.getsize(file_path), unit="bytes")
+
+    try:
+        with open(file_path, "rb") as source, open(output_path, "w") as target:
+            for text in stream_geojsonseq(source, geojsonseq_data, progress):
+                target.write(text)
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    finally:
+        if uploads_dir is not None:
+            shutil.rmtree(uploads_dir, ignore_errors=True)
+
+    return {
+        "message": "GeoJSONSeq transformation successful",
+        "response_size": os.path.getsize(output_path),
+        "request_size": request_size,
+        "transformations": "/".join(transform["type"] for transform in geojsonseq_data["transformations"]),
+        "input_format": "GEOJSONSEQ",
+        "output_format": "GEOJSONSEQ",
+        "output_file_response": output_path,
+        "to_file": True,
+    }
+
+def handle_geojsonseq_transform(request_size, file_path, uploads_dir, geojsonseq_data, request_id, celery_task=None):
+    if can_stream_geojsonseq(geojsonseq_data):
+        return handle_geojsonseq_stream(request_size, file_path, uploads_dir, geojsonseq_data, request_id, celery_task=celery_task)
+
+    source = GeoJSONSeqSource(file_path)
+    return run_transform(source, geojsonseq_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
@@ -0,0 +1,231 @@
+import os
+import uuid
+
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from werkzeug.utils import secure_filename
+
+from celery import shared_task
+
+from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
+from resources.v1.transform.format.output_manager import generate_output_file_stream
+
+from resources.v1.transform.schemas import MultipartFormGeoParquetConfigValidator, MultipartFormGeoParquetFileValidator, MultipartFormGeoParquetMergeFilesValidator 
+from .service import handle_geoparquet_transform, handle_geoparquet_merge, handle_geoparquet_append
+from utils.file_handling import save_upload
+from resources.v1.transform.readers.uploads.service import get_request_file, get_request_files
+
+logger = get_logger(__name__)
+
+GEOPARQUET_EXTENSIONS = ('.parquet', '.geoparquet')
+
+@shared_task(bind=True, ignore_result=False)
+def create_geoparquet_transform_task(self, request_size, file_path, uploads_dir, geoparquet_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip GEOPARQUET task has started'})
+    return handle_geoparquet_transform(request_size, file_path, uploads_dir, geoparquet_data, request_id, celery_task=self)
+
+@shared_task(bind=True, ignore_result=False)
+def create_geoparquet_merge_task(self, request_size, file_paths, uploads_dir, geoparquet_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip GEOPARQUET task has started'})
+    return handle_geoparquet_merge(request_size, file_paths, uploads_dir, geoparquet_data, request_id, celery_task=self)
+
+@shared_task(bind=True, ignore_result=False)
+def create_geoparquet_append_task(self, request_size, target_filepath, append_filepaths, uploads_dir, geoparquet_data, request_id):
+    self.update_state(state='STARTED', meta={'message': 'Geoflip GEOPARQUET task has started'})
+    return handle_geoparquet_append(request_size, target_filepath, append_filepaths, uploads_dir, geoparquet_data, request_id, celery_task=self)
+
+GeoParquetBlueprint = Blueprint("GeoParquet", __name__, description="GeoParquet transformation endpoints")
+
+@GeoParquetBlueprint.route("/v1/transform/geoparquet", methods=['POST'])
+class GeoParquet(MethodView):
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetFileValidator, location="files", description="multipart/form-data 'file' containing a GeoParquet file")
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetConfigValidator, location="form", description="multipart/form-data containing the transformation configuration")
+    def post(self, files, form):
+        geoparquet_data = form['config']
+        request_id = str(uuid.uuid4())
+        request_size = get_request_size(request)
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # Save and extract ZIP file
+        file = get_request_file(files, "file", geoparquet_data, "upload_id")
+        filename = secure_filename(file.filename)
+        # check that we are getting GeoParquet files only
+        if not filename.lower().endswith(GEOPARQUET_EXTENSIONS):
+            abort(400, message=f"Invalid file type: {file.filename}. Only .parquet, .geoparquet files are accepted.")
+    
+        file_path = os.path.join(uploads_dir, filename)
+        file_hashes.append(save_upload(file, file_path))
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the GeoParquet transformation
+            fingerprint = get_request_fingerprint(request.path, geoparquet_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, geoparquet_data)
+            memory = estimate_task_memory(input_size, geoparquet_data)
+            response = dispatch_async_task(create_geoparquet_transform_task, (request_size, file_path, uploads_dir, geoparquet_data, request_id), fingerprint, "Geoflip GEOPARQUET task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_geoparquet_transform(request_size, file_path, uploads_dir, geoparquet_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the GEOPARQUET file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=geoparquet_data["to_file"])
+
+        return response
+    
+@GeoParquetBlueprint.route("/v1/transform/geoparquet/merge", methods=['POST'])
+class GeoParquetMerge(MethodView):
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetMergeFilesValidator, location="files", description="multipart/form-data 'files' containing a series of GeoParquet files")
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
+    def post(self, files, form):
+        geoparquet_data = form['config']
+        request_size = get_request_size(request)
+        request_id = str(uuid.uuid4())
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        request_files = get_request_files(files, "files", geoparquet_data, "upload_ids")
+
+        # Retrieve the GeoParquet files from the request
+        filepaths = []
+        try:
+            for file in request_files:
+                filename = secure_filename(file.filename)
+
+                # check that we are getting GeoParquet files only
+                if not filename.lower().endswith(GEOPARQUET_EXTENSIONS):
+                    abort(400, message=f"Invalid file type: {file.filename}. Only .parquet, .geoparquet files are accepted.")
+            
+                file_path = os.path.join(uploads_dir, filename)
+                file_hashes.append(save_upload(file, file_path))
+
+                filepaths.append(file_path)
+        except Exception as e:
+            logger.error(f"Error handling the GEOPARQUET files: {e}")
+            abort(400, message=f"Error handling GEOPARQUET files: {e} - api usage has not been recorded.")
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the GeoParquet transformation
+            fingerprint = get_request_fingerprint(request.path, geoparquet_data, file_hashes)
+            input_size = get_input_size(request_size, filepaths)
+            cost = estimate_task_cost(input_size, geoparquet_data)
+            memory = estimate_task_memory(input_size, geoparquet_data)
+            response = dispatch_async_task(create_geoparquet_merge_task, (request_size, filepaths, uploads_dir, geoparquet_data, request_id), fingerprint, "Geoflip GEOPARQUET task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_geoparquet_merge(request_size, filepaths, uploads_dir, geoparquet_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the GEOPARQUET file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=geoparquet_data["to_file"])
+
+        return response
+     
+@GeoParquetBlueprint.route("/v1/transform/geoparquet/append", methods=['POST'])
+class GeoParquetAppend(MethodView):
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetFileValidator, location="files", description="multipart/form-data 'file' containing a GeoParquet file")
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetMergeFilesValidator, location="files", description="multipart/form-data 'files' containing a series of GeoParquet files")
+    @GeoParquetBlueprint.arguments(MultipartFormGeoParquetConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
+    def post(self, target, files, form):
+        geoparquet_data = form['config']
+        request_size = get_request_size(request)
+        request_id = str(uuid.uuid4())
+
+        # Check if async is passed in the URL as ?async=true or ?async=false
+        async_param = request.args.get('async', 'false')  # Defaults to 'false'
+        asyncRequest = async_param.lower() == 'true'  # Set asyncRequest to True if async=true
+
+        #  make a folder to extract the zip file
+        uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
+        os.makedirs(uploads_dir, exist_ok=True)
+
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        target_file = get_request_file(target, "file", geoparquet_data, "target_upload_id")
+        request_files = get_request_files(files, "files", geoparquet_data, "upload_ids")
+
+        # handle target file
+        target_filepath = None
+        try:
+            file = target_file
+            filename = secure_filename(file.filename)
+            # check that we are getting GeoParquet files only
+            if not filename.lower().endswith(GEOPARQUET_EXTENSIONS):
+                abort(400, message=f"Invalid file type: {file.filename}. Only .parquet, .geoparquet files are accepted.")
+        
+            target_filepath = os.path.join(uploads_dir, filename)
+            file_hashes.append(save_upload(file, target_filepath))
+
+        except Exception as e:
+            logger.error(f"Error handling the GEOPARQUET files: {e}")
+            abort(400, message=f"Error handling GEOPARQUET files: {e} - api usage has not been recorded.")
+
+        # Retrieve the GeoParquet files from the request
+        append_filepaths = []
+        try:
+            for file in request_files:
+                filename = secure_filename(file.filename)
+
+                # check that we are getting GeoParquet files only
+                if not filename.lower().endswith(GEOPARQUET_EXTENSIONS):
+                    abort(400, message=f"Invalid file type: {file.filename}. Only .parquet, .geoparquet files are accepted.")
+            
+                file_path = os.path.join(uploads_dir, filename)
+                file_hashes.append(save_upload(file, file_path))
+
+                append_filepaths.append(file_path)
+        except Exception as e:
+            logger.error(f"Error handling the GEOPARQUET files: {e}")
+            abort(400, message=f"Error handling GEOPARQUET files: {e} - api usage has not been recorded.")
+
+        response = None
+        if asyncRequest:
+            # call the service to handle the GeoParquet transformation
+            fingerprint = get_request_fingerprint(request.path, geoparquet_data, file_hashes)
+            input_size = get_input_size(request_size, [target_filepath, *append_filepaths])
+            cost = estimate_task_cost(input_size, geoparquet_data)
+            memory = estimate_task_memory(input_size, geoparquet_data)
+            response = dispatch_async_task(create_geoparquet_append_task, (request_size, target_filepath, append_filepaths, uploads_dir, geoparquet_data, request_id), fingerprint, "Geoflip GEOPARQUET task as been created", uploads_dir, cost=cost, memory=memory)
+        else:
+            # this is the normal sync route
+            try:
+                result = handle_geoparquet_append(request_size, target_filepath, append_filepaths, uploads_dir, geoparquet_data, request_id)
+            except Exception as e:
+                logger.error(f"Error handling the GEOPARQUET file: {e}")
+                abort(400, message=f"Geoflip Error - {e}")
+
+            response = generate_output_file_stream(result, to_file=geoparquet_data["to_file"])
+
+        return response  
\ No newline at end of file
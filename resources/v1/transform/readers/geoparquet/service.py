@@ -0,0 +1,97 @@
+import json
+import os
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+from utils.logger import get_logger
+from resources.v1.transform.transformations import get_filter_bbox, get_read_filter
+from resources.v1.transform.pipeline import Source, run_transform, run_merge, run_append
+from ..arrow.service import get_geo_crs, filter_bbox, arrow_to_geodataframe
+
+logger = get_logger(__name__)
+
+def get_covering_columns(arrow_schema):
+    """Get the names of the bbox covering columns declared in the "geo" metadata of a geoparquet schema."""
+    geo = json.loads(arrow_schema.metadata[b"geo"])
+    columns = set()
+    for column in geo["columns"].values():
+        for path in column.get("covering", {}).get("bbox", {}).values():
+            columns.add(path[0])
+    return columns
+
+def load_geoparquet(file_path, clipping_gdf=None, read_bbox=None, row_groups=None):
+    """
+    Load a geoparquet file, optionally reading only some row groups or the features within a bbox.
+
+    When the file has a bbox covering column the bbox is pushed down to the parquet reader,
+    which skips row groups whose statistics fall outside it. Otherwise the features are
+    filtered on their bounds after reading.
+
+    Parameters:
+    file_path (str): The path to the geoparquet file.
+    clipping_gdf (GeoDataFrame, optional): Clip mask used as a spatial filter.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+    row_groups (list, optional): Indexes of the row groups to read.
+
+    Returns:
+    GeoDataFrame: The GeoDataFrame loaded from the geoparquet file.
+    """
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    bbox = get_filter_bbox(get_read_filter(clipping_gdf, read_bbox), get_geo_crs(parquet_file.schema_arrow))
+
+    if row_groups is not None:
+        num_row_groups = parquet_file.metadata.num_row_groups
+        invalid = [row_group for row_group in row_groups if row_group >= num_row_groups]
+        if invalid:
+            raise ValueError(f"Row groups {invalid} do not exist, the file has {num_row_groups} row groups")
+
+        # read the requested row groups without the bbox covering columns, they are only used for filtering
+        covering_columns = get_covering_columns(parquet_file.schema_arrow)
+        columns = [name for name in parquet_file.schema_arrow.names if name not in covering_columns]
+        gdf = arrow_to_geodataframe(parquet_file.read_row_groups(row_groups, columns=columns))
+        return filter_bbox(gdf, bbox).reset_index(drop=True)
+
+    if bbox is None:
+        return gpd.read_parquet(file_path, memory_map=True)
+
+    try:
+        return gpd.read_parquet(file_path, bbox=bbox, memory_map=True)
+    except ValueError:
+        # no bbox covering column to filter on, filter on the decoded geometries instead
+        logger.info(f"No bbox covering in {os.path.basename(file_path)}, filtering after reading")
+        return filter_bbox(gpd.read_parquet(file_path, memory_map=True), bbox).reset_index(drop=True)
+
+class GeoParquetSource(Source):
+    """
+    Pipeline source for a geoparquet file.
+
+    Parameters:
+    file_path (str): The path to the uploaded geoparquet file.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326 to read.
+    row_groups (list, optional): Indexes of the row groups to read.
+    """
+    input_format = "GEOPARQUET"
+    label = "GeoParquet"
+
+    def __init__(self, file_path, read_bbox=None, row_groups=None):
+        super().__init__(os.path.basename(file_path))
+        self.file_path = file_path
+        self.read_bbox = read_bbox
+        self.row_groups = row_groups
+
+    def load(self, clipping_gdf=None):
+        return load_geoparquet(self.file_path, clipping_gdf, self.read_bbox, self.row_groups), None
+
+def handle_geoparquet_transform(request_size, file_path, uploads_dir, geoparquet_data, request_id, celery_task=None):
+    source = GeoParquetSource(file_path, geoparquet_data.get("read_bbox"), geoparquet_data.get("row_groups"))
+    return run_transform(source, geoparquet_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_geoparquet_merge(request_size, file_paths, uploads_dir, geoparquet_data, request_id, celery_task=None):
+    sources = [GeoParquetSource(file_path, geoparquet_data.get("read_bbox"), geoparquet_data.get("row_groups")) for file_path in file_paths]
+    return run_merge(sources, geoparquet_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
+
+def handle_geoparquet_append(request_size, target_filepath, append_filepaths, uploads_dir, geoparquet_data, request_id, celery_task=None):
+    target = GeoParquetSource(target_filepath, geoparquet_data.get("read_bbox"), geoparquet_data.get("row_groups"))
+    sources = [GeoParquetSource(file_path, geoparquet_data.get("read_bbox"), geoparquet_data.get("row_groups")) for file_path in append_filepaths]
+    return run_append(target, sources, geoparquet_data, request_id, request_size, uploads_dir=uploads_dir, celery_task=celery_task)
@@ -1,7 +1,7 @@
 import os
 import uuid
 
-from flask import request, make_response, jsonify
+from flask import request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from werkzeug.utils import secure_filename
@@ -9,11 +9,15 @@ from werkzeug.utils import secure_filename
 from celery import shared_task
 
 from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
 from resources.v1.transform.format.output_manager import generate_output_file_stream
 
 from resources.v1.transform.schemas import MultipartFormGPKGConfigValidator, MultipartFormGPKGFileValidator, MultipartFormGPKGMergeFilesValidator 
 from .service import handle_gpkg_transform, handle_gpkg_merge, handle_gpkg_append
-from utils.file_handling import wait_for_file
+from utils.file_handling import save_upload
+from resources.v1.transform.readers.uploads.service import get_request_file, get_request_files
 
 logger = get_logger(__name__)
 
@@ -41,7 +45,7 @@ class Geopackage(MethodView):
     def post(self, files, form):
         gpkg_data = form['config']
         request_id = str(uuid.uuid4())
-        request_size = request.content_length
+        request_size = get_request_size(request)
 
         # Check if async is passed in the URL as ?async=true or ?async=false
         async_param = request.args.get('async', 'false')  # Defaults to 'false'
@@ -51,32 +55,27 @@ class Geopackage(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
         # Save and extract ZIP file
-        file = files["file"]
+        file = get_request_file(files, "file", gpkg_data, "upload_id")
         filename = secure_filename(file.filename)
         # check that we are getting gpkg files only
         if not filename.lower().endswith('.gpkg'):
             abort(400, message=f"Invalid file type: {file.filename}. Only .gpkg files are accepted.")
     
         file_path = os.path.join(uploads_dir, filename)
-        file.save(file_path)
-
-        # Check if the file is accessible
-        try:
-            wait_for_file(file_path)
-        except FileNotFoundError as e:
-            logger.error(f"File save failed or file not accessible: {e}")
-            abort(400, description="File save failed or not accessible.")
+        file_hashes.append(save_upload(file, file_path))
 
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_gpkg_transform_task.delay(request_size, file_path, uploads_dir, gpkg_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, gpkg_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, gpkg_data)
+            memory = estimate_task_memory(input_size, gpkg_data)
+            response = dispatch_async_task(create_gpkg_transform_task, (request_size, file_path, uploads_dir, gpkg_data, request_id), fingerprint, "Geoflip GPKG task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -95,7 +94,7 @@ class GPKGMerge(MethodView):
     @GeopackageBlueprint.arguments(MultipartFormGPKGConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
     def post(self, files, form):
         gpkg_data = form['config']
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -106,10 +105,16 @@ class GPKGMerge(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        request_files = get_request_files(files, "files", gpkg_data, "upload_ids")
+
         # Retrieve the geopackages from the request
         filepaths = []
         try:
-            for file in files['files']:
+            for file in request_files:
                 filename = secure_filename(file.filename)
 
                 # check that we are getting gpkg files only
@@ -117,14 +122,7 @@ class GPKGMerge(MethodView):
                     abort(400, message=f"Invalid file type: {file.filename}. Only .gpkg files are accepted.")
             
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 filepaths.append(file_path)
         except Exception as e:
@@ -134,12 +132,11 @@ class GPKGMerge(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_gpkg_merge_task.delay(request_size, filepaths, uploads_dir, gpkg_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, gpkg_data, file_hashes)
+            input_size = get_input_size(request_size, filepaths)
+            cost = estimate_task_cost(input_size, gpkg_data)
+            memory = estimate_task_memory(input_size, gpkg_data)
+            response = dispatch_async_task(create_gpkg_merge_task, (request_size, filepaths, uploads_dir, gpkg_data, request_id), fingerprint, "Geoflip GPKG task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -159,7 +156,7 @@ class GPKGAppend(MethodView):
     @GeopackageBlueprint.arguments(MultipartFormGPKGConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
     def post(self, target, files, form):
         gpkg_data = form['config']
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -170,25 +167,25 @@ class GPKGAppend(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        target_file = get_request_file(target, "file", gpkg_data, "target_upload_id")
+        request_files = get_request_files(files, "files", gpkg_data, "upload_ids")
+
         # handle target file
         target_filepath = None
         try:
-            file = target["file"]
+            file = target_file
             filename = secure_filename(file.filename)
             # check that we are getting gpkg files only
             if not filename.lower().endswith('.gpkg'):
                 abort(400, message=f"Invalid file type: {file.filename}. Only .gpkg files are accepted.")
         
             target_filepath = os.path.join(uploads_dir, filename)
-            file.save(target_filepath)
+            file_hashes.append(save_upload(file, target_filepath))
 
-            # Check if the file is accessible
-            try:
-                wait_for_file(target_filepath)
-            except FileNotFoundError as e:
-                logger.error(f"File save failed or file not accessible: {e}")
-                abort(400, description="File save failed or not accessible.")
-                
         except Exception as e:
             logger.error(f"Error handling the GPKG files: {e}")
             abort(400, message=f"Error handling GPKG files: {e} - api usage has not been recorded.")
@@ -196,7 +193,7 @@ class GPKGAppend(MethodView):
         # Retrieve the geopackages from the request
         append_filepaths = []
         try:
-            for file in files['files']:
+            for file in request_files:
                 filename = secure_filename(file.filename)
 
                 # check that we are getting gpkg files only
@@ -204,14 +201,7 @@ class GPKGAppend(MethodView):
                     abort(400, message=f"Invalid file type: {file.filename}. Only .gpkg files are accepted.")
             
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 append_filepaths.append(file_path)
         except Exception as e:
@@ -221,12 +211,11 @@ class GPKGAppend(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_gpkg_append_task.delay(request_size, target_filepath, append_filepaths, uploads_dir, gpkg_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip GPKG task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, gpkg_data, file_hashes)
+            input_size = get_input_size(request_size, [target_filepath, *append_filepaths])
+            cost = estimate_task_cost(input_size, gpkg_data)
+            memory = estimate_task_memory(input_size, gpkg_data)
+            response = dispatch_async_task(create_gpkg_append_task, (request_size, target_filepath, append_filepaths, uploads_dir, gpkg_data, request_id), fingerprint, "Geoflip GPKG task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -1,18 +1,22 @@
 import os
 import uuid
 
-from flask import request, make_response, jsonify
+from flask import request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from werkzeug.utils import secure_filename
 
 from utils.logger import get_logger
+from utils.compression import get_request_size
+from utils.async_tasks import get_request_fingerprint, dispatch_async_task
+from utils.task_routing import get_input_size, estimate_task_cost, estimate_task_memory
 from resources.v1.transform.format.output_manager import generate_output_file_stream
 
 from celery import shared_task
 from resources.v1.transform.schemas import MultipartFormSHPConfigValidator, MultipartFormSHPFileValidator, MultipartFormSHPMergeFilesValidator
 from .service import handle_shp_transform, handle_shp_merge, handle_shp_append
-from utils.file_handling import wait_for_file
+from utils.file_handling import save_upload
+from resources.v1.transform.readers.uploads.service import get_request_file, get_request_files
 
 logger = get_logger(__name__)
 
@@ -39,7 +43,7 @@ class Shapefile(MethodView):
     def post(self, files, form):
         shp_data = form['config']
         request_id = str(uuid.uuid4())
-        request_size = request.content_length
+        request_size = get_request_size(request)
 
         # Check if async is passed in the URL as ?async=true or ?async=false
         async_param = request.args.get('async', 'false')  # Defaults to 'false'
@@ -49,30 +53,25 @@ class Shapefile(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
         # Save and extract ZIP file
-        file = files["file"]
+        file = get_request_file(files, "file", shp_data, "upload_id")
         filename = secure_filename(file.filename)
         file_path = os.path.join(uploads_dir, filename)
-        file.save(file_path)
-
-        # Check if the file is accessible
-        try:
-            wait_for_file(file_path)
-        except FileNotFoundError as e:
-            logger.error(f"File save failed or file not accessible: {e}")
-            abort(400, description="File save failed or not accessible.")
+        file_hashes.append(save_upload(file, file_path))
 
         extract_path = os.path.join(uploads_dir, os.path.splitext(filename)[0])
 
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_shp_transform_task.delay(request_size, file_path, extract_path, uploads_dir, shp_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip SHP task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, shp_data, file_hashes)
+            input_size = get_input_size(request_size, [file_path])
+            cost = estimate_task_cost(input_size, shp_data)
+            memory = estimate_task_memory(input_size, shp_data)
+            response = dispatch_async_task(create_shp_transform_task, (request_size, file_path, extract_path, uploads_dir, shp_data, request_id), fingerprint, "Geoflip SHP task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -92,7 +91,7 @@ class ShapeMerge(MethodView):
     def post(self, files, form):
         shp_data = form['config']
         request_id = str(uuid.uuid4())
-        request_size = request.content_length
+        request_size = get_request_size(request)
 
         # Check if async is passed in the URL as ?async=true or ?async=false
         async_param = request.args.get('async', 'false')  # Defaults to 'false'
@@ -102,20 +101,19 @@ class ShapeMerge(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        request_files = get_request_files(files, "files", shp_data, "upload_ids")
+
         # retrieve the files from the request and save them
         filepaths = []
         try:
-            for file in files['files']:
+            for file in request_files:
                 filename = secure_filename(file.filename)
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 filepaths.append(file_path)
         except Exception as e:
@@ -125,12 +123,11 @@ class ShapeMerge(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_shp_merge_task.delay(request_size, filepaths, uploads_dir, shp_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip SHP task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, shp_data, file_hashes)
+            input_size = get_input_size(request_size, filepaths)
+            cost = estimate_task_cost(input_size, shp_data)
+            memory = estimate_task_memory(input_size, shp_data)
+            response = dispatch_async_task(create_shp_merge_task, (request_size, filepaths, uploads_dir, shp_data, request_id), fingerprint, "Geoflip SHP task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
@@ -150,7 +147,7 @@ class ShapeAppend(MethodView):
     @ShapefileBlueprint.arguments(MultipartFormSHPConfigValidator, location="form", description="multipart/form-data containing the transformation configuration to be applied after merging")
     def post(self, target, files, form):
         shp_data = form['config']
-        request_size = request.content_length
+        request_size = get_request_size(request)
         request_id = str(uuid.uuid4())
 
         # Check if async is passed in the URL as ?async=true or ?async=false
@@ -161,27 +158,20 @@ class ShapeAppend(MethodView):
         uploads_dir = os.path.join(os.getenv("UPLOADS_PATH"), request_id)
         os.makedirs(uploads_dir, exist_ok=True)
 
+        # content hashes of the input files, they are part of the async task fingerprint
+        file_hashes = []
+
+        # input files sent in the request or referenced by chunked upload IDs
+        target_file = get_request_file(target, "file", shp_data, "target_upload_id")
+        request_files = get_request_files(files, "files", shp_data, "upload_ids")
+
         # retrieve the files from the request and save them
         append_filepaths = []
         try:
-            for file in files['files']:
+            for file in request_files:
                 filename = secure_filename(file.filename)
                 file_path = os.path.join(uploads_dir, filename)
-                file.save(file_path)
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
-
-                # Check if the file is accessible
-                try:
-                    wait_for_file(file_path)
-                except FileNotFoundError as e:
-                    logger.error(f"File save failed or file not accessible: {e}")
-                    abort(400, description="File save failed or not accessible.")
+                file_hashes.append(save_upload(file, file_path))
 
                 append_filepaths.append(file_path)
         except Exception as e:
@@ -191,17 +181,10 @@ class ShapeAppend(MethodView):
         target_file_path = None
         try:
             # Save and extract ZIP file
-            file = target["file"]
+            file = target_file
             filename = secure_filename(file.filename)
             target_file_path = os.path.join(uploads_dir, filename)
-            file.save(target_file_path)
-
-            # Check if the file is accessible
-            try:
-                wait_for_file(target_file_path)
-            except FileNotFoundError as e:
-                logger.error(f"File save failed or file not accessible: {e}")
-                abort(400, description="File save failed or not accessible.")
+            file_hashes.append(save_upload(file, target_file_path))
 
         except Exception as e:
             logger.error(f"Error saving the target SHP file: {e}")
@@ -210,12 +193,11 @@ class ShapeAppend(MethodView):
         response = None
         if asyncRequest:
             # call the service to handle the shapefile transformation
-            result = create_shp_append_task.delay(request_size, target_file_path, append_filepaths, uploads_dir, shp_data, request_id)
-            response = make_response(jsonify({
-                "message": "Geoflip SHP append task as been created",
-                "task_id": result.id,
-                "state": "TASK CREATED"
-            }), 202)
+            fingerprint = get_request_fingerprint(request.path, shp_data, file_hashes)
+            input_size = get_input_size(request_size, [target_file_path, *append_filepaths])
+            cost = estimate_task_cost(input_size, shp_data)
+            memory = estimate_task_memory(input_size, shp_data)
+            response = dispatch_async_task(create_shp_append_task, (request_size, target_file_path, append_filepaths, uploads_dir, shp_data, request_id), fingerprint, "Geoflip SHP append task as been created", uploads_dir, cost=cost, memory=memory)
         else:
             # this is the normal sync route
             try:
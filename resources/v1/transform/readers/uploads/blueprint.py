@@ -0,0 +1,45 @@
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from utils.logger import get_logger
+from resources.v1.transform.schemas import UploadCreateSchema, UploadSessionSchema
+from .service import create_upload, get_upload, write_chunk, complete_upload, delete_upload, CHUNK_CHECKSUM_HEADER
+
+logger = get_logger(__name__)
+
+UploadBlueprint = Blueprint("Uploads", __name__, description="Resumable chunked uploads for large input files")
+
+@UploadBlueprint.route("/v1/transform/uploads", methods=['POST'])
+class Uploads(MethodView):
+    @UploadBlueprint.arguments(UploadCreateSchema, description="The file to be uploaded")
+    @UploadBlueprint.response(201, UploadSessionSchema, description="The new upload session")
+    def post(self, upload_data):
+        session = create_upload(upload_data["filename"], upload_data["size"], upload_data.get("chunk_size"), upload_data.get("sha256"))
+        logger.info(f"Created upload {session['upload_id']} for {session['filename']} ({session['size']} bytes)")
+        return session
+
+@UploadBlueprint.route("/v1/transform/uploads/<string:upload_id>", methods=['GET', 'DELETE'])
+class Upload(MethodView):
+    @UploadBlueprint.response(200, UploadSessionSchema, description="The upload session with its missing chunks")
+    def get(self, upload_id):
+        return get_upload(upload_id)
+
+    @UploadBlueprint.response(204, description="The upload session and its file have been removed")
+    def delete(self, upload_id):
+        delete_upload(upload_id)
+
+@UploadBlueprint.route("/v1/transform/uploads/<string:upload_id>/chunks/<int:index>", methods=['PUT'])
+class UploadChunk(MethodView):
+    @UploadBlueprint.response(200, UploadSessionSchema, description="The upload session after the chunk was written")
+    def put(self, upload_id, index):
+        """Upload one chunk as the raw request body, with its hex sha256 in the X-Chunk-SHA256 header"""
+        return write_chunk(upload_id, index, request.stream, request.headers.get(CHUNK_CHECKSUM_HEADER))
+
+@UploadBlueprint.route("/v1/transform/uploads/<string:upload_id>/complete", methods=['POST'])
+class UploadComplete(MethodView):
+    @UploadBlueprint.response(200, UploadSessionSchema, description="The completed upload session")
+    def post(self, upload_id):
+        session = complete_upload(upload_id)
+        logger.info(f"Completed upload {upload_id}")
+        return session
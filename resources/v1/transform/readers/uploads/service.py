@@ -0,0 +1,329 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+import uuid
+
+from flask_smorest import abort
+from werkzeug.utils import secure_filename
+
+from db import redis_client
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# chunk size handed out when the client does not ask for one, and the range it may ask for
+DEFAULT_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 16 * 1024 ** 2))
+MIN_CHUNK_SIZE = 1024 ** 2
+MAX_CHUNK_SIZE = 256 * 1024 ** 2
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 1024 ** 3))
+
+# an upload session that has not been touched for this long is forgotten and its file removed
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+
+# sessions are assembled here, on the same filesystem as the request upload folders so a
+# finished upload can be linked into a request folder instead of being copied
+CHUNKED_DIR = ".chunked"
+
+CHUNK_CHECKSUM_HEADER = "X-Chunk-SHA256"
+READ_SIZE = 1024 * 1024
+
+# how often a chunk or a completion waiting on the lock of an upload file tries again, the lock
+# is polled rather than waited on so a gevent worker keeps serving the chunks that hold it
+LOCK_POLL_INTERVAL = 0.05
+
+def get_chunked_dir():
+    return os.path.join(os.getenv("UPLOADS_PATH"), CHUNKED_DIR)
+
+def session_key(upload_id):
+    return f"upload:{upload_id}"
+
+def chunks_key(upload_id):
+    return f"upload:{upload_id}:chunks"
+
+def lock_upload_file(fd, operation):
+    """
+    Take a flock on an upload file, released when fd is closed.
+
+    Chunks are written under a shared lock and an upload is completed under an exclusive one,
+    so a completion waits for the chunks being written and the chunks sent after it see that
+    the upload is complete.
+
+    Parameters:
+    fd (int): A file descriptor of the upload file.
+    operation (int): fcntl.LOCK_SH or fcntl.LOCK_EX.
+    """
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(LOCK_POLL_INTERVAL)
+
+def cleanup_expired_uploads():
+    """Remove the assembled files of upload sessions that expired in redis."""
+    chunked_dir = get_chunked_dir()
+    if not os.path.isdir(chunked_dir):
+        return
+
+    for upload_id in os.listdir(chunked_dir):
+        if not redis_client.exists(session_key(upload_id)):
+            shutil.rmtree(os.path.join(chunked_dir, upload_id), ignore_errors=True)
+            logger.info(f"Removed expired upload {upload_id}")
+
+def create_upload(filename, size, chunk_size=None, sha256=None):
+    """
+    Start a chunked upload session and allocate its file.
+
+    Parameters:
+    filename (str): The name of the file being uploaded, its extension selects the reader later on.
+    size (int): The total size of the file in bytes.
+    chunk_size (int, optional): The size of every chunk but the last, defaults to DEFAULT_CHUNK_SIZE.
+    sha256 (str, optional): The hex sha256 of the whole file, checked when the upload is completed.
+
+    Returns:
+    dict: The upload session.
+    """
+    filename = secure_filename(filename)
+    if not filename:
+        abort(400, message="Invalid filename.")
+    if size > MAX_UPLOAD_SIZE:
+        abort(413, message=f"Uploads are limited to {MAX_UPLOAD_SIZE} bytes.")
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        abort(400, message=f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes.")
+
+    cleanup_expired_uploads()
+
+    upload_id = str(uuid.uuid4())
+    upload_dir = os.path.join(get_chunked_dir(), upload_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, filename)
+
+    # allocate the whole file up front so chunks can be written at their offset in any order
+    with open(file_path, "wb") as f:
+        f.truncate(size)
+
+    session = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_count": max(1, -(-size // chunk_size)),
+        "sha256": sha256 or "",
+        "state": "UPLOADING",
+        "path": file_path,
+    }
+    redis_client.hset(session_key(upload_id), mapping=session)
+    redis_client.expire(session_key(upload_id), UPLOAD_SESSION_TTL)
+
+    return get_upload(upload_id)
+
+def get_upload(upload_id):
+    """
+    Get an upload session with its received and missing chunks.
+
+    Parameters:
+    upload_id (str): The upload ID.
+
+    Returns:
+    dict: The upload session.
+    """
+    session = redis_client.hgetall(session_key(upload_id))
+    if not session:
+        abort(404, message=f"Upload {upload_id} not found or expired.")
+
+    for key in ("size", "chunk_size", "chunk_count"):
+        session[key] = int(session[key])
+
+    received = {int(index) for index in redis_client.smembers(chunks_key(upload_id))}
+    session["received_chunks"] = len(received)
+    session["missing_chunks"] = [index for index in range(session["chunk_count"]) if index not in received]
+    session["expires_in"] = redis_client.ttl(session_key(upload_id))
+
+    return session
+
+def write_chunk(upload_id, index, stream, checksum):
+    """
+    Write one chunk of an upload at its offset and record it once its checksum matches.
+
+    Chunks are written with pwrite on their own file descriptor, so any number of them can be
+    sent in parallel and a failed chunk is simply sent again. The state of the upload is checked
+    again under the lock of the file (see lock_upload_file), a completed upload is linked into
+    request folders and is never written again.
+
+    Parameters:
+    upload_id (str): The upload ID.
+    index (int): The zero based chunk index.
+    stream: The request body stream holding the chunk.
+    checksum (str): The hex sha256 of the chunk sent in the X-Chunk-SHA256 header.
+
+    Returns:
+    dict: The upload session.
+    """
+    if not checksum:
+        abort(400, message=f"The {CHUNK_CHECKSUM_HEADER} header is required.")
+
+    session = get_upload(upload_id)
+    if session["state"] != "UPLOADING":
+        abort(409, message=f"Upload {upload_id} is already complete.")
+    if not 0 <= index < session["chunk_count"]:
+        abort(400, message=f"Chunk index must be between 0 and {session['chunk_count'] - 1}.")
+
+    offset = index * session["chunk_size"]
+    expected_size = min(session["chunk_size"], session["size"] - offset)
+
+    sha256 = hashlib.sha256()
+    written = 0
+    fd = os.open(session["path"], os.O_WRONLY)
+    try:
+        lock_upload_file(fd, fcntl.LOCK_SH)
+        if redis_client.hget(session_key(upload_id), "state") != "UPLOADING":
+            abort(409, message=f"Upload {upload_id} is already complete.")
+
+        # the chunk is rewritten in place, it only counts as received again once its checksum matches
+        redis_client.srem(chunks_key(upload_id), index)
+
+        while data := stream.read(READ_SIZE):
+            if written + len(data) > expected_size:
+                abort(400, message=f"Chunk {index} is larger than {expected_size} bytes.")
+            os.pwrite(fd, data, offset + written)
+            sha256.update(data)
+            written += len(data)
+
+        if written != expected_size:
+            abort(400, message=f"Chunk {index} has {written} bytes, expected {expected_size}.")
+        if sha256.hexdigest() != checksum.lower():
+            abort(400, message=f"Checksum mismatch for chunk {index}, send it again.")
+
+        redis_client.sadd(chunks_key(upload_id), index)
+    finally:
+        os.close(fd)
+
+    # every chunk keeps the session alive
+    redis_client.expire(session_key(upload_id), UPLOAD_SESSION_TTL)
+    redis_client.expire(chunks_key(upload_id), UPLOAD_SESSION_TTL)
+
+    return get_upload(upload_id)
+
+def complete_upload(upload_id):
+    """
+    Finish an upload once all of its chunks have been received.
+
+    The file is synced to disk and, when a sha256 was given for the whole file, checked against it.
+    This happens under the exclusive lock of the file, after the chunks still being written have
+    finished and before any other chunk can be written, see lock_upload_file.
+
+    Parameters:
+    upload_id (str): The upload ID.
+
+    Returns:
+    dict: The upload session.
+    """
+    session = get_upload(upload_id)
+    if session["state"] == "COMPLETE":
+        return session
+
+    with open(session["path"], "rb") as f:
+        lock_upload_file(f.fileno(), fcntl.LOCK_EX)
+        session = get_upload(upload_id)
+        if session["state"] == "COMPLETE":
+            return session
+        if session["missing_chunks"]:
+            abort(409, message=f"Upload {upload_id} is missing {len(session['missing_chunks'])} chunks.")
+
+        os.fsync(f.fileno())
+        if session["sha256"]:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if digest != session["sha256"].lower():
+                abort(400, message=f"Checksum mismatch for upload {upload_id}.")
+
+        redis_client.hset(session_key(upload_id), "state", "COMPLETE")
+    session["state"] = "COMPLETE"
+    return session
+
+def delete_upload(upload_id):
+    """Remove an upload session and its file."""
+    redis_client.delete(session_key(upload_id), chunks_key(upload_id))
+    shutil.rmtree(os.path.join(get_chunked_dir(), secure_filename(upload_id)), ignore_errors=True)
+
+class CompletedUpload:
+    """
+    A finished chunked upload, used by the transform endpoints in place of a request file.
+
+    Parameters:
+    session (dict): The upload session.
+    """
+
+    def __init__(self, session):
+        self.filename = session["filename"]
+        self.path = session["path"]
+        self.sha256 = session["sha256"]
+
+    def link_to(self, file_path):
+        """
+        Place the upload at file_path, see save_upload.
+
+        The file is hard linked so the upload can be referenced by more than one request until it
+        expires, the request folder is then removed as usual without touching the upload.
+
+        Returns:
+        str: The hex sha256 digest of the file.
+        """
+        # replace a file of the same name, as saving a request file would
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        try:
+            os.link(self.path, file_path)
+        except OSError:
+            shutil.copyfile(self.path, file_path)
+
+        if not self.sha256:
+            with open(file_path, "rb") as f:
+                self.sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+        return self.sha256
+
+def get_completed_upload(upload_id):
+    session = get_upload(upload_id)
+    if session["state"] != "COMPLETE":
+        abort(409, message=f"Upload {upload_id} has not been completed.")
+    return CompletedUpload(session)
+
+def get_request_file(files, field, config, upload_field):
+    """
+    Get the input file of a request, either sent in the request or referenced by an upload ID in the config.
+
+    Parameters:
+    files (dict): The parsed request files.
+    field (str): The files field, e.g. 'file'.
+    config (dict): The request config.
+    upload_field (str): The config field holding an upload ID, e.g. 'upload_id'.
+
+    Returns:
+    FileStorage or CompletedUpload: The input file.
+    """
+    if files.get(field) is not None:
+        return files[field]
+    if config.get(upload_field):
+        return get_completed_upload(config[upload_field])
+    abort(400, message=f"Either a '{field}' in the request or an '{upload_field}' in the config is required.")
+
+def get_request_files(files, field, config, upload_field):
+    """
+    Get the input files of a merge or append request, sent in the request and/or referenced by upload IDs in the config.
+
+    Parameters:
+    files (dict): The parsed request files.
+    field (str): The files field, e.g. 'files'.
+    config (dict): The request config.
+    upload_field (str): The config field holding a list of upload IDs, e.g. 'upload_ids'.
+
+    Returns:
+    list: The input files.
+    """
+    request_files = list(files.get(field) or []) + [get_completed_upload(upload_id) for upload_id in config.get(upload_field, [])]
+    if not request_files:
+        abort(400, message=f"Either '{field}' in the request or '{upload_field}' in the config are required.")
+    return request_files
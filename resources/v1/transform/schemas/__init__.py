@@ -1,6 +1,11 @@
-from .geojson_schema import GeoJSONSchema, GeoJSONMergeSchema, GeoJSONAppendSchema
+from .geojson_schema import GeoJSONSchema, GeoJSONMergeSchema, GeoJSONAppendSchema, GeoJSONBatchSchema
 from .shp_schema import ShapefileSchema, MultipartFormSHPFileValidator, MultipartFormSHPConfigValidator, MultipartFormSHPMergeFilesValidator
 from .gpkg_schema import GeopackageSchema, MultipartFormGPKGFileValidator, MultipartFormGPKGConfigValidator, MultipartFormGPKGMergeFilesValidator
 from .dxf_schema import DXFSchema, MultipartFormDXFFileValidator, MultipartFormDXFConfigValidator, MultipartFormDXFMergeFilesValidator, MultipartFormDXFMergeConfigValidator, MultipartFormDXFAppendConfigValidator
 from .async_schema import AsyncTaskResultSchema
-from .esrijson_schema import EsriJSONSchema, EsriJSONMergeSchema, EsriJSONAppendSchema
\ No newline at end of file
+from .esrijson_schema import EsriJSONSchema, EsriJSONMergeSchema, EsriJSONAppendSchema
+from .geoparquet_schema import GeoParquetSchema, MultipartFormGeoParquetFileValidator, MultipartFormGeoParquetConfigValidator, MultipartFormGeoParquetMergeFilesValidator
+from .flatgeobuf_schema import FlatGeobufSchema, MultipartFormFlatGeobufFileValidator, MultipartFormFlatGeobufConfigValidator, MultipartFormFlatGeobufMergeFilesValidator
+from .arrow_schema import ArrowSchema, MultipartFormArrowFileValidator, MultipartFormArrowConfigValidator, MultipartFormArrowMergeFilesValidator
+from .upload_schema import UploadCreateSchema, UploadSessionSchema
+from .geojsonseq_schema import GeoJSONSeqSchema, GeoJSONSeqConfigValidator
@@ -5,4 +5,12 @@ class AsyncTaskResultSchema(Schema):
     state = fields.Str(required=True)
     message = fields.Str(required=False)
     output_url = fields.Str(required=False)
-    error = fields.Str(required=False)
\ No newline at end of file
+    error = fields.Str(required=False)
+    # progress of a running task, counted in bytes while loading and in features afterwards
+    stage = fields.Str(required=False)
+    percent = fields.Float(required=False)
+    eta_seconds = fields.Int(required=False, allow_none=True)
+    processed_features = fields.Int(required=False)
+    total_features = fields.Int(required=False)
+    processed_bytes = fields.Int(required=False)
+    total_bytes = fields.Int(required=False)
\ No newline at end of file
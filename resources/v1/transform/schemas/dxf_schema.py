@@ -2,7 +2,7 @@ from marshmallow import Schema, fields, validates_schema, ValidationError, INCLU
 from flask_smorest.fields import Upload
 import json
 from .transformation_schema import TransformationSchema
-from .output_schema import validate_output_format, validate_output_crs
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
 from .files_schema import MultipleFilesField
 
 class DXFJsonConfig(fields.Field):
@@ -72,24 +72,29 @@ class MultipartFormDXFAppendConfigValidator(Schema):
     config = DXFAppendJsonConfig(required=True, metadata={"description":"Configuration data for the append and transformation as a JSON string"})
 
 class MultipartFormDXFFileValidator(Schema):
-    file = Upload(format="binary", required=True, metadata={"description":"A .dxf file containing all the required geopackage components"})
+    file = Upload(format="binary", required=False, metadata={"description":"A .dxf file containing all the required geopackage components"})
 
 class MultipartFormDXFMergeFilesValidator(Schema):
-    files = MultipleFilesField(required=True, metadata={"description": "A list of .dxf files."})
+    files = MultipleFilesField(required=False, metadata={"description": "A list of .dxf files."})
 
 class DXFSchema(Schema):
     output_format = fields.Str(required=True, validate=validate_output_format)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request 'file'"})
+    upload_ids = fields.List(fields.Str(), required=False, metadata={"description": "IDs of completed chunked uploads to merge or append, in addition to the request 'files'"})
+    target_upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to append to instead of the request 'file'"})
     to_file = fields.Bool(required=False, load_default=False)
     input_crs = fields.Str(required=True, metadata={"description":"The input CRS of the DXF file"}, error_messages={"required": "The input CRS is required for DXF file inputs, please specify the 'input_crs' field in your request payload."})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -98,13 +103,18 @@ class DXFMergeSchema(Schema):
     output_format = fields.Str(required=True, validate=validate_output_format)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request 'file'"})
+    upload_ids = fields.List(fields.Str(), required=False, metadata={"description": "IDs of completed chunked uploads to merge or append, in addition to the request 'files'"})
+    target_upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to append to instead of the request 'file'"})
     to_file = fields.Bool(required=False, load_default=False)
     input_crs_mapping = fields.List(fields.Str(), required=True, metadata={"description": "List of input CRS strings for the DXF files. Provide one CRS to apply to all files, or a matching number of CRS strings to the number of files."})
 
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     @validates_schema
     def validate_input_crs_mapping(self, data, **kwargs):
@@ -122,14 +132,19 @@ class DXFAppendSchema(Schema):
     output_format = fields.Str(required=True, validate=validate_output_format)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request 'file'"})
+    upload_ids = fields.List(fields.Str(), required=False, metadata={"description": "IDs of completed chunked uploads to merge or append, in addition to the request 'files'"})
+    target_upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to append to instead of the request 'file'"})
     to_file = fields.Bool(required=False, load_default=False)
     append_crs_mapping = fields.List(fields.Str(), required=True, metadata={"description": "List of input CRS strings for the DXF files. Provide one CRS to apply to all files, or a matching number of CRS strings to the number of files."})
     input_crs = fields.Str(required=True, metadata={"description":"The input CRS of the DXF file"}, error_messages={"required": "The input CRS is required for DXF file input, please specify the 'input_crs' field in your request payload."})
 
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     @validates_schema
     def validate_append_crs_mapping(self, data, **kwargs):
@@ -1,6 +1,6 @@
 from marshmallow import Schema, fields, validates_schema, ValidationError, INCLUDE
 from .transformation_schema import TransformationSchema
-from .output_schema import validate_output_format, validate_output_crs
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
 
 
 def is_valid_esrijson(data):
@@ -46,12 +46,14 @@ class EsriJSONSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
     @validates_schema
     def validate_crs(self, data, **kwargs):
         # If output_format is not "geojson", then output_crs is required
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -62,13 +64,15 @@ class EsriJSONMergeSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -80,13 +84,15 @@ class EsriJSONAppendSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
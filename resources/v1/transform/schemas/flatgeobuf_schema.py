@@ -0,0 +1,57 @@
+from marshmallow import Schema, fields, validates_schema, ValidationError, INCLUDE
+from flask_smorest.fields import Upload
+import json
+from .transformation_schema import TransformationSchema
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
+from .files_schema import MultipleFilesField
+from .input_schema import validate_read_bbox
+
+class JSONString(fields.Field):
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            flatgeobuf_data = json.loads(value)
+            errors = FlatGeobufSchema().validate(flatgeobuf_data)
+
+            if errors:
+                raise ValidationError(errors)
+            
+            if "transformations" not in flatgeobuf_data:
+                flatgeobuf_data["transformations"] = []
+                
+            if "to_file" not in flatgeobuf_data:
+                flatgeobuf_data["to_file"] = False
+
+            return flatgeobuf_data
+        except json.JSONDecodeError:
+            raise ValidationError("Invalid JSON format in 'config' field.")
+
+class MultipartFormFlatGeobufConfigValidator(Schema):
+    config = JSONString(required=True, metadata={"description":"Configuration data for the transformation as a JSON string"})
+
+class MultipartFormFlatGeobufFileValidator(Schema):
+    file = Upload(format="binary", required=False, metadata={"description":"A .fgb FlatGeobuf file"})
+
+class MultipartFormFlatGeobufMergeFilesValidator(Schema):
+    files = MultipleFilesField(required=False, metadata={"description": "A list of FlatGeobuf files"})
+
+class FlatGeobufSchema(Schema):
+    output_format = fields.Str(required=True, validate=validate_output_format)
+    transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
+    to_file = fields.Bool(required=False, load_default=False)
+    output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request 'file'"})
+    upload_ids = fields.List(fields.Str(), required=False, metadata={"description": "IDs of completed chunked uploads to merge or append, in addition to the request 'files'"})
+    target_upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to append to instead of the request 'file'"})
+    read_bbox = fields.List(fields.Float(), required=False, validate=validate_read_bbox, metadata={"description": "Only read features whose bounding box intersects [minx, miny, maxx, maxy] in EPSG:4326"})
+
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
+    # valid epsg formats are handled by pyproj, which will generate an appropriate error message
+    @validates_schema
+    def validate_crs(self, data, **kwargs):
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
+
+    class Meta:
+        unknown = INCLUDE
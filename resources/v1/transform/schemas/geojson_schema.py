@@ -1,10 +1,18 @@
-from marshmallow import Schema, fields, validates_schema, ValidationError, INCLUDE
+import os
+
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError, INCLUDE
 from .transformation_schema import TransformationSchema
-from .output_schema import validate_output_format, validate_output_crs
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
+
 
+# the most jobs a single batch request can hold
+MAX_BATCH_JOBS = int(os.getenv("MAX_BATCH_JOBS", 10000))
 
 def is_valid_geojson(data):
     required_keys = ['type', 'features']  # Basic keys for a GeoJSON object
+    # FeatureCollections in the columnar wkb encoding (msgpack and arrow bodies) carry geometries instead of features
+    if data.get('encoding') == 'wkb':
+        required_keys = ['type', 'geometry', 'properties']
     if not all(key in data for key in required_keys):
         raise ValidationError("Invalid GeoJSON format.")
             
@@ -14,13 +22,15 @@ class GeoJSONSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -31,13 +41,15 @@ class GeoJSONMergeSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -49,13 +61,21 @@ class GeoJSONAppendSchema(Schema):
     to_file = fields.Bool(required=False, load_default=False)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
+
+    class Meta:
+        unknown = INCLUDE
+
+class GeoJSONBatchSchema(Schema):
+    jobs = fields.List(fields.Nested(GeoJSONSchema), required=True, validate=validate.Length(min=1, max=MAX_BATCH_JOBS), metadata={"description": "Independent GeoJSON transform jobs, each with the same payload as /v1/transform/geojson. An application/x-ndjson body holds one job per line instead."})
 
     class Meta:
         unknown = INCLUDE
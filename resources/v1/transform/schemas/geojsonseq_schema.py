@@ -0,0 +1,46 @@
+from marshmallow import Schema, fields, validates_schema, ValidationError, INCLUDE
+import json
+from .transformation_schema import TransformationSchema
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
+from resources.v1.transform.format.encoding import CONFIG_HEADER
+
+class JSONString(fields.Field):
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            geojsonseq_data = json.loads(value)
+            errors = GeoJSONSeqSchema().validate(geojsonseq_data)
+
+            if errors:
+                raise ValidationError(errors)
+
+            if "transformations" not in geojsonseq_data:
+                geojsonseq_data["transformations"] = []
+
+            if "to_file" not in geojsonseq_data:
+                geojsonseq_data["to_file"] = False
+
+            return geojsonseq_data
+        except json.JSONDecodeError:
+            raise ValidationError(f"Invalid JSON format in the '{CONFIG_HEADER}' header.")
+
+class GeoJSONSeqConfigValidator(Schema):
+    config = JSONString(required=True, data_key=CONFIG_HEADER, metadata={"description": "Configuration data for the transformation as a JSON string"})
+
+class GeoJSONSeqSchema(Schema):
+    output_format = fields.Str(required=True, validate=validate_output_format)
+    transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
+    to_file = fields.Bool(required=False, load_default=False)
+    output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request body"})
+
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
+    # valid epsg formats are handled by pyproj, which will generate an appropriate error message
+    @validates_schema
+    def validate_crs(self, data, **kwargs):
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
+
+    class Meta:
+        unknown = INCLUDE
@@ -2,7 +2,7 @@ from marshmallow import Schema, fields, validates_schema, ValidationError, INCLU
 from flask_smorest.fields import Upload
 import json
 from .transformation_schema import TransformationSchema
-from .output_schema import validate_output_format, validate_output_crs
+from .output_schema import validate_output_format, validate_output_crs, validate_output_precision, validate_output_compression, WGS84_OUTPUT_FORMATS
 from .files_schema import MultipleFilesField
 
 class JSONString(fields.Field):
@@ -28,23 +28,28 @@ class MultipartFormGPKGConfigValidator(Schema):
     config = JSONString(required=True, metadata={"description":"Configuration data for the transformation as a JSON string"})
 
 class MultipartFormGPKGFileValidator(Schema):
-    file = Upload(format="binary", required=True, metadata={"description":"A .gpkg file containing all the required geopackage components"})
+    file = Upload(format="binary", required=False, metadata={"description":"A .gpkg file containing all the required geopackage components"})
 
 class MultipartFormGPKGMergeFilesValidator(Schema):
-    files = MultipleFilesField(required=True, metadata={"description": "A list .gpkg files"})
+    files = MultipleFilesField(required=False, metadata={"description": "A list .gpkg files"})
 
 class GeopackageSchema(Schema):
     output_format = fields.Str(required=True, validate=validate_output_format)
     transformations = fields.List(fields.Nested(TransformationSchema), required=False, load_default=[])
     to_file = fields.Bool(required=False, load_default=False)
     output_crs = fields.Str(validate=validate_output_crs)
+    output_precision = fields.Int(required=False, validate=validate_output_precision, metadata={"description": "Number of decimal places (in output CRS units) to keep in output coordinates"})
+    output_compression = fields.Str(required=False, validate=validate_output_compression, metadata={"description": "Compression codec for geoparquet (default snappy) and arrow (default none) outputs"})
+    upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to use instead of the request 'file'"})
+    upload_ids = fields.List(fields.Str(), required=False, metadata={"description": "IDs of completed chunked uploads to merge or append, in addition to the request 'files'"})
+    target_upload_id = fields.Str(required=False, metadata={"description": "ID of a completed chunked upload to append to instead of the request 'file'"})
 
-    # as long as the output format is not geojson, output_crs is required
+    # as long as the output format is not geojson or geojsonseq, output_crs is required
     # valid epsg formats are handled by pyproj, which will generate an appropriate error message
     @validates_schema
     def validate_crs(self, data, **kwargs):
-        if data['output_format'] != 'geojson' and 'output_crs' not in data:
-            raise ValidationError('output_crs is required when output_format is not geojson.')
+        if data['output_format'] not in WGS84_OUTPUT_FORMATS and 'output_crs' not in data:
+            raise ValidationError('output_crs is required when output_format is not geojson or geojsonseq.')
 
     class Meta:
         unknown = INCLUDE
@@ -0,0 +1,16 @@
+from marshmallow import ValidationError
+
+def validate_read_bbox(bbox):
+    # bbox of the features to read from a columnar input, in EPSG:4326
+    if len(bbox) != 4:
+        raise ValidationError("Invalid read_bbox. It must be a list of 4 numbers: [minx, miny, maxx, maxy] in EPSG:4326.")
+
+    minx, miny, maxx, maxy = bbox
+    if minx > maxx or miny > maxy:
+        raise ValidationError("Invalid read_bbox. minx and miny must not be greater than maxx and maxy.")
+    if minx < -180 or maxx > 180 or miny < -90 or maxy > 90:
+        raise ValidationError("Invalid read_bbox. Coordinates must be longitude/latitude in EPSG:4326.")
+
+def validate_row_groups(row_groups):
+    if any(row_group < 0 for row_group in row_groups):
+        raise ValidationError("Invalid row_groups. Row group indexes must not be negative.")
@@ -1,10 +1,24 @@
 from marshmallow import ValidationError
 
+# output formats that are always written in EPSG:4326, they do not need an output_crs
+WGS84_OUTPUT_FORMATS = ('geojson', 'geojsonseq')
+
 def validate_output_format(format):
-    valid_formats = ['geojson', 'shp', 'gpkg', 'dxf', 'csv', 'esrijson']
+    valid_formats = ['geojson', 'geojsonseq', 'shp', 'gpkg', 'dxf', 'csv', 'esrijson', 'geoparquet', 'flatgeobuf', 'arrow', 'msgpack']
     if format not in valid_formats:
         raise ValidationError(f"Invalid output format. Supported formats are: {', '.join(valid_formats)}.")
 
+def validate_output_precision(precision):
+    # number of decimal places kept in output CRS units, beyond 15 a float64 carries no extra digits
+    if precision < 0 or precision > 15:
+        raise ValidationError("Invalid output precision. It must be a number of decimal places between 0 and 15.")
+
+def validate_output_compression(compression):
+    # codecs for the columnar formats, whether the chosen output format supports it is checked when writing
+    valid_compressions = ['none', 'snappy', 'gzip', 'brotli', 'lz4', 'zstd']
+    if compression not in valid_compressions:
+        raise ValidationError(f"Invalid output compression. Supported values are: {', '.join(valid_compressions)}.")
+
 def validate_output_crs(crs):
     # NOTE in here you can add in specific validation rules around what CRS you want to enforce as outputs
     pass
\ No newline at end of file
@@ -4,12 +4,14 @@ from ..transformations.validators.clip_validator import validate_clip_request
 from ..transformations.validators.erase_validator import validate_erase_request
 from ..transformations.validators.dissolve_validator import validate_dissolve_request
 from ..transformations.validators.union_validator import validate_union_request
+from ..transformations.validators.make_valid_validator import validate_make_valid_request
+from ..transformations.validators.simplify_validator import validate_simplify_request
 from marshmallow import ValidationError
 
 
 class TransformationSchema(Schema):
     type = fields.Str(
-        required=True, validate=validate.OneOf(["buffer", "clip", "erase", "dissolve", "union"])
+        required=True, validate=validate.OneOf(["buffer", "clip", "erase", "dissolve", "union", "make_valid", "simplify"])
     )
     distance = fields.Float(required=False)
     units = fields.Str(required=False)
@@ -17,6 +19,8 @@ class TransformationSchema(Schema):
     clipping_geojson = fields.Dict(required=False)
     erasing_geojson = fields.Dict(required=False)
     by = fields.List(fields.Str(), required=False)
+    tolerance = fields.Float(required=False)
+    method = fields.Str(required=False)
 
     @validates_schema
     def check_required_fields(self, data, **kwargs):
@@ -31,5 +35,9 @@ class TransformationSchema(Schema):
                 validate_dissolve_request(data)
             case "union":
                 validate_union_request(data)
+            case "make_valid":
+                validate_make_valid_request(data)
+            case "simplify":
+                validate_simplify_request(data)
             case _:
                 raise ValidationError("Invalid transformation type.")
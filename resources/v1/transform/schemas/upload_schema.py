@@ -0,0 +1,18 @@
+from marshmallow import Schema, fields, validate
+
+class UploadCreateSchema(Schema):
+    filename = fields.Str(required=True, metadata={"description": "The name of the file being uploaded, its extension must match the endpoint it is used with"})
+    size = fields.Int(required=True, validate=validate.Range(min=1), metadata={"description": "The total size of the file in bytes"})
+    chunk_size = fields.Int(required=False, metadata={"description": "The size of every chunk but the last in bytes, defaults to 16 MiB"})
+    sha256 = fields.Str(required=False, validate=validate.Regexp(r"^[0-9a-fA-F]{64}$"), metadata={"description": "Hex sha256 of the whole file, verified when the upload is completed"})
+
+class UploadSessionSchema(Schema):
+    upload_id = fields.Str(required=True)
+    filename = fields.Str(required=True)
+    size = fields.Int(required=True)
+    chunk_size = fields.Int(required=True)
+    chunk_count = fields.Int(required=True)
+    state = fields.Str(required=True)
+    received_chunks = fields.Int(required=True)
+    missing_chunks = fields.List(fields.Int(), required=True)
+    expires_in = fields.Int(required=False)
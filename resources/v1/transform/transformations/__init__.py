@@ -1,13 +1,19 @@
-from .buffer import apply_buffer
-from .clip import apply_clip
-from .dissolve import apply_dissolve
+from .buffer import apply_buffer, BUFFER_UNIT_FACTORS, METERS_PER_DEGREE
+from .clip import apply_clip, get_clip_filter, get_filter_bbox, get_read_filter
+from .dissolve import apply_dissolve, dissolve_partition, merge_dissolved
 from .erase import apply_erase
-from .union import apply_union
+from .union import apply_union, split_union_boundary, merge_union_boundaries
+from .simplify import apply_simplify, SIMPLIFY_METHODS
+from .masks import load_mask
+from .validity import repair_geometries
+from .geometry_metadata import GeometryMetadata, get_geometry_metadata, invalidate_geometry_metadata
 from .operations import merge_geodataframes, append_geodataframes
-from .manager import apply_transformations, UnsupportedTransformationError
+from .manager import apply_transformations, UnsupportedTransformationError, FEATURE_TRANSFORMATIONS, GLOBAL_TRANSFORMATIONS, is_feature_transformation
 
 from .validators.buffer_validator import validate_buffer_request
 from .validators.clip_validator import validate_clip_request
 from .validators.erase_validator import validate_erase_request
 from .validators.dissolve_validator import validate_dissolve_request
-from .validators.union_validator import validate_union_request
\ No newline at end of file
+from .validators.union_validator import validate_union_request
+from .validators.make_valid_validator import validate_make_valid_request
+from .validators.simplify_validator import validate_simplify_request
\ No newline at end of file
@@ -2,13 +2,27 @@ import geopandas as gpd
 import pyproj
 from shapely.geometry import box
 
-def get_utm_crs(geometry):
+from .geometry_metadata import get_geometry_metadata
+
+# meters per unit of the buffer distance
+BUFFER_UNIT_FACTORS = {
+    'meters': 1,
+    'kilometers': 1000,
+    'miles': 1609.34,
+    'feet': 0.3048
+}
+
+# meters per degree of latitude, used to convert distances in geographic CRS
+METERS_PER_DEGREE = 111320
+
+def get_utm_crs(bounds):
     """
-    Determine the appropriate UTM CRS for a given geometry.
+    Determine the appropriate UTM CRS for the centre of the given (minx, miny, maxx, maxy) bounds.
     """
-    centroid = geometry.centroid
-    utm_zone = int((centroid.x + 180) // 6) + 1
-    hemisphere = 'north' if centroid.y >= 0 else 'south'
+    x = (bounds[0] + bounds[2]) / 2
+    y = (bounds[1] + bounds[3]) / 2
+    utm_zone = int((x + 180) // 6) + 1
+    hemisphere = 'north' if y >= 0 else 'south'
     return f"EPSG:326{utm_zone}" if hemisphere == 'north' else f"EPSG:327{utm_zone}"
 
 def apply_buffer(input_gdf, distance, units, simplify_tolerance=None):
@@ -18,17 +32,10 @@ def apply_buffer(input_gdf, distance, units, simplify_tolerance=None):
     and optionally simplifying the resulting buffered geometries.
     """
     # Convert distance to meters based on input units
-    unit_factors = {
-        'meters': 1,
-        'kilometers': 1000,
-        'miles': 1609.34,
-        'feet': 0.3048
-    }
-
-    if units not in unit_factors:
+    if units not in BUFFER_UNIT_FACTORS:
         raise ValueError(f"Unsupported unit: {units}. Supported units are meters, kilometers, miles, feet.")
 
-    distance_in_meters = distance * unit_factors[units]
+    distance_in_meters = distance * BUFFER_UNIT_FACTORS[units]
 
     # Dynamically set simplify_tolerance if not provided
     if simplify_tolerance is None:
@@ -38,7 +45,8 @@ def apply_buffer(input_gdf, distance, units, simplify_tolerance=None):
     original_crs = input_gdf.crs
     if original_crs and pyproj.CRS(original_crs).is_geographic:
         # Reproject to the most suitable UTM zone
-        utm_crs = get_utm_crs(input_gdf.unary_union)
+        # the bounds are shared with the other stages, a union of the geometries is not needed to pick the zone
+        utm_crs = get_utm_crs(get_geometry_metadata(input_gdf).total_bounds)
         input_gdf = input_gdf.to_crs(utm_crs)
 
     # Apply buffer transformation in meters
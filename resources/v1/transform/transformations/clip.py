@@ -1,4 +1,8 @@
 import geopandas as gpd
+from pyproj import CRS, Transformer
+from shapely.geometry import box
+
+from .masks import load_mask
 
 def apply_clip(input_gdf, clipping_gdf):
     """
@@ -7,10 +11,88 @@ def apply_clip(input_gdf, clipping_gdf):
     Parameters:
     input_gdf (gpd.GeoDataFrame): Input geodataframe.
     clipping_gdf (gpd.GeoDataFrame): Clipping geodataframe.
-    
+
     Returns:
     gpd.GeoDataFrame: GeoDataFrame with geometry clipped by the clipping geodataframe.
     """
+    # Ensure both GeoDataFrames are in the same CRS
+    if input_gdf.crs is not None and input_gdf.crs != clipping_gdf.crs:
+        clipping_gdf = clipping_gdf.to_crs(input_gdf.crs)
+
     clipped_gdf = gpd.clip(input_gdf, clipping_gdf)
 
-    return gpd.GeoDataFrame(clipped_gdf, crs=clipped_gdf.crs)
\ No newline at end of file
+    return gpd.GeoDataFrame(clipped_gdf, crs=clipped_gdf.crs)
+
+def get_clip_filter(transformations):
+    """
+    Return the clipping GeoDataFrame when the first transformation is a clip.
+
+    Features that do not intersect the clip mask are discarded by the clip anyway, so
+    readers can use the mask as a spatial filter and skip decoding them entirely.
+
+    Parameters:
+    transformations (list): The transformations from the request payload.
+
+    Returns:
+    gpd.GeoDataFrame or None: The clipping geodataframe in EPSG:4326, or None if the
+    first transformation is not a clip.
+    """
+    if not transformations or transformations[0]["type"] != "clip":
+        return None
+
+    clipping_gdf = load_mask(transformations[0]["clipping_geojson"])
+    if clipping_gdf.empty:
+        return None
+
+    return clipping_gdf
+
+def get_filter_bbox(clipping_gdf, crs):
+    """
+    Get the bounds of a clipping GeoDataFrame in the CRS of the data being read.
+
+    The bounds are densified while reprojecting so that edges which curve in the target
+    CRS still fall inside the returned box.
+
+    Parameters:
+    clipping_gdf (gpd.GeoDataFrame): Clipping geodataframe, or None.
+    crs: The CRS of the data being read, or None if it is unknown.
+
+    Returns:
+    tuple or None: (minx, miny, maxx, maxy) in the target CRS, or None if no filter applies.
+    """
+    if clipping_gdf is None or crs is None:
+        return None
+
+    target_crs = CRS.from_user_input(crs)
+    bounds = clipping_gdf.total_bounds
+    if target_crs == clipping_gdf.crs:
+        return tuple(bounds)
+
+    transformer = Transformer.from_crs(clipping_gdf.crs, target_crs, always_xy=True)
+    return transformer.transform_bounds(*bounds, densify_pts=21)
+
+def get_read_filter(clipping_gdf, read_bbox=None):
+    """
+    Combine the clip filter with a bbox requested in the reader config.
+
+    Features outside the requested bbox are not read at all, so when there is also a clip
+    mask the reader only needs the overlap of the two. When they do not overlap the bbox
+    alone is used, the clip then removes whatever was read.
+
+    Parameters:
+    clipping_gdf (gpd.GeoDataFrame): The clip filter from get_clip_filter, or None.
+    read_bbox (list, optional): [minx, miny, maxx, maxy] in EPSG:4326.
+
+    Returns:
+    gpd.GeoDataFrame or None: The area to read in EPSG:4326, or None if the whole input is read.
+    """
+    if read_bbox is None:
+        return clipping_gdf
+
+    area = box(*read_bbox)
+    if clipping_gdf is not None:
+        overlap = area.intersection(box(*clipping_gdf.to_crs("EPSG:4326").total_bounds))
+        if not overlap.is_empty:
+            area = overlap
+
+    return gpd.GeoDataFrame(geometry=[area], crs="EPSG:4326")
@@ -1,3 +1,4 @@
+import pandas as pd
 import geopandas as gpd
 
 
@@ -15,7 +16,56 @@ def apply_dissolve(input_gdf, by):
 
     print(by)
     # Perform the dissolve operation
-    dissolved_gdf = input_gdf.dissolve(by=by)
+    # only groups that have features, a categorical group column also lists the categories a clip removed
+    dissolved_gdf = input_gdf.dissolve(by=by, observed=True)
     
     # Return the result GeoDataFrame
     return gpd.GeoDataFrame(dissolved_gdf, crs=input_gdf.crs)
+
+def dissolve_partition(input_gdf, by, order_column):
+    """
+    Dissolve one part of an input, see merge_dissolved.
+
+    dissolve keeps the first value of each attribute in a group that is not missing, in input
+    order. Besides the dissolved geometry of each group, the part keeps the rows holding the
+    first value of one of its attributes, so the merge finds the same values as a dissolve of
+    the whole input.
+
+    Parameters:
+    input_gdf (GeoDataFrame): The features of the part.
+    by (str or list): Column or list of columns to group by.
+    order_column (str): The column holding the position of each feature in the input.
+
+    Returns:
+    GeoDataFrame: The rows to merge, the dissolved geometry of each group is on its first row.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    gdf = input_gdf.sort_values(order_column, kind="stable")
+    geometry = gdf.geometry.name
+
+    first_rows = gdf.groupby(by, observed=True, sort=False).head(1).index
+    keep = first_rows
+    for column in gdf.columns.difference([*by, geometry, order_column]):
+        keep = keep.union(gdf[gdf[column].notna()].groupby(by, observed=True, sort=False).head(1).index)
+
+    dissolved = gdf[[*by, geometry]].dissolve(by=by, observed=True, as_index=False)
+    partition_gdf = gdf[gdf.index.isin(keep)].copy()
+    partition_gdf[geometry] = None
+    partition_gdf.loc[first_rows, geometry] = gdf.loc[first_rows, by].merge(dissolved, on=by, how="left")[geometry].to_numpy()
+    return partition_gdf
+
+def merge_dissolved(partition_gdfs, by, order_column):
+    """
+    Dissolve the results of dissolve_partition for separate parts of an input into one.
+
+    Parameters:
+    partition_gdfs (list): The GeoDataFrames from dissolve_partition.
+    by (str or list): Column or list of columns to group by.
+    order_column (str): The column holding the position of each feature in the input, dropped from the result.
+
+    Returns:
+    GeoDataFrame: The dissolved geometries of the whole input.
+    """
+    merged_gdf = pd.concat(partition_gdfs, ignore_index=True).sort_values(order_column, kind="stable")
+    merged_gdf = gpd.GeoDataFrame(merged_gdf, geometry=partition_gdfs[0].geometry.name, crs=partition_gdfs[0].crs)
+    return apply_dissolve(merged_gdf, by).drop(columns=order_column)
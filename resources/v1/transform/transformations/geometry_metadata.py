@@ -0,0 +1,110 @@
+import threading
+import weakref
+from functools import cached_property
+
+import numpy as np
+import shapely
+
+# shapely geometry type ids
+POINT_TYPE_IDS = (0, 4)
+LINE_TYPE_IDS = (1, 5)
+POLYGON_TYPE_IDS = (3, 6)
+COLLECTION_TYPE_ID = 7
+
+GEOMETRY_TYPE_NAMES = {
+    0: "Point",
+    1: "LineString",
+    2: "LinearRing",
+    3: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+    7: "GeometryCollection",
+}
+
+metadata_cache = {}
+metadata_cache_lock = threading.Lock()
+
+class GeometryMetadata:
+    """
+    Properties of the geometries of a GeoDataFrame, each computed for all of them at once on first use.
+
+    The transformations and writers ask for the same properties of the same geometries (types
+    before a union or a shapefile, bounds before a buffer, validity before an overlay), through
+    get_geometry_metadata they share one computation for as long as the geometries are unchanged.
+
+    Parameters:
+    geometries (ndarray): The shapely geometries.
+    """
+
+    def __init__(self, geometries):
+        self.geometries = geometries
+
+    @cached_property
+    def type_ids(self):
+        """The shapely type id of each geometry, -1 for missing geometries."""
+        return shapely.get_type_id(self.geometries)
+
+    @cached_property
+    def bounds(self):
+        """(minx, miny, maxx, maxy) of each geometry, nan for missing and empty geometries."""
+        return shapely.bounds(self.geometries)
+
+    @cached_property
+    def total_bounds(self):
+        """(minx, miny, maxx, maxy) of all the geometries, nan when none has coordinates."""
+        if np.isnan(self.bounds).all():
+            return np.full(4, np.nan)
+        return np.array([
+            np.nanmin(self.bounds[:, 0]), np.nanmin(self.bounds[:, 1]),
+            np.nanmax(self.bounds[:, 2]), np.nanmax(self.bounds[:, 3]),
+        ])
+
+    @cached_property
+    def is_valid(self):
+        """Whether each geometry is valid, missing geometries count as valid."""
+        return shapely.is_valid(self.geometries) | shapely.is_missing(self.geometries)
+
+    @cached_property
+    def vertex_counts(self):
+        """The number of coordinates of each geometry, 0 for missing geometries."""
+        return shapely.get_num_coordinates(self.geometries)
+
+    def has_only(self, type_ids):
+        """Whether every geometry has one of the type ids, False for a missing geometry."""
+        return bool(np.isin(self.type_ids, type_ids).all())
+
+    def type_mask(self, type_ids):
+        """Boolean mask of the geometries with one of the type ids."""
+        return np.isin(self.type_ids, type_ids)
+
+def get_geometry_metadata(gdf):
+    """
+    Return the GeometryMetadata of the geometries of a GeoDataFrame or GeoSeries.
+
+    The metadata is cached per geometry array and dropped once the array is garbage collected.
+    pandas gives a frame a new geometry array when its geometry column is assigned or rows are
+    selected, so those get new metadata. Geometries written in place (gdf.loc[...] = geometry)
+    keep the array, so code doing that must call invalidate_geometry_metadata afterwards.
+
+    Parameters:
+    gdf (GeoDataFrame or GeoSeries): The geometries.
+
+    Returns:
+    GeometryMetadata: The shared metadata.
+    """
+    array = gdf.geometry.values
+    key = id(array)
+    with metadata_cache_lock:
+        metadata = metadata_cache.get(key)
+        if metadata is None:
+            # the metadata holds the geometries but not the array, so it does not keep the array alive
+            metadata = GeometryMetadata(np.asarray(array))
+            metadata_cache[key] = metadata
+            weakref.finalize(array, metadata_cache.pop, key, None)
+    return metadata
+
+def invalidate_geometry_metadata(gdf):
+    """Drop the cached metadata of geometries that were modified in place."""
+    with metadata_cache_lock:
+        metadata_cache.pop(id(gdf.geometry.values), None)
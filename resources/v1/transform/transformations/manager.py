@@ -3,8 +3,11 @@ from .clip import apply_clip
 from .erase import apply_erase
 from .dissolve import apply_dissolve
 from .union import apply_union
-import geopandas as gpd
+from .masks import load_mask
+from .simplify import apply_simplify, DEFAULT_SIMPLIFY_METHOD
+from .validity import repair_geometries, AUTO_REPAIR_GEOMETRIES, OVERLAY_TRANSFORMATIONS
 from utils.logger import get_logger
+from utils.instrumentation import measure
 
 logger = get_logger(__name__)
 
@@ -18,59 +21,112 @@ class UnsupportedTransformationError(Exception):
         super().__init__(f"{message}: {transformation_type}")
 
 
+# transformations that work feature by feature, so any subset of the features can be transformed on its own
+FEATURE_TRANSFORMATIONS = ("buffer", "clip", "erase", "make_valid", "simplify")
+
+# transformations whose result depends on all of the features at once
+GLOBAL_TRANSFORMATIONS = ("dissolve", "union")
+
+def is_feature_transformation(transform):
+    """Whether a transformation from the request works feature by feature, see FEATURE_TRANSFORMATIONS."""
+    if transform["type"] == "simplify":
+        # the coverage mode simplifies the edges that polygons share together
+        return transform.get("method", DEFAULT_SIMPLIFY_METHOD) != "coverage"
+    return transform["type"] in FEATURE_TRANSFORMATIONS
+
+
 # apply all transformations, the output of each transformation is the input to the next
 # TODO: units consumed should be calculated based on the transformations applied
 # TODO: this should be refactored to be more modular and extensible
-def apply_transformations(gdf, request_data: dict):
-    """Apply transformations to a GeoDataFrame based on the request data."""
+def apply_transformations(gdf, request_data: dict, instrumentation=None, start_step=0, on_step=None, progress=None):
+    """
+    Apply transformations to a GeoDataFrame based on the request data.
+
+    When an Instrumentation is given each transformation is measured as its own stage.
+    start_step skips the transformations that were already applied to gdf, and on_step is
+    called as on_step(step, gdf, transformations_applied) after each transformation, where
+    step counts the transformations applied so far including the skipped ones.
+    When a TaskProgress is given each transformation is reported as its own progress stage,
+    it raises from there to stop a cancelled request.
+    Invalid geometries are repaired before the first overlay transformation (see
+    repair_geometries), the number repaired is added to its record as 'geometries_repaired'.
+    """
     transformations_applied = []
     output_gdf = gdf
-    for transform in request_data["transformations"]:
-        match transform["type"]:
-            case "buffer":
-                distance = transform["distance"]
-                units = transform["units"]
-
-                try:
-                    simplify_tolerance = transform["simplify_tolerance"]
-                except KeyError:
-                    # setting this to none will use the default value in apply_buffer
-                    # of 3% of the buffer distance
-                    simplify_tolerance = None
-
-                output_gdf = apply_buffer(output_gdf, distance, units, simplify_tolerance=simplify_tolerance)
-
-                # calculate units consumed for buffers
-                transformations_applied.append("buffer")
-            case "clip":
-                clipping_gdf = gpd.GeoDataFrame.from_features(
-                    transform["clipping_geojson"], crs="EPSG:4326"
-                )
-                output_gdf = apply_clip(output_gdf, clipping_gdf)
-
-                # calculate units consumed for clips
-                transformations_applied.append("clip")
-            case "erase":
-                erasing_gdf = gpd.GeoDataFrame.from_features(
-                    transform["erasing_geojson"], crs="EPSG:4326"
-                )
-                output_gdf = apply_erase(output_gdf, erasing_gdf)
-
-                # calculate units consumed for clips
-                transformations_applied.append("erase")
-            case "dissolve":
-                by = transform["by"]
-                output_gdf = apply_dissolve(output_gdf, by)
-
-                # calculate units consumed for dissolve
-                transformations_applied.append("dissolve")
-            case "union":
-                output_gdf = apply_union(output_gdf)
-
-                # calculate units consumed for dissolve
-                transformations_applied.append("union")
-            case _:
-                logger.error(f"Unsupported transformation type: {transform['type']}")
-                raise UnsupportedTransformationError(transform["type"])
+    # the overlays return valid geometries, so the input only needs checking once
+    validated = False
+    for step, transform in enumerate(request_data["transformations"][start_step:], start=start_step + 1):
+        if progress is not None:
+            progress.start(f"transform.{transform['type']}", f"Applying {transform['type']}", len(output_gdf))
+
+        with measure(instrumentation, f"transform.{transform['type']}", len(output_gdf)) as record:
+            if AUTO_REPAIR_GEOMETRIES and not validated and transform["type"] in OVERLAY_TRANSFORMATIONS:
+                output_gdf, record["geometries_repaired"] = repair_geometries(output_gdf)
+                validated = True
+
+            match transform["type"]:
+                case "buffer":
+                    distance = transform["distance"]
+                    units = transform["units"]
+
+                    try:
+                        simplify_tolerance = transform["simplify_tolerance"]
+                    except KeyError:
+                        # setting this to none will use the default value in apply_buffer
+                        # of 3% of the buffer distance
+                        simplify_tolerance = None
+
+                    output_gdf = apply_buffer(output_gdf, distance, units, simplify_tolerance=simplify_tolerance)
+
+                    # calculate units consumed for buffers
+                    transformations_applied.append("buffer")
+                case "clip":
+                    clipping_gdf = load_mask(transform["clipping_geojson"], output_gdf.crs)
+                    output_gdf = apply_clip(output_gdf, clipping_gdf)
+
+                    # calculate units consumed for clips
+                    transformations_applied.append("clip")
+                case "erase":
+                    erasing_gdf = load_mask(transform["erasing_geojson"], output_gdf.crs)
+                    output_gdf = apply_erase(output_gdf, erasing_gdf)
+
+                    # calculate units consumed for clips
+                    transformations_applied.append("erase")
+                case "dissolve":
+                    by = transform["by"]
+                    output_gdf = apply_dissolve(output_gdf, by)
+
+                    # calculate units consumed for dissolve
+                    transformations_applied.append("dissolve")
+                case "union":
+                    output_gdf = apply_union(output_gdf, on_progress=progress.update if progress is not None else None)
+
+                    # calculate units consumed for dissolve
+                    transformations_applied.append("union")
+                case "simplify":
+                    output_gdf, record["vertices_in"], record["vertices_out"] = apply_simplify(
+                        output_gdf,
+                        transform["tolerance"],
+                        transform.get("units", "meters"),
+                        transform.get("method", DEFAULT_SIMPLIFY_METHOD),
+                        on_progress=progress.update if progress is not None else None,
+                    )
+                    # douglas_peucker may return self intersecting polygons
+                    validated = validated and transform.get("method", DEFAULT_SIMPLIFY_METHOD) != "douglas_peucker"
+
+                    transformations_applied.append("simplify")
+                case "make_valid":
+                    output_gdf, record["geometries_repaired"] = repair_geometries(output_gdf)
+                    validated = True
+
+                    transformations_applied.append("make_valid")
+                case _:
+                    logger.error(f"Unsupported transformation type: {transform['type']}")
+                    raise UnsupportedTransformationError(transform["type"])
+
+            record["features_out"] = len(output_gdf)
+
+        if on_step is not None:
+            on_step(step, output_gdf, transformations_applied)
 
     return output_gdf, transformations_applied
@@ -0,0 +1,50 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import geopandas as gpd
+
+from .validity import repair_geometries, AUTO_REPAIR_GEOMETRIES
+
+# number of clip and erase masks kept converted, per crs they were requested in
+MASK_CACHE_SIZE = int(os.getenv("MASK_CACHE_SIZE", 32))
+
+mask_cache = OrderedDict()
+mask_cache_lock = threading.Lock()
+
+def load_mask(geojson, crs=None):
+    """
+    Convert the geojson of a clip or erase mask into a GeoDataFrame, reusing a previous conversion.
+
+    The jobs of a batch, and repeated requests handled by the same worker, often share a mask,
+    so masks are cached by the hash of their geojson. The cached GeoDataFrames are shared and
+    must not be modified.
+
+    Parameters:
+    geojson (dict): The mask FeatureCollection in EPSG:4326.
+    crs (optional): The crs to return the mask in, EPSG:4326 when None.
+
+    Returns:
+    GeoDataFrame: The mask.
+    """
+    digest = hashlib.sha256(json.dumps(geojson, sort_keys=True).encode("utf-8")).hexdigest()
+    key = (digest, str(crs) if crs is not None else None)
+    with mask_cache_lock:
+        if key in mask_cache:
+            mask_cache.move_to_end(key)
+            return mask_cache[key]
+
+    mask_gdf = gpd.GeoDataFrame.from_features(geojson, crs="EPSG:4326")
+    if AUTO_REPAIR_GEOMETRIES:
+        # an invalid mask breaks the clip or erase as much as an invalid input
+        mask_gdf, _ = repair_geometries(mask_gdf)
+    if crs is not None and not mask_gdf.empty:
+        mask_gdf = mask_gdf.to_crs(crs)
+
+    with mask_cache_lock:
+        mask_cache[key] = mask_gdf
+        while len(mask_cache) > MASK_CACHE_SIZE:
+            mask_cache.popitem(last=False)
+    return mask_gdf
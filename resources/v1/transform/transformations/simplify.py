@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyproj
+import shapely
+
+from .buffer import BUFFER_UNIT_FACTORS, METERS_PER_DEGREE
+from .geometry_metadata import get_geometry_metadata, POLYGON_TYPE_IDS
+
+# simplify methods, douglas_peucker may return invalid or empty geometries but is the fastest
+SIMPLIFY_METHODS = ("preserve_topology", "douglas_peucker", "coverage")
+DEFAULT_SIMPLIFY_METHOD = "preserve_topology"
+
+# geometries are simplified in chunks of this many features on SIMPLIFY_WORKERS threads, GEOS releases the GIL
+SIMPLIFY_CHUNK_SIZE = int(os.getenv("SIMPLIFY_CHUNK_SIZE", 10000))
+SIMPLIFY_WORKERS = int(os.getenv("SIMPLIFY_WORKERS", min(4, os.cpu_count() or 1)))
+
+def get_crs_tolerance(tolerance, units, crs):
+    """
+    Convert a tolerance in real units to the units of a CRS.
+
+    Geographic coordinates are not reprojected, the tolerance is converted at the length of a
+    degree of latitude. A degree of longitude is never longer, so the simplified lines stay
+    within the tolerance of the original ones.
+
+    Parameters:
+    tolerance (float): The tolerance in units.
+    units (str): One of BUFFER_UNIT_FACTORS.
+    crs: The CRS of the geometries, a CRS without units is taken to be in meters.
+
+    Returns:
+    float: The tolerance in CRS units.
+    """
+    meters = tolerance * BUFFER_UNIT_FACTORS[units]
+    if crs is None:
+        return meters
+
+    crs = pyproj.CRS.from_user_input(crs)
+    if crs.is_geographic:
+        return meters / METERS_PER_DEGREE
+    return meters / crs.axis_info[0].unit_conversion_factor
+
+def simplify_chunks(geometries, tolerance, preserve_topology, on_progress=None):
+    """Simplify geometries in chunks of SIMPLIFY_CHUNK_SIZE on a thread pool, in their original order."""
+    chunks = [geometries[start:start + SIMPLIFY_CHUNK_SIZE] for start in range(0, len(geometries), SIMPLIFY_CHUNK_SIZE)]
+    if len(chunks) <= 1 or SIMPLIFY_WORKERS <= 1:
+        return shapely.simplify(geometries, tolerance, preserve_topology=preserve_topology)
+
+    results = []
+    executor = ThreadPoolExecutor(max_workers=SIMPLIFY_WORKERS)
+    try:
+        for done, result in enumerate(executor.map(lambda chunk: shapely.simplify(chunk, tolerance, preserve_topology=preserve_topology), chunks), start=1):
+            results.append(result)
+            if on_progress is not None:
+                on_progress(min(done * SIMPLIFY_CHUNK_SIZE, len(geometries)), len(geometries))
+    finally:
+        # a cancelled request does not simplify the remaining chunks
+        executor.shutdown(wait=True, cancel_futures=True)
+    return np.concatenate(results)
+
+def apply_simplify(input_gdf, tolerance, units="meters", method=DEFAULT_SIMPLIFY_METHOD, on_progress=None):
+    """
+    Simplify the geometries of a GeoDataFrame, removing vertices within tolerance of the simplified lines.
+
+    preserve_topology and douglas_peucker use the Douglas-Peucker algorithm, preserve_topology
+    keeps every geometry valid and non empty. coverage simplifies the polygons together as a
+    coverage, with Visvalingam-Whyatt on the edges they share, so polygons that share an edge
+    keep sharing it. tolerance is then about the square root of the area of the triangles
+    removed. The polygons must not overlap, other geometries are simplified with
+    preserve_topology in that mode.
+
+    Parameters:
+    input_gdf (GeoDataFrame): The input GeoDataFrame.
+    tolerance (float): The tolerance in units.
+    units (str, optional): One of BUFFER_UNIT_FACTORS.
+    method (str, optional): One of SIMPLIFY_METHODS.
+    on_progress (callable, optional): Called with the number of simplified and total features, may raise to stop the simplify.
+
+    Returns:
+    tuple: (GeoDataFrame, vertices_in, vertices_out)
+
+    Raises:
+    ValueError: If the method is coverage and the polygons overlap or their shared edges do not match.
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f"Unsupported simplify method: {method}. Supported methods are {', '.join(SIMPLIFY_METHODS)}.")
+
+    metadata = get_geometry_metadata(input_gdf)
+    geometries = metadata.geometries
+    crs_tolerance = get_crs_tolerance(tolerance, units, input_gdf.crs)
+
+    if method == "coverage":
+        simplified = geometries.copy()
+        polygons = metadata.type_mask(POLYGON_TYPE_IDS)
+        # the polygons are simplified together so shared edges are simplified the same way
+        if not shapely.coverage_is_valid(geometries[polygons]):
+            raise ValueError("Polygons must not overlap and must share matching edges to apply coverage simplify.")
+        if polygons.any():
+            simplified[polygons] = shapely.coverage_simplify(geometries[polygons], crs_tolerance)
+        if (~polygons).any():
+            simplified[~polygons] = shapely.simplify(geometries[~polygons], crs_tolerance, preserve_topology=True)
+    else:
+        simplified = simplify_chunks(geometries, crs_tolerance, method == "preserve_topology", on_progress)
+
+    output_gdf = input_gdf.copy()
+    output_gdf[output_gdf.geometry.name] = simplified
+    if method == "douglas_peucker":
+        # polygons narrower than the tolerance collapse completely
+        output_gdf = output_gdf[~shapely.is_empty(simplified)]
+
+    vertices_in = int(metadata.vertex_counts.sum())
+    vertices_out = int(get_geometry_metadata(output_gdf).vertex_counts.sum())
+    return output_gdf, vertices_in, vertices_out
@@ -1,14 +1,19 @@
+import numpy as np
+import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Polygon, MultiPolygon
+from shapely.geometry import box
 from shapely.ops import unary_union, polygonize
 
-def apply_union(input_gdf):
+from .geometry_metadata import get_geometry_metadata, POLYGON_TYPE_IDS
+
+def apply_union(input_gdf, on_progress=None):
     """
     Apply a union operation to combine overlapping geometries in the input GeoDataFrame into single geometries
     while preserving non-overlapping geometries. Ensures that all geometries are polygons before applying the union.
 
     Parameters:
     input_gdf (GeoDataFrame): The input GeoDataFrame containing geometries to be unioned.
+    on_progress (callable, optional): Called with the number of processed and total unioned polygons, may raise to stop the union.
 
     Returns:
     GeoDataFrame: A new GeoDataFrame with geometries unioned where they overlap, preserving attribute data.
@@ -17,7 +22,7 @@ def apply_union(input_gdf):
     ValueError: If any geometry in the input GeoDataFrame is not a polygon.
     """
     # Check if all geometries are polygons or multipolygons
-    if not all(isinstance(geom, (Polygon, MultiPolygon)) for geom in input_gdf.geometry):
+    if not get_geometry_metadata(input_gdf).has_only(POLYGON_TYPE_IDS):
         raise ValueError("All geometries must be polygons or multipolygons to apply union.")
     
     # Perform the union operation on all geometries
@@ -30,17 +35,21 @@ def apply_union(input_gdf):
     result_rows = []
 
     # For each polygon, find which input geometries it intersects with and merge their attributes
-    for poly in unioned_polygons:
+    for i, poly in enumerate(unioned_polygons):
+        if on_progress is not None:
+            on_progress(i, len(unioned_polygons))
+
         intersecting_rows = input_gdf[input_gdf.geometry.intersects(poly)]
         
         # Aggregate attributes (example: concatenate strings and sum numbers)
         aggregated_attributes = {}
         for column in intersecting_rows.columns:
             if column != 'geometry':
-                if intersecting_rows[column].dtype == 'object':
-                    aggregated_attributes[column] = ', '.join(intersecting_rows[column].astype(str).unique())
-                else:
+                if pd.api.types.is_numeric_dtype(intersecting_rows[column].dtype):
                     aggregated_attributes[column] = intersecting_rows[column].sum()
+                else:
+                    # strings, including categorical and arrow backed ones, are joined rather than summed
+                    aggregated_attributes[column] = ', '.join(intersecting_rows[column].astype(str).unique())
         
         # Append the new polygon and its attributes to the result list
         result_rows.append({**aggregated_attributes, 'geometry': poly})
@@ -49,3 +58,50 @@ def apply_union(input_gdf):
     unioned_gdf = gpd.GeoDataFrame(result_rows, columns=input_gdf.columns, crs=input_gdf.crs)
     
     return unioned_gdf
+
+def split_union_boundary(unioned_gdf, input_gdf, tile_bounds, neighbours_gdf=None):
+    """
+    Split the union of the features of one tile into final pieces and the features still to union.
+
+    A piece that crosses the tile or touches a feature of another tile can change in the union of
+    the whole input, so the features it is made of are kept to be unioned again with those of the
+    other tiles, see merge_union_boundaries. The other pieces are final, unless a piece of another
+    tile encloses them in a hole.
+
+    Parameters:
+    unioned_gdf (GeoDataFrame): The result of apply_union for the features of the tile.
+    input_gdf (GeoDataFrame): The features of the tile that were unioned.
+    tile_bounds (tuple): (minx, miny, maxx, maxy) of the tile.
+    neighbours_gdf (GeoDataFrame, optional): The features of other tiles that reach into this tile.
+
+    Returns:
+    tuple: (final pieces GeoDataFrame, boundary features GeoDataFrame)
+    """
+    boundary = ~unioned_gdf.geometry.within(box(*tile_bounds)).to_numpy()
+    if neighbours_gdf is not None and not neighbours_gdf.empty:
+        touched = neighbours_gdf.sindex.query(unioned_gdf.geometry, predicate="intersects")[0]
+        boundary[touched] = True
+
+    boundary_features = np.unique(unioned_gdf[boundary].sindex.query(input_gdf.geometry, predicate="intersects")[0])
+    boundary_gdf = input_gdf.iloc[boundary_features]
+
+    # the union of the boundary features recreates every piece they touch, e.g. the pieces filling their holes
+    final = np.ones(len(unioned_gdf), dtype=bool)
+    if not boundary_gdf.empty:
+        final[boundary_gdf.sindex.query(unioned_gdf.geometry, predicate="intersects")[0]] = False
+
+    return unioned_gdf[final], boundary_gdf
+
+def merge_union_boundaries(boundary_gdfs, on_progress=None):
+    """
+    Union the boundary features of all tiles, completing a union that was applied a tile at a time.
+
+    Parameters:
+    boundary_gdfs (list): The boundary features from split_union_boundary.
+    on_progress (callable, optional): See apply_union.
+
+    Returns:
+    GeoDataFrame: The pieces that were not final in any tile.
+    """
+    boundary_gdf = gpd.GeoDataFrame(pd.concat(boundary_gdfs, ignore_index=True), crs=boundary_gdfs[0].crs)
+    return apply_union(boundary_gdf, on_progress=on_progress)
@@ -0,0 +1,6 @@
+from marshmallow import ValidationError
+
+def validate_make_valid_request(data):
+    # like union, make_valid takes no options besides its type
+    if data['type'] != 'make_valid':
+        raise ValidationError("Invalid type for 'make_valid' transformation.")
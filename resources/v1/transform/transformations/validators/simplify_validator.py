@@ -0,0 +1,15 @@
+from marshmallow import ValidationError
+
+def validate_simplify_request(data):
+    if 'tolerance' not in data:
+        raise ValidationError("'tolerance' must be provided for 'simplify' transformations.")
+    if data['tolerance'] <= 0:
+        raise ValidationError("Invalid 'tolerance', it must be greater than 0.")
+
+    valid_units = ['meters', 'kilometers', 'miles', 'feet']
+    if data.get('units', 'meters') not in valid_units:
+        raise ValidationError(f"Invalid unit. Supported units are: {', '.join(valid_units)}.")
+
+    valid_methods = ['preserve_topology', 'douglas_peucker', 'coverage']
+    if data.get('method', 'preserve_topology') not in valid_methods:
+        raise ValidationError(f"Invalid method. Supported methods are: {', '.join(valid_methods)}.")
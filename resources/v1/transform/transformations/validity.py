@@ -0,0 +1,41 @@
+import os
+
+import shapely
+
+from .geometry_metadata import get_geometry_metadata, invalidate_geometry_metadata, POLYGON_TYPE_IDS, COLLECTION_TYPE_ID
+
+# invalid geometries are repaired before the overlay transformations run, set to "false" to leave them as they are
+AUTO_REPAIR_GEOMETRIES = os.getenv("AUTO_REPAIR_GEOMETRIES", "true").lower() == "true"
+
+# transformations that fail with a TopologyException, or fall back to slow robust code, on invalid geometries
+OVERLAY_TRANSFORMATIONS = ("clip", "erase", "dissolve", "union")
+
+def repair_geometries(input_gdf):
+    """
+    Repair the invalid geometries of a GeoDataFrame with make_valid.
+
+    Validity is checked for all the geometries at once and only the invalid ones are repaired,
+    a GeoDataFrame without invalid geometries is returned as it is. make_valid keeps the edges
+    of a polygon that collapse into lines, for polygons those are dropped with buffer(0) so a
+    repaired polygon stays a polygon.
+
+    Parameters:
+    input_gdf (GeoDataFrame): The GeoDataFrame to check.
+
+    Returns:
+    tuple: (GeoDataFrame, repaired) where repaired is the number of geometries that were invalid.
+    """
+    metadata = get_geometry_metadata(input_gdf)
+    invalid = ~metadata.is_valid
+    repaired_count = int(invalid.sum())
+    if not repaired_count:
+        return input_gdf, 0
+
+    repaired = shapely.make_valid(metadata.geometries[invalid])
+    collapsed = metadata.type_mask(POLYGON_TYPE_IDS)[invalid] & (shapely.get_type_id(repaired) == COLLECTION_TYPE_ID)
+    repaired[collapsed] = shapely.buffer(repaired[collapsed], 0)
+
+    output_gdf = input_gdf.copy()
+    output_gdf.loc[invalid, output_gdf.geometry.name] = repaired
+    invalidate_geometry_metadata(output_gdf)
+    return output_gdf, repaired_count
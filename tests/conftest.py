@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# db.py builds the redis url when it is imported, the tests never connect to redis but the url must parse
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("REDIS_DB", "0")
+os.environ.setdefault("REDIS_PASSWORD", "")
+os.environ.setdefault("API_URL", "http://localhost")
+
+@pytest.fixture(autouse=True)
+def storage_paths(tmp_path, monkeypatch):
+    """Give every test its own upload and output folders."""
+    monkeypatch.setenv("UPLOADS_PATH", str(tmp_path / "uploads"))
+    monkeypatch.setenv("OUTPUT_PATH", str(tmp_path / "output"))
+    os.makedirs(tmp_path / "uploads")
+    os.makedirs(tmp_path / "output")
+    return tmp_path
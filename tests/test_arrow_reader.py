@@ -0,0 +1,40 @@
+import geopandas as gpd
+import pyarrow as pa
+import pytest
+from shapely.geometry import Point
+
+from resources.v1.transform.readers.arrow.service import load_arrow
+
+def make_points():
+    return gpd.GeoDataFrame({"v": [1, 2, 3]}, geometry=[Point(150.5, -33.5), Point(151.5, -33.5), Point(152.5, -33.5)], crs=4326)
+
+def write_stream(table, path):
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=2)
+    return str(path)
+
+def test_geoarrow_stream_without_geo_metadata(storage_paths):
+    table = pa.table(make_points().to_crs(3857).to_arrow(geometry_encoding="WKB"))
+    assert b"geo" not in (table.schema.metadata or {})
+    path = write_stream(table, storage_paths / "points.arrows")
+
+    gdf = load_arrow(path)
+    assert gdf.crs.to_epsg() == 3857
+    assert list(gdf["v"]) == [1, 2, 3]
+
+    # the read_bbox is in EPSG:4326 and is reprojected to the CRS of the extension type
+    assert list(load_arrow(path, read_bbox=[150, -34, 151, -33])["v"]) == [1]
+
+def test_geoparquet_metadata_file(storage_paths):
+    path = str(storage_paths / "points.arrow")
+    make_points().to_feather(path)
+
+    gdf = load_arrow(path, read_bbox=[151, -34, 153, -33])
+    assert gdf.crs.to_epsg() == 4326
+    assert list(gdf["v"]) == [2, 3]
+
+def test_stream_without_geometries(storage_paths):
+    path = write_stream(pa.table({"v": [1, 2, 3]}), storage_paths / "plain.arrows")
+
+    with pytest.raises(ValueError, match="GeoArrow geometry column"):
+        load_arrow(path)
@@ -0,0 +1,61 @@
+import gc
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point, box
+
+from resources.v1.transform.transformations import get_geometry_metadata, invalidate_geometry_metadata
+from resources.v1.transform.transformations.geometry_metadata import metadata_cache, POLYGON_TYPE_IDS
+
+def make_polygons():
+    return gpd.GeoDataFrame({"v": [1, 2, 3]}, geometry=[box(0, 0, 1, 1), box(1, 1, 2, 2), box(2, 2, 3, 3)], crs=3857)
+
+def test_metadata_is_shared_while_geometries_are_unchanged():
+    gdf = make_polygons()
+    metadata = get_geometry_metadata(gdf)
+
+    assert get_geometry_metadata(gdf) is metadata
+    assert get_geometry_metadata(gdf.geometry) is metadata
+    assert get_geometry_metadata(gdf.copy()) is not metadata
+    assert list(metadata.total_bounds) == [0, 0, 3, 3]
+
+def test_geometries_written_in_place_get_new_metadata_once_invalidated():
+    gdf = make_polygons()
+    assert get_geometry_metadata(gdf).has_only(POLYGON_TYPE_IDS)
+
+    gdf.loc[0, "geometry"] = Point(5, 5)
+    invalidate_geometry_metadata(gdf)
+
+    metadata = get_geometry_metadata(gdf)
+    assert list(metadata.type_ids) == [0, 3, 3]
+    assert not metadata.has_only(POLYGON_TYPE_IDS)
+    assert list(metadata.total_bounds) == [1, 1, 5, 5]
+
+def test_assigned_geometries_get_new_metadata():
+    gdf = make_polygons()
+    before = get_geometry_metadata(gdf)
+
+    gdf["geometry"] = gdf.centroid
+
+    assert list(get_geometry_metadata(gdf).type_ids) == [0, 0, 0]
+    assert list(before.type_ids) == [3, 3, 3]
+
+def test_metadata_is_dropped_with_its_geometries():
+    gdf = make_polygons()
+    get_geometry_metadata(gdf)
+    key = id(gdf.geometry.values)
+    assert key in metadata_cache
+
+    del gdf
+    gc.collect()
+
+    assert key not in metadata_cache
+
+def test_missing_geometries():
+    gdf = gpd.GeoDataFrame(geometry=[None, box(0, 0, 1, 1)], crs=3857)
+    metadata = get_geometry_metadata(gdf)
+
+    assert list(metadata.type_ids) == [-1, 3]
+    assert metadata.is_valid.all()
+    assert list(metadata.vertex_counts) == [0, 5]
+    assert np.isnan(get_geometry_metadata(gdf.iloc[:1]).total_bounds).all()
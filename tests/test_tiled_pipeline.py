@@ -0,0 +1,82 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from resources.v1.transform.pipeline import tiles
+from resources.v1.transform.pipeline.engine import Pipeline, TiledPipeline, run_transform
+from resources.v1.transform.readers.gpkg.service import GeopackageSource
+
+def write_circles(path, missing_strings=True):
+    """Write 400 overlapping circles with a zone, a counter and a string that is often missing."""
+    rng = np.random.default_rng(2)
+    count = 400
+    gdf = gpd.GeoDataFrame(
+        {
+            "v": np.arange(count),
+            "zone": rng.choice(["a", "b", "c"], count),
+            "s": np.where(rng.random(count) < 0.3, None, rng.choice(["x", "y"], count)),
+        },
+        geometry=[Point(x, y).buffer(0.01) for x, y in zip(rng.uniform(0, 1, count), rng.uniform(0, 1, count))],
+        crs=3857,
+    )
+    gdf.loc[:5, "s"] = None
+    if not missing_strings:
+        gdf = gdf.drop(columns="s")
+    gdf.to_file(path)
+    return str(path)
+
+@pytest.fixture
+def zones_gpkg(storage_paths):
+    return write_circles(storage_paths / "zones.gpkg")
+
+@pytest.fixture
+def circles_gpkg(storage_paths):
+    # the union joins string attributes, missing strings are covered by the dissolve tests
+    return write_circles(storage_paths / "circles.gpkg", missing_strings=False)
+
+def run_pipeline(pipeline_class, file_path, transformations):
+    request_data = {"output_format": "gpkg", "output_crs": "EPSG:3857", "transformations": transformations, "to_file": True}
+    result = pipeline_class(request_data, f"test_{pipeline_class.__name__}", 0).run(target=GeopackageSource(file_path))
+    return gpd.read_file(result["output_file_response"])
+
+@pytest.mark.parametrize("transformations, by", [
+    ([{"type": "dissolve", "by": "zone"}], ["zone"]),
+    ([{"type": "dissolve", "by": ["zone", "s"]}], ["zone", "s"]),
+    ([{"type": "buffer", "distance": 1, "units": "kilometers"}, {"type": "dissolve", "by": "zone"}], ["zone"]),
+])
+def test_tiled_dissolve_matches_in_memory(zones_gpkg, monkeypatch, transformations, by):
+    monkeypatch.setattr(tiles, "TILE_FEATURES", 20)
+    assert len(tiles.plan_tiles(zones_gpkg, tiles.get_layer_extent(zones_gpkg, [])[1], 400)) > 4
+
+    in_memory = run_pipeline(Pipeline, zones_gpkg, transformations).sort_values(by).reset_index(drop=True)
+    tiled = run_pipeline(TiledPipeline, zones_gpkg, transformations).sort_values(by).reset_index(drop=True)
+
+    assert list(tiled.columns) == list(in_memory.columns)
+    assert tiled.drop(columns="geometry").equals(in_memory.drop(columns="geometry"))
+    assert tiled.geometry.symmetric_difference(in_memory.geometry).area.max() < 1e-6
+
+@pytest.mark.parametrize("transformations", [
+    [{"type": "union"}],
+    [{"type": "buffer", "distance": 5, "units": "kilometers"}, {"type": "union"}],
+])
+def test_tiled_union_matches_in_memory(circles_gpkg, monkeypatch, transformations):
+    monkeypatch.setattr(tiles, "TILE_FEATURES", 20)
+
+    in_memory = run_pipeline(Pipeline, circles_gpkg, transformations)
+    tiled = run_pipeline(TiledPipeline, circles_gpkg, transformations)
+
+    assert len(tiled) == len(in_memory)
+    assert tiled.union_all().symmetric_difference(in_memory.union_all()).area < 1e-6
+    assert sorted(tiled.area.round(6)) == sorted(in_memory.area.round(6))
+    assert sorted(tiled["v"]) == sorted(in_memory["v"])
+
+def test_large_inputs_run_tiled(zones_gpkg, monkeypatch):
+    monkeypatch.setattr(tiles, "OUT_OF_CORE_BYTES", 1)
+    monkeypatch.setattr(tiles, "TILE_FEATURES", 20)
+    request_data = {"output_format": "gpkg", "output_crs": "EPSG:3857", "transformations": [{"type": "dissolve", "by": "zone"}], "to_file": True}
+
+    result = run_transform(GeopackageSource(zones_gpkg), request_data, "test_tiled", 0)
+
+    assert [stage["stage"] for stage in result["metrics"]["stages"]][:2] == ["tiles", "merge"]
+    assert len(gpd.read_file(result["output_file_response"])) == 3
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from celery.result import AsyncResult
+from flask import make_response, jsonify
+from redis.exceptions import WatchError
+
+from db import redis_client
+from utils.logger import get_logger
+from utils.task_routing import get_task_queue, get_request_tenant, claim_tenant_slot
+from utils.task_events import publish_task_event
+
+logger = get_logger(__name__)
+
+# how long an in-flight job stays registered, identical submissions within this window share its task
+JOB_DEDUP_TTL = int(os.getenv("JOB_DEDUP_TTL", 60 * 60))
+
+# a task output that not every submission collected is removed this many seconds after it was
+# queued or last attached to, it should be well above JOB_DEDUP_TTL and the task time limit
+TASK_OUTPUT_TTL = int(os.getenv("TASK_OUTPUT_TTL", 24 * 60 * 60))
+
+# a registered job is replaced by a new task when its task ended in one of these states
+FAILED_STATES = ("FAILURE", "REVOKED")
+
+# a cancelled task id is remembered for this long, well past the task time limit
+CANCEL_TTL = 2 * 60 * 60
+
+# a running task looks for its cancel flag in redis at most this often
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", 1))
+
+def job_key(fingerprint):
+    return f"job:{fingerprint}"
+
+def task_key(task_id):
+    return f"job_task:{task_id}"
+
+def tickets_key(task_id):
+    return f"job_tickets:{task_id}"
+
+def cancel_key(task_id):
+    return f"cancel:{task_id}"
+
+def get_request_fingerprint(endpoint, request_data, file_hashes=()):
+    """
+    Fingerprint an async request, identical requests get the same fingerprint.
+
+    Parameters:
+    endpoint (str): The request path, e.g. '/v1/transform/gpkg/merge'.
+    request_data (dict): The validated request config or body.
+    file_hashes (list, optional): The sha256 of each uploaded file, in request order.
+
+    Returns:
+    str: The hex sha256 fingerprint.
+    """
+    # keys are sorted so the same config sent with a different key order matches, binary values
+    # (wkb geometries of msgpack bodies) are hashed through their repr
+    payload = json.dumps({"endpoint": endpoint, "data": request_data, "files": list(file_hashes)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cleanup_expired_outputs():
+    """Remove the output folders left behind by tasks whose output was not collected within TASK_OUTPUT_TTL."""
+    output_path = os.getenv("OUTPUT_PATH")
+    if not output_path or not os.path.isdir(output_path):
+        return
+
+    expired = time.time() - TASK_OUTPUT_TTL
+    for name in os.listdir(output_path):
+        path = os.path.join(output_path, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < expired:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed expired output {name}")
+        except OSError:
+            # removed by its own request in the meantime
+            continue
+
+def submit_task(task, args, fingerprint, cost=0, uploads_dir=None, memory=0):
+    """
+    Queue a celery task, or attach to the identical task already registered for the fingerprint.
+
+    The task is registered first and the job pointing to it is then claimed with SET NX, so of
+    several identical submissions arriving at the same time only one queues a task, and the
+    others always find its registration. Every submission gets a ticket on the task output,
+    see release_task_output. The registration expires after TASK_OUTPUT_TTL, so the output of
+    a submission that is never collected does not stay behind.
+
+    Parameters:
+    task: The celery task.
+    args (tuple): The task arguments.
+    fingerprint (str): The request fingerprint from get_request_fingerprint.
+    cost (float, optional): The estimated job cost from estimate_task_cost, selects the light or heavy queue.
+    uploads_dir (str, optional): The request upload folder, removed when the task is cancelled before it starts.
+    memory (int, optional): The estimated peak memory from estimate_task_memory, reserved by the worker before it starts the job.
+
+    Returns:
+    tuple: (task_id, ticket, created), created is False when the request was attached to an existing task.
+    """
+    key = job_key(fingerprint)
+    ticket = str(uuid.uuid4())
+    while True:
+        task_id = str(uuid.uuid4())
+        with redis_client.pipeline() as pipe:
+            pipe.hset(task_key(task_id), mapping={"fingerprint": fingerprint, "uploads_dir": uploads_dir or "", "memory": memory})
+            pipe.sadd(tickets_key(task_id), ticket)
+            pipe.expire(task_key(task_id), TASK_OUTPUT_TTL)
+            pipe.expire(tickets_key(task_id), TASK_OUTPUT_TTL)
+            pipe.execute()
+
+        if redis_client.set(key, task_id, nx=True, ex=JOB_DEDUP_TTL):
+            cleanup_expired_outputs()
+            queue = get_task_queue(cost)
+            priority = claim_tenant_slot(get_request_tenant(), task_id)
+            task.apply_async(args=args, task_id=task_id, queue=queue, priority=priority)
+            logger.info(f"Queued task {task_id} on the {queue} queue with priority {priority} (estimated cost {cost:.1f}, memory {memory // 1024 ** 2} MB)")
+            return task_id, ticket, True
+
+        # another submission registered the job first
+        redis_client.delete(task_key(task_id), tickets_key(task_id))
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                existing_id = pipe.get(key)
+                if existing_id is None:
+                    continue
+
+                if AsyncResult(existing_id).state in FAILED_STATES:
+                    # a failed job is not shared, the next submission queues a new task
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+                    continue
+
+                # the watch aborts this if the output was released in the meantime
+                pipe.multi()
+                pipe.sadd(tickets_key(existing_id), ticket)
+                pipe.hset(task_key(existing_id), "shared", 1)
+                pipe.expire(task_key(existing_id), TASK_OUTPUT_TTL)
+                pipe.expire(tickets_key(existing_id), TASK_OUTPUT_TTL)
+                pipe.execute()
+            except WatchError:
+                continue
+
+        logger.info(f"Attached request {fingerprint} to task {existing_id}")
+        return existing_id, ticket, False
+
+def release_task_output(task_id, ticket=None):
+    """
+    Release the ticket of one submission on a task output, called when it downloads the output or cancels the task.
+
+    A ticket is only released once, so a caller downloading twice or retrying a DELETE does not
+    release the ticket of another caller. Clients that do not send a ticket release the output
+    of a task only one submission was attached to, a shared output they download is left to
+    expire after TASK_OUTPUT_TTL.
+
+    Parameters:
+    task_id (str): The task ID.
+    ticket (str, optional): The ticket returned when the request was submitted.
+
+    Returns:
+    bool: True when this released the last ticket and the output can be removed.
+    """
+    task = redis_client.hgetall(task_key(task_id))
+    if not task:
+        # outputs of tasks queued before deduplication existed have a single caller
+        return True
+
+    if ticket is None:
+        tickets = redis_client.smembers(tickets_key(task_id))
+        if task.get("shared") or len(tickets) != 1:
+            return False
+        ticket = tickets.pop()
+
+    # removed and counted in one transaction, so only one of two submissions releasing together sees the last ticket go
+    with redis_client.pipeline() as pipe:
+        pipe.srem(tickets_key(task_id), ticket)
+        pipe.scard(tickets_key(task_id))
+        removed, remaining = pipe.execute()
+    if not removed or remaining > 0:
+        return False
+
+    # unregister the job before checking again, from here on identical requests queue a new task
+    if redis_client.get(job_key(task["fingerprint"])) == task_id:
+        redis_client.delete(job_key(task["fingerprint"]))
+    if redis_client.scard(tickets_key(task_id)) > 0:
+        return False
+
+    redis_client.delete(task_key(task_id), tickets_key(task_id))
+    return True
+
+def forget_failed_task(task_id):
+    """Unregister the job of a failed task, so an identical request is not attached to it."""
+    task = redis_client.hgetall(task_key(task_id))
+    if task and redis_client.get(job_key(task["fingerprint"])) == task_id:
+        redis_client.delete(job_key(task["fingerprint"]))
+
+def dispatch_async_task(task, args, fingerprint, message, uploads_dir=None, cost=0, memory=0):
+    """
+    Start an async request and build its 202 response.
+
+    Parameters:
+    task: The celery task.
+    args (tuple): The task arguments.
+    fingerprint (str): The request fingerprint from get_request_fingerprint.
+    message (str): The response message when a new task was created.
+    uploads_dir (str, optional): The request upload folder, removed when the request was attached to an existing task.
+    cost (float, optional): The estimated job cost from estimate_task_cost.
+    memory (int, optional): The estimated peak memory of the job from estimate_task_memory.
+
+    Returns:
+    Response: The 202 response with the task id, and the ticket to send with the result, output and cancel requests.
+    """
+    task_id, ticket, created = submit_task(task, args, fingerprint, cost, uploads_dir, memory)
+    if not created:
+        # the existing task reads its own copy of the files
+        if uploads_dir is not None:
+            shutil.rmtree(uploads_dir, ignore_errors=True)
+        message = "An identical Geoflip task is already in progress, this request shares its result"
+
+    return make_response(jsonify({
+        "message": message,
+        "task_id": task_id,
+        "ticket": ticket,
+        "state": "TASK CREATED" if created else "TASK ATTACHED"
+    }), 202)
+
+def cancel_task(task_id):
+    """
+    Cancel an async task and remove its files.
+
+    A queued task is revoked so no worker starts it, a running task sees the cancel flag at its
+    next cancellation check (see get_cancel_check) and stops, removing its own partial files.
+
+    Parameters:
+    task_id (str): The task ID.
+    """
+    redis_client.set(cancel_key(task_id), 1, ex=CANCEL_TTL)
+    AsyncResult(task_id).revoke()
+
+    # a revoked task never runs, so nothing else removes its uploaded files
+    uploads_dir = redis_client.hget(task_key(task_id), "uploads_dir")
+    if uploads_dir:
+        shutil.rmtree(uploads_dir, ignore_errors=True)
+    redis_client.delete(task_key(task_id), tickets_key(task_id))
+
+    # the task may already have finished and its output been collected
+    output_id = f"o_{task_id}"
+    output = redis_client.get(output_id)
+    if output is not None:
+        result = json.loads(output)
+        if result["to_file"] or result["output_format"] not in ("GEOJSON", "ESRIJSON"):
+            shutil.rmtree(os.path.dirname(result["output_file_response"]), ignore_errors=True)
+        redis_client.delete(output_id)
+    AsyncResult(task_id).forget()
+    publish_task_event(task_id, "CANCELLED")
+
+    logger.info(f"Cancelled task {task_id}")
+
+def is_task_cancelled(task_id):
+    return redis_client.exists(cancel_key(task_id)) > 0
+
+def get_cancel_check(task_id, interval=CANCEL_POLL_INTERVAL):
+    """
+    Build the cancel check of a running task for the pipeline.
+
+    The check is called between stages and inside long loops, so redis is only asked again
+    once interval seconds have passed since the last time.
+
+    Returns:
+    callable: Returns True once the task has been cancelled.
+    """
+    state = {"checked_at": 0.0, "cancelled": False}
+
+    def cancel_check():
+        now = time.monotonic()
+        if not state["cancelled"] and now - state["checked_at"] >= interval:
+            state["checked_at"] = now
+            state["cancelled"] = is_task_cancelled(task_id)
+        return state["cancelled"]
+
+    return cancel_check
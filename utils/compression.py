@@ -0,0 +1,166 @@
+import gzip
+import json
+import os
+import shutil
+
+import zstandard
+from flask_smorest import abort
+from werkzeug.wrappers import Response
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# responses smaller than this are sent uncompressed, the framing overhead is not worth it
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+# a compressed upload can expand a lot, stop reading once it decompresses past this size
+MAX_DECOMPRESSED_REQUEST_SIZE = int(os.getenv("MAX_DECOMPRESSED_REQUEST_SIZE", 2 * 1024 ** 3))
+
+# the size of the request body as sent, before it was decompressed
+REQUEST_SIZE_ENVIRON_KEY = "geoflip.request_size"
+
+# preferred first when the client accepts both
+RESPONSE_ENCODINGS = ["zstd", "gzip"]
+FILE_EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class DecompressedStream:
+    """
+    File-like reader over a compressed request body, decompressing as it is read.
+
+    Parameters:
+    stream: The wsgi input stream.
+    encoding (str): "gzip" or "zstd".
+    max_size (int): Number of decompressed bytes after which reading fails with a 413.
+    """
+
+    def __init__(self, stream, encoding, max_size=MAX_DECOMPRESSED_REQUEST_SIZE):
+        if encoding == "gzip":
+            self.reader = gzip.GzipFile(fileobj=stream, mode="rb")
+        else:
+            self.reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        self.encoding = encoding
+        self.max_size = max_size
+        self.size = 0
+
+    def _decompress(self, read, size):
+        try:
+            data = read(size)
+        except (OSError, EOFError, zstandard.ZstdError) as e:
+            logger.error(f"Error decompressing {self.encoding} request body: {e}")
+            abort(400, message=f"Invalid {self.encoding} request body.")
+
+        self.size += len(data)
+        if self.size > self.max_size:
+            abort(413, message=f"Request body decompresses to more than {self.max_size} bytes.")
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            while chunk := self.read(COPY_CHUNK_SIZE):
+                chunks.append(chunk)
+            return b"".join(chunks)
+        return self._decompress(self.reader.read, size)
+
+    def readline(self, size=-1):
+        return self._decompress(self.reader.readline, size)
+
+    def __iter__(self):
+        while line := self.readline():
+            yield line
+
+    def close(self):
+        self.reader.close()
+
+class DecompressionMiddleware:
+    """
+    WSGI middleware that decompresses gzip and zstd request bodies before flask reads them.
+
+    The body is decompressed while the app reads it, so uploads are never held compressed and
+    decompressed in memory at the same time. The size of the body as sent is kept in the
+    environ for get_request_size.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("", "identity"):
+            return self.wsgi_app(environ, start_response)
+
+        if encoding == "x-gzip":
+            encoding = "gzip"
+        if encoding not in FILE_EXTENSIONS:
+            # this runs before flask, so build the same error body flask-smorest would
+            error = {"code": 415, "message": f"Unsupported Content-Encoding: {encoding}. Supported encodings are gzip and zstd.", "status": "Unsupported Media Type"}
+            return Response(json.dumps(error), status=415, mimetype="application/json")(environ, start_response)
+
+        environ[REQUEST_SIZE_ENVIRON_KEY] = int(environ["CONTENT_LENGTH"]) if environ.get("CONTENT_LENGTH") else None
+        environ["wsgi.input"] = DecompressedStream(environ["wsgi.input"], encoding)
+        # the decompressed length is unknown, read the body until the end of the stream
+        environ["wsgi.input_terminated"] = True
+        environ.pop("CONTENT_LENGTH", None)
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+
+        return self.wsgi_app(environ, start_response)
+
+def get_request_size(request):
+    """Return the size of the request body as it was sent, for compressed bodies that is the compressed size."""
+    return request.environ.get(REQUEST_SIZE_ENVIRON_KEY, request.content_length)
+
+def get_response_encoding(request, size):
+    """
+    Pick the content encoding for a response body.
+
+    Parameters:
+    request (Request): The flask request, for its Accept-Encoding header.
+    size (int): The uncompressed size of the response body.
+
+    Returns:
+    str or None: "zstd", "gzip", or None to send the body uncompressed.
+    """
+    if size < RESPONSE_COMPRESSION_MIN_SIZE:
+        return None
+    return request.accept_encodings.best_match(RESPONSE_ENCODINGS)
+
+def compress_bytes(data, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def get_compressed_file(file_path, encoding):
+    """
+    Get a compressed copy of an output file, compressing it only when there is no up to date copy yet.
+
+    The copy is written next to the file, so it is removed with the output directory and a
+    repeat download of the same output is served without compressing it again.
+
+    Parameters:
+    file_path (str): The output file.
+    encoding (str): "zstd" or "gzip".
+
+    Returns:
+    str: The path of the compressed copy.
+    """
+    compressed_path = file_path + FILE_EXTENSIONS[encoding]
+    if os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= os.path.getmtime(file_path):
+        return compressed_path
+
+    # write to a temporary name so a concurrent download never sees a partial file
+    temp_path = f"{compressed_path}.{os.getpid()}.tmp"
+    with open(file_path, "rb") as source, open(temp_path, "wb") as target:
+        if encoding == "zstd":
+            with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(target, closefd=False) as writer:
+                shutil.copyfileobj(source, writer, COPY_CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(fileobj=target, mode="wb", compresslevel=GZIP_LEVEL) as writer:
+                shutil.copyfileobj(source, writer, COPY_CHUNK_SIZE)
+    os.replace(temp_path, compressed_path)
+
+    return compressed_path
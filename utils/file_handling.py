@@ -1,18 +1,123 @@
+import hashlib
+import io
 import os
-import time
+import tempfile
 
-def wait_for_file(file_path, timeout=10, check_interval=0.5):
+from flask import Request
+
+# uploads up to this size are kept in memory while the request is parsed, larger ones go straight to disk
+SMALL_UPLOAD_SIZE = int(os.getenv("SMALL_UPLOAD_SIZE", 1024 * 1024))
+
+# staging directory for uploads being received, on the same filesystem as the request upload folders
+# so a finished upload is moved into place with a rename instead of being copied
+INCOMING_DIR = ".incoming"
+
+class HashingUploadFile:
+    """
+    Writable stream for an uploaded file that hashes the content as the multipart parser writes it.
+
+    Parameters:
+    fileobj: The underlying file, a BytesIO for small uploads or a file in the staging directory.
+    path (str, optional): The path of the staging file, None when the upload is held in memory.
+    """
+
+    def __init__(self, fileobj, path=None):
+        self.file = fileobj
+        self.path = path
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def close(self):
+        self.file.close()
+        # remove the staging file of an upload that was never saved, e.g. when the request was rejected
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+class UploadRequest(Request):
+    """
+    Request class that streams multipart file parts to the uploads folder while they are parsed.
+
+    Large parts are written to a staging file next to the request upload folders rather than to
+    a temporary file that then has to be copied, see save_upload.
     """
-    Waits for a file to be accessible within a given timeout period.
 
-    :param file_path: Path to the file.
-    :param timeout: Maximum time to wait for the file (in seconds).
-    :param check_interval: Time interval between checks (in seconds).
-    :raises FileNotFoundError: If the file is not accessible within the timeout period.
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= SMALL_UPLOAD_SIZE:
+            return HashingUploadFile(io.BytesIO())
+
+        incoming_dir = os.path.join(os.getenv("UPLOADS_PATH"), INCOMING_DIR)
+        os.makedirs(incoming_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=incoming_dir)
+        return HashingUploadFile(os.fdopen(fd, "w+b"), path)
+
+def save_upload(file, file_path):
+    """
+    Save an uploaded file to its final location and return the sha256 of its content.
+
+    Files streamed to the staging directory are synced once and renamed into place, small files
+    held in memory are written out and synced. The hash is computed while the upload is received,
+    so it costs no extra pass over the file.
+
+    Parameters:
+    file (FileStorage or CompletedUpload): The uploaded file from the request, or a completed chunked upload.
+    file_path (str): The destination path.
+
+    Returns:
+    str: The hex sha256 digest of the file.
+    """
+    if hasattr(file, "link_to"):
+        # a completed chunked upload referenced by its upload ID, it is already on disk
+        return file.link_to(file_path)
+
+    stream = file.stream
+    if not isinstance(stream, HashingUploadFile):
+        # not parsed by UploadRequest, fall back to a copy and hash the saved file
+        file.save(file_path)
+        with open(file_path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    if stream.path is None:
+        with open(file_path, "wb") as f:
+            f.write(stream.file.getbuffer())
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        stream.file.flush()
+        os.fsync(stream.file.fileno())
+        os.replace(stream.path, file_path)
+        stream.path = None
+
+    stream.file.close()
+    return stream.sha256.hexdigest()
+
+def save_request_body(stream, file_path, chunk_size=1024 * 1024):
+    """
+    Save a raw request body to a file and return the sha256 of its content.
+
+    Parameters:
+    stream: The request body stream, decompressed when the body was sent with a Content-Encoding.
+    file_path (str): The destination path.
+    chunk_size (int, optional): The number of bytes read at a time.
+
+    Returns:
+    str: The hex sha256 digest of the body.
     """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            return True
-        time.sleep(check_interval)
-    raise FileNotFoundError(f"File not accessible: {file_path}")
\ No newline at end of file
+    sha256 = hashlib.sha256()
+    with open(file_path, "wb") as f:
+        while data := stream.read(chunk_size):
+            sha256.update(data)
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return sha256.hexdigest()
@@ -0,0 +1,78 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# ru_maxrss is reported in kilobytes on linux and in bytes on macOS
+RSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+def get_peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT_BYTES
+
+
+class Instrumentation:
+    """
+    Records wall time, CPU time, peak RSS growth and feature counts for each stage of a
+    request, so a slow request can be attributed to loading, a transformation or output.
+
+    Each measured stage produces a plain dict so the records can be returned as part of the
+    (json serialisable) result of async tasks.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def measure(self, name, features_in=None):
+        """
+        Measure a stage, yielding its record so the caller can add 'features_out'.
+
+        Parameters:
+        name (str): The stage name, e.g. "load" or "transform.buffer".
+        features_in (int, optional): Number of features going into the stage.
+        """
+        record = {"stage": name}
+        if features_in is not None:
+            record["features_in"] = features_in
+
+        self.stages.append(record)
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_rss = get_peak_rss()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - start_wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - start_cpu, 4)
+            record["peak_rss_delta_bytes"] = get_peak_rss() - start_rss
+
+    def as_dict(self):
+        return {"stages": self.stages}
+
+
+def measure(instrumentation, name, features_in=None):
+    """Measure a stage on an optional Instrumentation, doing nothing when it is None."""
+    if instrumentation is None:
+        return nullcontext({})
+    return instrumentation.measure(name, features_in)
+
+
+def format_server_timing(metrics):
+    """
+    Format the stage records of a result as a Server-Timing header value.
+
+    Parameters:
+    metrics (dict): The metrics dict from a transform result.
+
+    Returns:
+    str: e.g. 'load;dur=12.1, transform.buffer;dur=40.2, output;dur=8.3'
+    """
+    entries = []
+    for stage in metrics.get("stages", []):
+        # server timing names are tokens, so keep them to letters, digits, '.', '-' and '_'
+        name = "".join(char if char.isalnum() or char in "._-" else "_" for char in stage["stage"])
+        entries.append(f"{name};dur={stage['wall_seconds'] * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+# multiprocess files go here when PROMETHEUS_MULTIPROC_DIR is set but empty or relative, which
+# would otherwise have every process write its histogram_<pid>.db into the working directory
+DEFAULT_MULTIPROCESS_DIR = os.path.join(tempfile.gettempdir(), "geoflip-prometheus")
+
+# gunicorn and the celery worker both run several processes, when PROMETHEUS_MULTIPROC_DIR is set
+# every process writes its samples there and they are aggregated when scraped
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR is not None and not os.path.isabs(MULTIPROCESS_DIR):
+    MULTIPROCESS_DIR = DEFAULT_MULTIPROCESS_DIR
+    # prometheus_client reads the directory from the environment, before its first metric is created
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = MULTIPROCESS_DIR
+if MULTIPROCESS_DIR is not None:
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Histogram, REGISTRY, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, multiprocess, start_http_server
+
+LABELS = ["stage", "input_format", "output_format"]
+
+STAGE_WALL_SECONDS = Histogram(
+    "geoflip_stage_wall_seconds", "Wall time spent in each pipeline stage", LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900),
+)
+STAGE_CPU_SECONDS = Histogram(
+    "geoflip_stage_cpu_seconds", "CPU time spent in each pipeline stage", LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900),
+)
+STAGE_PEAK_RSS_BYTES = Histogram(
+    "geoflip_stage_peak_rss_delta_bytes", "Growth of the peak resident set size during each pipeline stage", LABELS,
+    buckets=(0, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2e9, 4e9, 8e9),
+)
+STAGE_FEATURES = Histogram(
+    "geoflip_stage_features", "Number of features going into each pipeline stage", LABELS,
+    buckets=(10, 100, 1e3, 1e4, 1e5, 1e6, 1e7),
+)
+
+
+def observe_stages(stages, input_format, output_format):
+    """
+    Record the instrumentation records of a completed request in the prometheus histograms.
+
+    Parameters:
+    stages (list): The stage records from utils.instrumentation.Instrumentation.
+    input_format (str): The input format of the request, e.g. "SHP".
+    output_format (str): The output format of the request, e.g. "GEOJSON".
+    """
+    for stage in stages:
+        labels = (stage["stage"], input_format, output_format)
+        STAGE_WALL_SECONDS.labels(*labels).observe(stage["wall_seconds"])
+        STAGE_CPU_SECONDS.labels(*labels).observe(stage["cpu_seconds"])
+        STAGE_PEAK_RSS_BYTES.labels(*labels).observe(stage["peak_rss_delta_bytes"])
+        if "features_in" in stage:
+            STAGE_FEATURES.labels(*labels).observe(stage["features_in"])
+
+
+def get_registry():
+    if MULTIPROCESS_DIR is None:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view():
+    """Flask view exposing the metrics in the prometheus text format."""
+    return generate_latest(get_registry()), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+
+def start_metrics_server(port):
+    """Serve the metrics over http from a process that has no web server, e.g. the celery worker."""
+    start_http_server(int(port), registry=get_registry())
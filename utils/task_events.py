@@ -0,0 +1,79 @@
+import json
+import os
+import time
+
+from db import redis_client
+
+# states after which a task publishes nothing more
+FINAL_STATES = ("SUCCESS", "FAILURE", "REVOKED", "CANCELLED")
+
+# an idle event stream gets a comment this often, so proxies keep it open and a task whose
+# worker died without publishing is noticed
+EVENT_STREAM_KEEPALIVE = int(os.getenv("EVENT_STREAM_KEEPALIVE", 15))
+
+# an event stream is closed after this long, the client reconnects and gets the current state first
+EVENT_STREAM_TIMEOUT = int(os.getenv("EVENT_STREAM_TIMEOUT", 30 * 60))
+
+def events_channel(task_id):
+    return f"task_events:{task_id}"
+
+def publish_task_event(task_id, state, meta=None):
+    """
+    Publish a state change of a task to the clients following it, see stream_task_events.
+
+    Parameters:
+    task_id (str): The task ID.
+    state (str): The celery state, e.g. 'PROCESSING'.
+    meta (dict, optional): The state meta, e.g. {'message': 'Loading GPKG data'}.
+    """
+    event = {"state": state, **(meta or {})}
+    redis_client.publish(events_channel(task_id), json.dumps(event, default=str))
+
+def format_event(data, event):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def stream_task_events(task_id, get_result):
+    """
+    Stream the progress of a task as server-sent events over a single connection.
+
+    The stream starts with the current result of the task, relays each state change the worker
+    publishes as a 'progress' event and ends with a 'result' event holding the final result.
+
+    Parameters:
+    task_id (str): The task ID.
+    get_result (callable): Builds the result of a task id as GET /v1/transform/result/<task_id> returns it.
+
+    Returns:
+    generator: The text/event-stream chunks.
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    # subscribe before reading the current state, so an event published in between is not missed
+    pubsub.subscribe(events_channel(task_id))
+    try:
+        result = get_result(task_id)
+        if result["state"] in FINAL_STATES:
+            yield format_event(result, "result")
+            return
+        yield format_event(result, "progress")
+
+        deadline = time.monotonic() + EVENT_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=EVENT_STREAM_KEEPALIVE)
+            if message is None:
+                # a worker killed outright publishes nothing, so the backend is checked while idle
+                result = get_result(task_id)
+                if result["state"] in FINAL_STATES:
+                    yield format_event(result, "result")
+                    return
+                yield ": keepalive\n\n"
+                continue
+
+            event = json.loads(message["data"])
+            if event["state"] in FINAL_STATES:
+                # the final result carries the output url, it is built the same way as for a poll
+                yield format_event(get_result(task_id), "result")
+                return
+            if event["state"] != "RETRY":
+                yield format_event(event, "progress")
+    finally:
+        pubsub.close()
@@ -0,0 +1,162 @@
+import json
+import os
+import resource
+import socket
+import time
+
+from celery.exceptions import Ignore
+from redis.exceptions import WatchError
+
+from db import redis_client
+from utils.logger import get_logger
+from utils.async_tasks import task_key, is_task_cancelled
+
+logger = get_logger(__name__)
+
+# memory the jobs of one worker host may reserve together, in bytes, detected from the container limit when not set
+WORKER_MEMORY_LIMIT = int(os.getenv("WORKER_MEMORY_LIMIT", 0))
+
+# share of the worker memory limit handed out to job estimates, the rest is headroom for the worker processes
+WORKER_MEMORY_FRACTION = float(os.getenv("WORKER_MEMORY_FRACTION", 0.8))
+
+# a job that does not fit in the free memory is put back on its queue and tried again after this many seconds
+ADMISSION_RETRY_DELAY = int(os.getenv("ADMISSION_RETRY_DELAY", 10))
+
+# a job deferred this many times runs anyway, so a large job is not held back for ever by a stream of small ones
+ADMISSION_MAX_DEFERRALS = 30
+
+# address space limit of each worker child in bytes, a job that goes past it fails with a MemoryError
+# instead of the whole child being killed by the kernel, 0 turns it off
+TASK_MEMORY_LIMIT = int(os.getenv("TASK_MEMORY_LIMIT", 0))
+
+# worker children are replaced once they have grown past this many kilobytes after a job, 0 turns it off
+WORKER_MAX_MEMORY_PER_CHILD = int(os.getenv("WORKER_MAX_MEMORY_PER_CHILD", 0))
+
+# a reservation left behind by a child that was killed expires after the task time limit
+RESERVATION_TTL = 15 * 60
+
+# cgroup v2 and v1 files holding the memory limit of the container
+CGROUP_MEMORY_FILES = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+
+MEMORY_ERROR_MESSAGE = "Geoflip ran out of memory for this job, try a smaller input or fewer transformations - api usage as not been recorded."
+
+def worker_memory_key():
+    return f"worker_memory:{socket.gethostname()}"
+
+def get_memory_limit():
+    """Return the memory limit of this host in bytes, WORKER_MEMORY_LIMIT or the container limit or the physical memory."""
+    if WORKER_MEMORY_LIMIT:
+        return WORKER_MEMORY_LIMIT
+
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    for path in CGROUP_MEMORY_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # an unlimited cgroup reads 'max' (v2) or a number larger than the host memory (v1)
+        if value.isdigit():
+            return min(int(value), physical)
+    return physical
+
+def get_memory_budget():
+    return int(get_memory_limit() * WORKER_MEMORY_FRACTION)
+
+def reserve_task_memory(task_id, memory, force=False):
+    """
+    Reserve memory for a job on this worker host.
+
+    The reservations of all the worker children on the host are kept in one redis hash, checked
+    and updated under WATCH so two children cannot both take the last of the budget. A job is
+    always admitted when nothing else is reserved, an estimate larger than the budget still runs
+    once the host is idle.
+
+    Parameters:
+    task_id (str): The task ID.
+    memory (int): The estimated peak memory of the job in bytes, see estimate_task_memory.
+    force (bool, optional): Reserve the memory even when it does not fit.
+
+    Returns:
+    bool: True when the memory was reserved.
+    """
+    key = worker_memory_key()
+    budget = get_memory_budget()
+    with redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                now = time.time()
+                reservations = {item: json.loads(value) for item, value in pipe.hgetall(key).items()}
+                expired = [item for item, value in reservations.items() if value["expires"] < now]
+                reserved = sum(value["memory"] for item, value in reservations.items() if item not in expired and item != task_id)
+
+                if reserved and reserved + memory > budget and not force:
+                    pipe.reset()
+                    return False
+
+                pipe.multi()
+                if expired:
+                    pipe.hdel(key, *expired)
+                pipe.hset(key, task_id, json.dumps({"memory": memory, "expires": now + RESERVATION_TTL}))
+                pipe.execute()
+                return True
+            except WatchError:
+                continue
+
+def release_task_memory(task_id):
+    """Drop the memory reservation of a job, called from the worker when the task ends."""
+    redis_client.hdel(worker_memory_key(), task_id)
+
+def admit_task(task):
+    """
+    Reserve the estimated memory of a task before it runs, or put it back on its queue.
+
+    The estimate is the one stored with the job when it was queued, see submit_task. A task
+    that does not fit is reported as DEFERRED and queued again with the same id, priority and
+    retry count after ADMISSION_RETRY_DELAY seconds, this execution is then dropped through
+    celery's Ignore so it does not store a result.
+
+    Parameters:
+    task (Task): The bound celery task about to run.
+
+    Raises:
+    Ignore: When the task was deferred, or cancelled while it was waiting.
+    """
+    task_id = task.request.id
+    job = redis_client.hgetall(task_key(task_id))
+    memory = int(job.get("memory") or 0)
+    if not memory:
+        return
+
+    deferrals = int(job.get("deferrals") or 0)
+    if reserve_task_memory(task_id, memory, force=deferrals >= ADMISSION_MAX_DEFERRALS):
+        return
+
+    if is_task_cancelled(task_id):
+        raise Ignore()
+
+    redis_client.hincrby(task_key(task_id), "deferrals", 1)
+    logger.info(f"Deferred task {task_id}, its estimated {memory // 1024 ** 2} MB do not fit in the free worker memory")
+    task.update_state(state="DEFERRED", meta={"message": f"Geoflip task is waiting for {memory // 1024 ** 2} MB of worker memory"})
+    task.signature_from_request(countdown=ADMISSION_RETRY_DELAY).apply_async()
+    raise Ignore()
+
+def limit_child_memory():
+    """Limit the address space of a worker child to TASK_MEMORY_LIMIT, called when the child starts."""
+    if not TASK_MEMORY_LIMIT:
+        return
+
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = TASK_MEMORY_LIMIT if hard == resource.RLIM_INFINITY else min(TASK_MEMORY_LIMIT, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def is_memory_error(error):
+    """Whether an error is a MemoryError, or was raised while handling one, the pipeline wraps the errors of its stages."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, MemoryError):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
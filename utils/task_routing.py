@@ -0,0 +1,160 @@
+import os
+
+from flask import request
+
+from db import redis_client
+
+# async jobs are routed to one of two queues, each consumed by its own worker pool
+LIGHT_QUEUE = "light"
+HEAVY_QUEUE = "heavy"
+
+# jobs with an estimated cost at or above this go to the heavy queue, see estimate_task_cost
+HEAVY_TASK_COST = float(os.getenv("HEAVY_TASK_COST", 200))
+
+# features per megabyte of a typical geojson body, used to size binary bodies by their feature count
+FEATURES_PER_MB = 2000
+
+# relative cost of each transformation on top of reading and writing the data once
+TRANSFORMATION_COSTS = {
+    "buffer": 2,
+    "clip": 1,
+    "erase": 1,
+    "dissolve": 3,
+    "union": 4,
+    "make_valid": 1,
+    "simplify": 1,
+}
+
+# resident bytes of a loaded GeoDataFrame per byte of input, shapely geometries take several times their encoded size
+MEMORY_PER_INPUT_BYTE = float(os.getenv("MEMORY_PER_INPUT_BYTE", 6))
+
+# resident bytes per input feature, used for binary bodies like FEATURES_PER_MB
+MEMORY_PER_FEATURE = 3072
+
+# peak memory of each transformation as a multiple of the loaded data, its input and output are held at once
+TRANSFORMATION_MEMORY = {
+    "buffer": 2,
+    "clip": 1.5,
+    "erase": 1.5,
+    "dissolve": 2,
+    "union": 3,
+}
+
+# memory a worker child uses before it loads any data
+TASK_BASE_MEMORY = 256 * 1024 ** 2
+
+# header identifying the tenant a request belongs to, the client address is used when it is not sent
+TENANT_HEADER = "X-Geoflip-Tenant"
+
+# the redis transport supports priorities 0 (first) to 9 (last)
+LOWEST_PRIORITY = 9
+
+# the tenant of a queued task is kept until the worker finishes it, long past any task time limit
+TASK_TENANT_TTL = 24 * 60 * 60
+
+def tenant_key(tenant):
+    return f"tenant_tasks:{tenant}"
+
+def task_tenant_key(task_id):
+    return f"task_tenant:{task_id}"
+
+def count_features(geojson):
+    """Count the features of a FeatureCollection in the json or the columnar wkb encoding."""
+    if geojson.get("encoding") == "wkb":
+        return len(geojson.get("geometry", []))
+    return len(geojson.get("features", []))
+
+def count_request_features(request_data):
+    """Count the input features of a geojson transform, merge or append request body, 0 for file requests."""
+    collections = []
+    if "input_geojson" in request_data:
+        collections.append(request_data["input_geojson"])
+    if "target_geojson" in request_data:
+        collections.append(request_data["target_geojson"])
+    collections.extend(request_data.get("input_geojson_list", []))
+    collections.extend(request_data.get("append_geojson_list", []))
+    return sum(count_features(collection) for collection in collections)
+
+def get_input_size(request_size, file_paths=()):
+    """
+    Return the size of the input of a request in bytes, the larger of the request and its saved input files.
+
+    Inputs referenced by upload ID are not part of the request, only their files on disk show how large they are.
+
+    Parameters:
+    request_size (int): The size of the request as sent, in bytes.
+    file_paths (list, optional): The saved input files of the request.
+
+    Returns:
+    int: The input size in bytes.
+    """
+    return max(request_size or 0, sum(os.path.getsize(file_path) for file_path in file_paths))
+
+def estimate_task_cost(input_size, request_data):
+    """
+    Estimate the cost of an async job from its input size and the transformations it runs.
+
+    The cost is the input size in megabytes, or the size implied by the feature count when that is
+    larger (binary bodies are compact), multiplied by 1 plus the weight of each transformation.
+
+    Parameters:
+    input_size (int): The size of the input in bytes, see get_input_size.
+    request_data (dict): The validated request config or body.
+
+    Returns:
+    float: The estimated cost.
+    """
+    size_mb = (input_size or 0) / 1024 ** 2
+    size_mb = max(size_mb, count_request_features(request_data) / FEATURES_PER_MB)
+    weight = 1 + sum(TRANSFORMATION_COSTS.get(transformation["type"], 1) for transformation in request_data.get("transformations", []))
+    return size_mb * weight
+
+def estimate_task_memory(input_size, request_data):
+    """
+    Estimate the peak memory of an async job from its input size, feature count and transformations.
+
+    The loaded data is sized from the input bytes, or from the feature count when that is larger,
+    and multiplied by the most memory hungry transformation. Transformations run one after the
+    other so their peaks do not add up, but writing the output holds a reprojected copy, so the
+    data counts at least twice.
+
+    Parameters:
+    input_size (int): The size of the input in bytes, see get_input_size.
+    request_data (dict): The validated request config or body.
+
+    Returns:
+    int: The estimated peak memory in bytes.
+    """
+    data = max((input_size or 0) * MEMORY_PER_INPUT_BYTE, count_request_features(request_data) * MEMORY_PER_FEATURE)
+    factor = max([2] + [TRANSFORMATION_MEMORY.get(transformation["type"], 2) for transformation in request_data.get("transformations", [])])
+    return int(TASK_BASE_MEMORY + data * factor)
+
+def get_task_queue(cost):
+    return HEAVY_QUEUE if cost >= HEAVY_TASK_COST else LIGHT_QUEUE
+
+def get_request_tenant():
+    return request.headers.get(TENANT_HEADER) or request.remote_addr or "anonymous"
+
+def claim_tenant_slot(tenant, task_id):
+    """
+    Count a new in-flight job for a tenant and return its queue priority.
+
+    Each job a tenant already has in flight pushes its next job one priority step back, so a tenant
+    submitting a burst of jobs cannot hold up the first job of another tenant on the same queue.
+
+    Parameters:
+    tenant (str): The tenant from get_request_tenant.
+    task_id (str): The ID the task will be queued with.
+
+    Returns:
+    int: The celery priority, 0 for the first in-flight job of the tenant.
+    """
+    redis_client.set(task_tenant_key(task_id), tenant, ex=TASK_TENANT_TTL)
+    in_flight = redis_client.incr(tenant_key(tenant)) - 1
+    return min(in_flight, LOWEST_PRIORITY)
+
+def release_tenant_slot(task_id):
+    """Count the job of a task as finished for its tenant, called from the worker when the task ends."""
+    tenant = redis_client.getdel(task_tenant_key(task_id))
+    if tenant is not None and redis_client.decr(tenant_key(tenant)) < 0:
+        redis_client.set(tenant_key(tenant), 0)